@@ -3,25 +3,47 @@ import asyncio
 from datetime import datetime
 from typing import Optional, Dict
 import io
+import time
 import urllib.parse
 import traceback
+import tempfile
+import sys
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, BotCommand
+from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup, BotCommand
 from telegram.ext import (
     Application, CommandHandler, CallbackQueryHandler, 
     MessageHandler, filters, ContextTypes
 )
 from telegram.error import TelegramError
+from telegram.helpers import escape_markdown
+from telegram.request import HTTPXRequest
 
 # Import our modules
 from config import *
 from db import db
 from generator import generator, SERVICE_PAYLOADS
+from provider_http import provider_http
+from prober import prober
 from qrgen import qr_generator, qr_card_generator
 from utils import (
     rate_limiter, ConfigFormatter, MessageValidator, 
-    SecurityUtils, TimeUtils, stats_collector, rate_limit
+    SecurityUtils, TimeUtils, stats_collector
 )
+from metrics import QUEUE_DEPTH, start_metrics_server, timed_handler
+from tracing import tracer, traced_handler, configure_from as configure_tracing
+from profiler import profiler
+from loop_monitor import loop_monitor
+from memory_diagnostics import memory_diagnostics, bind_metrics as bind_memory_metrics
+from router import CallbackRouter, admin_only, answer, errors_reply, rate_limited, timing
+from catalog import Catalog
+from bulk import bulk_generator, SINKS
+from history import HistoryPager
+from budget import ApiBudget
+from membership import api_budget, membership_verifier
+from reverify import MembershipReverifier
+from regions import RegionSelector
+from persistence import MongoPersistence
+from shard import ShardWorker, run_front, socket_path, wait_for_signal
 
 # Configure logging
 logging.basicConfig(
@@ -30,43 +52,112 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Create SERVICE_PACKAGES mapping from SERVICE_PAYLOADS
-SERVICE_PACKAGES = {}
-for key, payload_data in SERVICE_PAYLOADS.items():
-    SERVICE_PACKAGES[key] = {
-        "name": payload_data["name"],
-        "hosts": [payload_data["host"]] if payload_data["host"] != "www.google.com" else ["*"],
-        "description": payload_data["description"],
-        "emoji": payload_data["name"][0] if payload_data["name"] else "🔧"
-    }
+class TracedHTTPXRequest(HTTPXRequest):
+    """Bot API transport that records a span for every outbound call
+    
+    Every call is also charged to ``budget`` under its method name, so
+    background work that waits on the budget only gets the headroom that
+    sends, edits and callback answers leave.
+    """
+    
+    def __init__(self, *args, budget: ApiBudget = api_budget, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.budget = budget
+    
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        self.budget.charge_call(api_method)
+        with tracer.span(f"telegram.{api_method}"):
+            return await super().do_request(url, method, request_data=request_data, **kwargs)
 
 class SSHVPNBot:
     def __init__(self):
         self.application = None
+        self.shard_index: Optional[int] = None  # Worker index in multi-process mode
         self.formatter = ConfigFormatter()
+        self.router = self.build_router()
+        self.catalog = Catalog(self.router)
+        self.history = HistoryPager(db, **HISTORY_CONFIG)
+        self.regions = RegionSelector(db, ttl=REGION_CONFIG["ttl"], max_users=REGION_CONFIG["max_users"])
+        self.reverifier = MembershipReverifier(
+            db, membership_verifier, batch_size=REVERIFY_CONFIG["batch_size"],
+            concurrency=REVERIFY_CONFIG["concurrency"], interval=REVERIFY_CONFIG["interval"]
+        )
         
-    def initialize(self):
-        """Initialize the bot - synchronous version"""
+    def initialize(self, base_url: Optional[str] = None):
+        """Initialize the bot - synchronous version
+        
+        Args:
+            base_url: Optional Bot API base URL (e.g. a local fake server for load tests)
+        """
         try:
             if not BOT_TOKEN or BOT_TOKEN == "YOUR_BOT_TOKEN_HERE":
                 raise ValueError("BOT_TOKEN not set properly in environment variables")
             
             # Create application with explicit settings for Python 3.13 compatibility
-            self.application = (
+            builder = (
                 Application.builder()
                 .token(BOT_TOKEN)
                 .concurrent_updates(True)
-                .build()
+                .request(TracedHTTPXRequest(connection_pool_size=256))
+                .post_init(self.post_init)
+                .post_shutdown(self.post_shutdown)
             )
+            if base_url:
+                builder = builder.base_url(base_url)
+            if PERSISTENCE_CONFIG["enabled"]:
+                builder = builder.persistence(
+                    MongoPersistence(db, update_interval=PERSISTENCE_CONFIG["update_interval"])
+                )
+            self.application = builder.build()
             logger.info("Bot application created successfully")
             
         except Exception as e:
             logger.error(f"Error initializing bot: {e}")
             raise
 
+    async def post_init(self, application: Application):
+        """Migrate the schema if needed, then start background monitors"""
+        # Runs before polling (and before app.start() in shard workers), so the
+        # unique indexes add_user/add_referral rely on exist before any update
+        await self.migrate_schema()
+        if LOOP_MONITOR_CONFIG["enabled"]:
+            loop_monitor.threshold = LOOP_MONITOR_CONFIG["threshold"]
+            loop_monitor.interval = LOOP_MONITOR_CONFIG["interval"]
+            loop_monitor.start()
+        # One sweep across all users is enough; in multi-process mode worker 0 runs it
+        if REVERIFY_CONFIG["enabled"] and not self.shard_index:
+            self.reverifier.start(application.bot)
+        if PROBER_CONFIG["enabled"]:
+            prober.start()
+        if PREWARM_CONFIG["enabled"]:
+            provider_http.start_prewarm(
+                PREWARM_CONFIG["origins"], PREWARM_CONFIG["interval"], PREWARM_CONFIG["active_window"]
+            )
+
+    async def migrate_schema(self):
+        """Run pending migrations; a single read when the schema is already current"""
+        try:
+            if await asyncio.to_thread(db.migrate):
+                logger.info("Database schema was behind; migrated at startup (run `python db.py migrate` on release)")
+        except Exception as e:
+            logger.error(f"Database migration at startup failed: {e}")
+            raise
+
+    async def post_shutdown(self, application: Application):
+        """Stop background monitors"""
+        await loop_monitor.stop()
+        await self.reverifier.stop()
+        await prober.stop()
+        await provider_http.aclose()
+
     def is_admin(self, user_id: int) -> bool:
         """Check if user is admin"""
         return SecurityUtils.is_admin(user_id, ADMIN_IDS)
+    
+    def rate_limit_exempt(self, user_id: int) -> bool:
+        """Whether RATE_LIMIT lets ``user_id`` through uncounted (disabled, or admin)"""
+        return not RATE_LIMIT["enabled"] or (RATE_LIMIT["admin_unlimited"] and self.is_admin(user_id))
 
     # Command Handlers
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -88,42 +179,17 @@ class SSHVPNBot:
             # Add user to database
             is_new_user = db.add_user(user_id, username, referrer_id)
             
-            # Create inline keyboard
-            keyboard = [
-                [
-                    InlineKeyboardButton("🔐 Generate Config", callback_data="generate"),
-                    InlineKeyboardButton("🎯 My Points", callback_data="points")
-                ],
-                [
-                    InlineKeyboardButton("🔗 Refer Friends", callback_data="refer"),
-                    InlineKeyboardButton("📢 Join Channels", callback_data="join")
-                ],
-                [
-                    InlineKeyboardButton("📊 Statistics", callback_data="stats"),
-                    InlineKeyboardButton("❓ Help", callback_data="help")
-                ]
-            ]
-            
-            # Add admin options if user is admin
-            if self.is_admin(user_id):
-                keyboard.append([
-                    InlineKeyboardButton("👑 Admin Panel", callback_data="admin_panel")
-                ])
-            
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            role = "admin" if self.is_admin(user_id) else "user"
             
             # Welcome message with speed test info
-            welcome_text = MESSAGES["welcome"]
+            welcome_text = self.catalog.render(f"welcome:{role}")
             
             if is_new_user and referrer_id:
                 welcome_text += f"\n\n✅ You were referred by user {referrer_id}. They earned 3 coins!"
             
-            if self.is_admin(user_id):
-                welcome_text += "\n\n" + MESSAGES["admin_welcome"]
-            
             await update.message.reply_text(
                 welcome_text,
-                reply_markup=reply_markup,
+                reply_markup=self.catalog.keyboard(f"start:{role}"),
                 parse_mode='Markdown'
             )
             
@@ -131,54 +197,33 @@ class SSHVPNBot:
             logger.error(f"Error in start command: {e}")
             await update.message.reply_text("Sorry, something went wrong. Please try again.")
 
-    @rate_limit('generate_config')
     async def generate_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /generate command"""
         try:
             user_id = update.effective_user.id
             
+            if not self.rate_limit_exempt(user_id) and not rate_limiter.is_allowed(user_id, 'generate_config'):
+                await update.message.reply_text("⏳ Too many requests. Please wait a minute and try again.")
+                return
+            
             # Admins get unlimited access
             if not self.is_admin(user_id):
                 check_result = db.can_generate_config(user_id)
                 
                 if not check_result["can_generate"]:
                     if check_result["reason"] == "insufficient_points":
-                        text = MESSAGES["insufficient_points"].format(
-                            cost=POINTS_CONFIG["config_cost"],
-                            current=check_result["current_points"],
-                            **POINTS_CONFIG
-                        )
+                        text = self.catalog.render("insufficient_points", current=check_result["current_points"])
                     else:
                         text = "❌ Unable to generate config. Please try again later."
                     
-                    keyboard = [
-                        [InlineKeyboardButton("🔗 Refer Friends", callback_data="refer")],
-                        [InlineKeyboardButton("📢 Join Channels", callback_data="join")]
-                    ]
-                    reply_markup = InlineKeyboardMarkup(keyboard)
-                    
-                    await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+                    await update.message.reply_text(text, reply_markup=self.catalog.keyboard("earn"), parse_mode='Markdown')
                     return
             
             # Show config type selection
-            keyboard = [
-                [
-                    InlineKeyboardButton("🔐 SSH Config", callback_data="gen_ssh"),
-                    InlineKeyboardButton("🚀 V2Ray Config", callback_data="gen_v2ray")
-                ],
-                [InlineKeyboardButton("🎲 Random Config", callback_data="gen_auto")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            admin_note = "\n\n👑 **Admin Mode: Unlimited Testing**" if self.is_admin(user_id) else ""
-            
+            role = "admin" if self.is_admin(user_id) else "user"
             await update.message.reply_text(
-                "🔧 **Choose File Type:**\n\n"
-                "• **SSH** - SSH tunneling files for terminal access\n"
-                "• **V2Ray** - Advanced proxy files with service packages\n"
-                "• **Random** - Let me choose the best option for you\n\n"
-                f"💰 **Cost: {POINTS_CONFIG['config_cost']} coins per file**{admin_note}",
-                reply_markup=reply_markup,
+                self.catalog.render(f"config_types:command:{role}"),
+                reply_markup=self.catalog.keyboard("config_types"),
                 parse_mode='Markdown'
             )
             
@@ -193,22 +238,178 @@ class SSHVPNBot:
             await update.message.reply_text("❌ Admin access required.")
             return
             
-        keyboard = []
-        for service_key, service_data in SERVICE_PACKAGES.items():
-            keyboard.append([InlineKeyboardButton(
-                service_data["name"], 
-                callback_data=f"admin_test_{service_key}"
-            )])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         await update.message.reply_text(
-            "👑 **Admin Testing Panel**\n\n"
-            "Select any service to generate unlimited test configs with speed test optimization:",
-            reply_markup=reply_markup,
+            self.catalog.render("admin_test"),
+            reply_markup=self.catalog.keyboard("admin_test"),
             parse_mode='Markdown'
         )
 
+    async def admin_profile_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Run the sampling profiler for N seconds and send the result (admin only)"""
+        user_id = update.effective_user.id
+        if not self.is_admin(user_id):
+            await update.message.reply_text("❌ Admin access required.")
+            return
+        
+        try:
+            seconds = int(context.args[0]) if context.args else PROFILER_CONFIG["default_seconds"]
+        except ValueError:
+            await update.message.reply_text("❌ Invalid duration. Use: /admin_profile <seconds>")
+            return
+        
+        await self.run_profile(update.effective_chat.id, seconds, context)
+
+    async def run_profile(self, chat_id: int, seconds: int, context: ContextTypes.DEFAULT_TYPE):
+        """Profile the running bot and send the collapsed stacks as a document"""
+        seconds = max(1, min(seconds, PROFILER_CONFIG["max_seconds"]))
+        
+        if profiler.running:
+            await context.bot.send_message(chat_id, "⏳ A profiling run is already in progress.")
+            return
+        
+        profiler.interval = PROFILER_CONFIG["interval"]
+        await context.bot.send_message(chat_id, f"🔬 Profiling for {seconds}s...")
+        
+        try:
+            result = await profiler.profile(seconds)
+            document = io.BytesIO(result.collapsed().encode("utf-8"))
+            await context.bot.send_document(
+                chat_id,
+                document=document,
+                filename=f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.collapsed.txt",
+                caption=result.summary()[:1024]
+            )
+        except Exception as e:
+            logger.error(f"Error running profiler: {e}")
+            await context.bot.send_message(chat_id, "❌ Profiling failed.")
+
+    async def admin_loop_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show the call sites that blocked the event loop (admin only)"""
+        user_id = update.effective_user.id
+        if not self.is_admin(user_id):
+            await update.message.reply_text("❌ Admin access required.")
+            return
+        
+        await update.message.reply_text(self.loop_report())
+
+    def loop_report(self) -> str:
+        """Plain-text event loop blocking report"""
+        status = "running" if loop_monitor.running else "stopped"
+        return (
+            f"🐢 Event Loop Blocking Report\n"
+            f"Monitor: {status} • threshold {loop_monitor.threshold * 1000:.0f} ms\n\n"
+            f"{loop_monitor.summary()}"
+        )[:4096]
+
+    async def admin_memory_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Memory report; /admin_memory start|stop toggles tracemalloc (admin only)"""
+        user_id = update.effective_user.id
+        if not self.is_admin(user_id):
+            await update.message.reply_text("❌ Admin access required.")
+            return
+        
+        action = context.args[0].lower() if context.args else ""
+        if action == "start":
+            memory_diagnostics.start()
+            await update.message.reply_text("🧠 tracemalloc started. Baseline snapshot taken; run /admin_memory later to see growth.")
+            return
+        if action == "stop":
+            memory_diagnostics.stop()
+            await update.message.reply_text("🧠 tracemalloc stopped.")
+            return
+        
+        await update.message.reply_text(self.memory_report(context))
+
+    def memory_report(self, context: ContextTypes.DEFAULT_TYPE) -> str:
+        """Plain-text memory diagnostics report"""
+        try:
+            return f"🧠 Memory Report\n\n{memory_diagnostics.report(context.application)}"[:4096]
+        except Exception as e:
+            logger.error(f"Error building memory report: {e}")
+            return "❌ Error building memory report."
+
+    async def admin_bulk_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Generate configs in bulk and send them as a file (admin only)"""
+        user_id = update.effective_user.id
+        if not self.is_admin(user_id):
+            await update.message.reply_text("❌ Admin access required.")
+            return
+        
+        usage = "❌ Use: /admin_bulk <count> [service|ssh|v2ray] [jsonl|zip]"
+        args = [arg.lower() for arg in context.args or []]
+        try:
+            count = int(args[0])
+        except (IndexError, ValueError):
+            await update.message.reply_text(usage)
+            return
+        kind = args[1] if len(args) > 1 else "all_sites"
+        output = args[2] if len(args) > 2 else "jsonl"
+        if kind not in self.catalog.services and kind not in ("ssh", "v2ray") or output not in SINKS:
+            await update.message.reply_text(usage)
+            return
+        if not 1 <= count <= BULK_CONFIG["max_count"]:
+            await update.message.reply_text(f"❌ Count must be between 1 and {BULK_CONFIG['max_count']}.")
+            return
+        
+        # Run in the background so other updates keep being processed
+        context.application.create_task(
+            self.run_bulk(update.effective_chat.id, user_id, count, kind, output, context)
+        )
+
+    async def run_bulk(self, chat_id: int, user_id: int, count: int, kind: str, output: str,
+                       context: ContextTypes.DEFAULT_TYPE):
+        """Stream a bulk job into a temporary file and send it as a document"""
+        config_type, service = ("service", kind) if kind in self.catalog.services else (kind, "all_sites")
+        status = await context.bot.send_message(chat_id, f"📦 Generating {count} {kind} configs...")
+        
+        async def on_progress(progress):
+            await status.edit_text(f"📦 Bulk {kind} ({output})\n{progress.text()}")
+        
+        try:
+            with tempfile.TemporaryFile() as fileobj:
+                progress = await bulk_generator.run(
+                    count, SINKS[output](fileobj), config_type, service, user_id=user_id, database=db,
+                    on_progress=on_progress, progress_interval=BULK_CONFIG["progress_interval"]
+                )
+                self.history.invalidate(user_id)
+                if not progress.done:
+                    await context.bot.send_message(chat_id, "❌ Bulk generation produced no configs.")
+                    return
+                fileobj.seek(0)
+                await context.bot.send_document(
+                    chat_id,
+                    document=fileobj,
+                    filename=f"bulk-{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{output}",
+                    caption=f"📦 {progress.text()}\n💾 {progress.saved} saved"
+                )
+        except Exception as e:
+            logger.error(f"Error running bulk job: {e}")
+            await context.bot.send_message(chat_id, "❌ Bulk generation failed.")
+
+    async def admin_reverify_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show or start channel membership re-verification (admin only)"""
+        user_id = update.effective_user.id
+        if not self.is_admin(user_id):
+            await update.message.reply_text("❌ Admin access required.")
+            return
+        
+        if self.reverifier.active:
+            await update.message.reply_text(f"🔁 Re-verification running\n{self.reverifier.progress.text()}")
+            return
+        
+        restart = bool(context.args) and context.args[0].lower() == "restart"
+        context.application.create_task(self.run_reverify(update.effective_chat.id, restart, context))
+        await update.message.reply_text("🔁 Re-verifying channel members in the background...")
+
+    async def run_reverify(self, chat_id: int, restart: bool, context: ContextTypes.DEFAULT_TYPE):
+        """Run one re-verification pass and report the result"""
+        try:
+            progress = await self.reverifier.run(context.bot, restart=restart)
+            await context.bot.send_message(chat_id, f"🔁 Re-verification finished\n{progress.text()}")
+        except Exception as e:
+            logger.error(f"Error re-verifying channel members: {e}")
+            await context.bot.send_message(chat_id, "❌ Re-verification failed.")
+
     async def points_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /points command"""
         try:
@@ -221,7 +422,7 @@ class SSHVPNBot:
             
             points = user["points"]
             total_configs = user["total_configs"]
-            referrals = len(user.get("referred_users", []))
+            referrals = user.get("referral_count", 0)
             
             admin_status = "\n\n👑 **Admin Status**: Unlimited Access" if self.is_admin(user_id) else ""
             
@@ -240,20 +441,80 @@ class SSHVPNBot:
 • {POINTS_CONFIG['config_cost']} coins = 1 file generation{admin_status}
 """
             
-            keyboard = [
-                [
-                    InlineKeyboardButton("🔗 Get Referral Link", callback_data="refer"),
-                    InlineKeyboardButton("📢 Join Channels", callback_data="join")
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+            await update.message.reply_text(text, reply_markup=self.catalog.keyboard("points"), parse_mode='Markdown')
             
         except Exception as e:
             logger.error(f"Error in points command: {e}")
             await update.message.reply_text("Sorry, something went wrong. Please try again.")
 
+    async def history_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /history command: newest page of the user's configs"""
+        try:
+            page = self.history.page(update.effective_user.id)
+            await update.message.reply_text(
+                self.history_text(page), reply_markup=self.catalog.history_keyboard(page), parse_mode='Markdown'
+            )
+        except Exception as e:
+            logger.error(f"Error in history command: {e}")
+            await update.message.reply_text("Sorry, something went wrong. Please try again.")
+
+    def history_text(self, page) -> str:
+        """Markdown list of one history page"""
+        if not page.items:
+            return self.catalog.render("history_empty")
+        lines = "\n".join(
+            f"• **{config.get('config_type', 'Config')}** — {TimeUtils.get_readable_time(config['created_at'])}"
+            for config in page.items
+        )
+        return self.catalog.render("history", lines=lines)
+
+    async def region_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /region command: show or set the preferred SSH server region"""
+        try:
+            user = update.effective_user
+            regions = self.regions.regions
+            if context.args:
+                choice = context.args[0].lower()
+                region = None if choice == "auto" else choice
+                if not await self.regions.choose(user.id, region):
+                    await update.message.reply_text(
+                        f"❌ Unknown region. Use one of: {', '.join(regions)} or auto"
+                    )
+                    return
+                chosen = regions[region] if region else "automatic"
+                await update.message.reply_text(f"🌍 SSH region set to **{chosen}**", parse_mode='Markdown')
+                return
+            
+            order = await self.regions.order(user.id, user.language_code)
+            lines = "\n".join(f"`{code}` {name}" for code, name in regions.items())
+            await update.message.reply_text(
+                f"🌍 **SSH Region**\n\nNext configs try **{regions[order[0]]}** first.\n\n{lines}\n\n"
+                "Use `/region <code>` to choose, or `/region auto`.",
+                parse_mode='Markdown'
+            )
+        except Exception as e:
+            logger.error(f"Error in region command: {e}")
+            await update.message.reply_text("Sorry, something went wrong. Please try again.")
+    
+    async def leaderboard_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /leaderboard command: top referrers"""
+        try:
+            top = db.get_top_referrers(10)
+            if not top:
+                await update.message.reply_text(self.catalog.render("leaderboard_empty"), parse_mode='Markdown')
+                return
+            medals = ["🥇", "🥈", "🥉"]
+            lines = "\n".join(
+                f"{medals[rank] if rank < 3 else f'{rank + 1}.'} "
+                f"{escape_markdown(user.get('username') or str(user['user_id']))} — "
+                f"{user['referral_count']} referrals"
+                for rank, user in enumerate(top)
+            )
+            await update.message.reply_text(self.catalog.render("leaderboard", lines=lines), parse_mode='Markdown')
+        except Exception as e:
+            logger.error(f"Error in leaderboard command: {e}")
+            await update.message.reply_text("Sorry, something went wrong. Please try again.")
+
     async def admin_credits_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Give admin testing credits"""
         user_id = update.effective_user.id
@@ -363,7 +624,7 @@ class SSHVPNBot:
                 await update.message.reply_text(f"❌ User {target_user_id} not found in database.")
                 return
             
-            referrals = len(target_user.get("referred_users", []))
+            referrals = target_user.get("referral_count", 0)
             joined_channels = "Yes ✅" if target_user.get("joined_channels", False) else "No ❌"
             
             user_info = f"""
@@ -391,60 +652,56 @@ class SSHVPNBot:
             await update.message.reply_text("❌ Error retrieving user information.")
 
     # Callback Query Handlers
-    async def button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle inline button callbacks"""
-        query = update.callback_query
-        await query.answer()
+    def build_router(self) -> CallbackRouter:
+        """Route table for inline button callbacks"""
+        router = CallbackRouter()
         
-        try:
-            data = query.data
-            logger.info(f"Button callback: {data} from user {query.from_user.id}")
-            
-            if data == "generate":
-                await self.handle_generate_callback(query, context)
-            elif data.startswith("gen_"):
-                await self.handle_config_generation(query, context)
-            elif data.startswith("service_"):
-                await self.handle_service_selection(query, context)
-            elif data.startswith("admin_test_"):
-                await self.handle_admin_test(query, context)
-            elif data == "admin_panel":
-                await self.handle_admin_panel(query, context)
-            elif data == "points":
-                await self.handle_points_callback(query, context)
-            elif data == "refer":
-                await self.handle_refer_callback(query, context)
-            elif data == "join":
-                await self.handle_join_callback(query, context)
-            elif data == "check_channels":
-                await self.handle_check_channels(query, context)
-            elif data == "stats":
-                await self.handle_stats_callback(query, context)
-            elif data == "help":
-                await self.handle_help_callback(query, context)
-            elif data == "qr_referral":
-                await self.handle_qr_referral(query, context)
-            elif data.startswith("qr_config"):
-                await self.handle_qr_config(query, context)
-            elif data == "main_menu":
-                await self.handle_main_menu(query, context)
-            elif data == "admin_get_credits":
-                await self.handle_admin_get_credits(query, context)
-            elif data == "admin_test_services":
-                await self.handle_admin_test_services(query, context)
-            elif data == "admin_stats":
-                await self.handle_admin_stats(query, context)
-            else:
-                logger.warning(f"Unknown callback data: {data}")
-                await query.edit_message_text("Unknown action. Please try again.")
-                
-        except Exception as e:
-            logger.error(f"Error in button callback: {e}")
-            logger.error(traceback.format_exc())
-            try:
-                await query.edit_message_text("Sorry, something went wrong. Please try again.")
-            except:
-                pass
+        def limited(action, when=None):
+            if not RATE_LIMIT["enabled"]:
+                return []
+            return [rate_limited(action, rate_limiter, self.rate_limit_exempt, when)]
+        
+        errors = errors_reply("Sorry, something went wrong. Please try again.")
+        user = [timing, errors, answer]
+        admin = [timing, errors, admin_only(self.is_admin), answer]
+        generation = [timing, errors] + limited("generate_config") + [answer]
+        # For v2ray, "gen" only opens the service menu; the service press is charged
+        direct_generation = [timing, errors] + limited("generate_config", lambda args: args[0] != "v2ray") + [answer]
+        channels = [timing, errors] + limited("channel_check") + [answer]
+        
+        # name, code, handler, params, middleware, legacy prefix
+        table = [
+            ("generate", "g", self.handle_generate_callback, (), user, None),
+            ("gen", "gn", self.handle_config_generation, ("type",), direct_generation, "gen_"),
+            ("service", "sv", self.handle_service_selection, ("service",), generation, "service_"),
+            ("points", "p", self.handle_points_callback, (), user, None),
+            ("history", "hi", self.handle_history_callback, ("direction", "cursor"), user, None),
+            ("refer", "r", self.handle_refer_callback, (), user, None),
+            ("join", "j", self.handle_join_callback, (), user, None),
+            ("check_channels", "cc", self.handle_check_channels, (), channels, None),
+            ("stats", "s", self.handle_stats_callback, (), user, None),
+            ("help", "h", self.handle_help_callback, (), user, None),
+            ("qr_referral", "qr", self.handle_qr_referral, (), user, None),
+            ("qr_config", "qc", self.handle_qr_config, ("type",), user, "qr_config_"),
+            ("main_menu", "m", self.handle_main_menu, (), user, None),
+            ("admin_panel", "ap", self.handle_admin_panel, (), admin, None),
+            ("admin_test", "at", self.handle_admin_test, ("service",), admin, "admin_test_"),
+            ("admin_test_services", "as", self.handle_admin_test_services, (), admin, None),
+            ("admin_get_credits", "ac", self.handle_admin_get_credits, (), admin, None),
+            ("admin_stats", "ast", self.handle_admin_stats, (), admin, None),
+            ("admin_profile", "apf", self.handle_admin_profile, (), admin, None),
+            ("admin_loop", "al", self.handle_admin_loop, (), admin, None),
+            ("admin_memory", "am", self.handle_admin_memory, (), admin, None)
+        ]
+        for name, code, handler, params, middleware, legacy_prefix in table:
+            router.add(name, code, handler, params, middleware, legacy_prefix)
+        router.fallback(self.handle_unknown_callback)
+        return router
+
+    async def handle_unknown_callback(self, query, context):
+        """Handle callback data that matches no route"""
+        await query.answer()
+        await query.edit_message_text("Unknown action. Please try again.")
 
     # Add all the other methods here (keeping them the same as before)
     async def handle_generate_callback(self, query, context):
@@ -456,48 +713,22 @@ class SSHVPNBot:
             
             if not check_result["can_generate"]:
                 if check_result["reason"] == "insufficient_points":
-                    text = MESSAGES["insufficient_points"].format(
-                        cost=POINTS_CONFIG["config_cost"],
-                        current=check_result["current_points"],
-                        **POINTS_CONFIG
-                    )
+                    text = self.catalog.render("insufficient_points", current=check_result["current_points"])
                 else:
                     text = "❌ Unable to generate config. Please try again later."
                 
-                keyboard = [
-                    [InlineKeyboardButton("🔗 Refer Friends", callback_data="refer")],
-                    [InlineKeyboardButton("📢 Join Channels", callback_data="join")]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+                await query.edit_message_text(text, reply_markup=self.catalog.keyboard("earn"), parse_mode='Markdown')
                 return
         
-        keyboard = [
-            [
-                InlineKeyboardButton("🔐 SSH Config", callback_data="gen_ssh"),
-                InlineKeyboardButton("🚀 V2Ray Config", callback_data="gen_v2ray")
-            ],
-            [InlineKeyboardButton("🎲 Random Config", callback_data="gen_auto")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        admin_note = "\n\n👑 **Admin Mode: Unlimited**" if self.is_admin(user_id) else ""
-        
+        role = "admin" if self.is_admin(user_id) else "user"
         await query.edit_message_text(
-            "🔧 **Choose Configuration Type:**\n\n"
-            "• **SSH** - Secure Shell access + CLI speed tests\n"
-            "• **V2Ray** - Service-specific proxy with speed test optimization\n"
-            "• **Random** - Let me choose for you\n\n"
-            f"⚡ **All configs include speed test optimization!**{admin_note}",
-            reply_markup=reply_markup,
+            self.catalog.render(f"config_types:callback:{role}"),
+            reply_markup=self.catalog.keyboard("config_types"),
             parse_mode='Markdown'
         )
 
-    async def handle_config_generation(self, query, context):
+    async def handle_config_generation(self, query, context, config_type):
         """Handle config generation with service selection"""
-        user_id = query.from_user.id
-        config_type = query.data.replace("gen_", "")
-        
         if config_type == "v2ray":
             await self.show_service_selection(query, context)
         else:
@@ -505,79 +736,47 @@ class SSHVPNBot:
 
     async def show_service_selection(self, query, context):
         """Show service package selection"""
-        keyboard = []
-        
-        row = []
-        for service_key, service_data in SERVICE_PACKAGES.items():
-            if len(row) == 2:
-                keyboard.append(row)
-                row = []
-            
-            row.append(InlineKeyboardButton(
-                service_data["name"],
-                callback_data=f"service_{service_key}"
-            ))
-        
-        if row:
-            keyboard.append(row)
-        
-        keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="generate")])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         await query.edit_message_text(
-            "📦 **Select Service Package:**\n\n"
-            "Choose which app/service you want to use:\n\n"
-            "🎥 **YouTube** - For video streaming\n"
-            "📱 **WhatsApp** - For messaging & calls\n"
-            "📹 **Zoom** - For video conferences\n"
-            "📘 **Facebook** - For social media\n"
-            "📷 **Instagram** - For photo sharing\n"
-            "🎵 **TikTok** - For short videos\n"
-            "🎬 **Netflix** - For movies & shows\n"
-            "✈️ **Telegram** - For messaging\n"
-            "⚡ **Speed Test** - For testing speed\n"
-            "🌐 **All Sites** - Universal access\n\n"
-            f"💰 **Cost: {POINTS_CONFIG['config_cost']} coins**",
-            reply_markup=reply_markup,
+            self.catalog.render("services"),
+            reply_markup=self.catalog.keyboard("services"),
             parse_mode='Markdown'
         )
 
-    async def handle_service_selection(self, query, context):
+    async def handle_service_selection(self, query, context, service_key):
         """Handle service package selection"""
-        user_id = query.from_user.id
-        service_key = query.data.replace("service_", "")
+        if service_key not in self.catalog.services:
+            await self.handle_unknown_service(query)
+            return
         
         context.user_data['selected_service'] = service_key
         await self.generate_service_config(query, context, service_key, is_admin_test=False)
 
-    async def handle_admin_test(self, query, context):
+    async def handle_admin_test(self, query, context, service_key):
         """Handle admin testing"""
-        user_id = query.from_user.id
-        if not self.is_admin(user_id):
-            await query.answer("❌ Admin access required.", show_alert=True)
+        if service_key not in self.catalog.services:
+            await self.handle_unknown_service(query)
             return
-            
-        service_key = query.data.replace("admin_test_", "")
+        
         context.user_data['selected_service'] = service_key
         
         await self.generate_service_config(query, context, service_key, is_admin_test=True)
 
+    async def handle_unknown_service(self, query):
+        """Handle a service key that is no longer offered"""
+        await query.edit_message_text(
+            "❌ This service package is no longer available.",
+            reply_markup=self.catalog.keyboard("unknown_service")
+        )
+
     async def generate_service_config(self, query, context, service_key, is_admin_test=False):
         """Generate V2Ray config for specific service"""
         user_id = query.from_user.id
         
-        service_name = SERVICE_PACKAGES[service_key]["name"]
+        service_name = self.catalog.services[service_key]["name"]
         admin_prefix = "👑 **Admin Testing** - " if is_admin_test else ""
         
         await query.edit_message_text(
-            f"{admin_prefix}🔄 **Generating {service_name} Configuration...**\n\n"
-            "Creating optimized V2Ray config with:\n"
-            "• Speed test optimization enabled\n"
-            "• Direct routing for speed test sites\n"
-            "• TCP optimization for performance\n"
-            "• HTTP Injector compatibility\n\n"
-            "Please wait a moment..."
+            self.catalog.render("service_generating", admin_prefix=admin_prefix, service_name=service_name)
         )
         
         try:
@@ -602,53 +801,31 @@ class SSHVPNBot:
                 )
                 return
             
+            config_id = None
             if not is_admin_test:
-                db.save_config(user_id, config_data["type"], str(config_data))
+                config_id = db.save_config(user_id, config_data["type"], str(config_data))
+                self.history.invalidate(user_id)
                 stats_collector.update_config_stats(config_data["type"])
             
             formatted_config = self.format_service_config(config_data, service_key)
             
             admin_note = "\n\n👑 **Admin Test Mode** - Config generated for testing purposes." if is_admin_test else ""
             
-            success_message = f"""
-✅ **{service_name} File Generated Successfully!**
-
-💰 Coins remaining: **{points_remaining}**
-
-📋 **File Details:**
-{formatted_config}
-
-⚡ **Speed Test Information:**
-{self.get_speed_test_info(config_data)}
-
-🔧 **How to Use This File:**
-1. Copy the VMess link above
-2. Download HTTP Injector app from Play Store
-3. Open app → Config → Import → VMess
-4. Paste the link and save
-5. Use the payload for best performance
-6. Connect and browse any website freely!{admin_note}
-
-💡 **This file allows unrestricted internet access!**
-"""
-            
-            keyboard = []
-            if not is_admin_test:
-                keyboard.extend([
-                    [InlineKeyboardButton("📱 Generate QR Code", callback_data=f"qr_config_{config_data['type']}")],
-                    [InlineKeyboardButton("🔄 Generate Another", callback_data="generate")]
-                ])
-            else:
-                keyboard.extend([
-                    [InlineKeyboardButton("🧪 Test Another Service", callback_data="admin_test_all")],
-                    [InlineKeyboardButton("👑 Admin Panel", callback_data="admin_panel")]
-                ])
-            
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            success_message = self.catalog.render(
+                "service_success",
+                service_name=service_name,
+                points_remaining=points_remaining,
+                formatted_config=formatted_config,
+                speed_test_info=self.get_speed_test_info(config_data),
+                admin_note=admin_note
+            )
+            reply_markup = self.catalog.service_done_keyboard(config_data['type'], is_admin_test)
             
             await query.edit_message_text(success_message, reply_markup=reply_markup, parse_mode='Markdown')
             
-            context.user_data['last_config'] = config_data
+            if config_id:
+                # A reference to the saved config (db.get_config), not the config itself
+                context.user_data['last_config'] = config_id
             
         except Exception as e:
             logger.error(f"Error generating service config: {e}")
@@ -679,43 +856,15 @@ class SSHVPNBot:
 
     def format_service_config(self, config_data, service_key):
         """Format service-specific config for display"""
-        try:
-            service_info = SERVICE_PACKAGES.get(service_key, {
-                "name": "Custom Service",
-                "description": "Custom configuration",
-                "hosts": ["*"],
-                "emoji": "🔧"
-            })
-        except:
-            service_info = {
-                "name": "Custom Service", 
-                "description": "Custom configuration",
-                "hosts": ["*"],
-                "emoji": "🔧"
-            }
-        
         if config_data.get("type") in ["VMess", "VLess"]:
-            return f"""
-🚀 **{service_info["name"]} Configuration**
-
-**Service Package:** {service_info["emoji"]} {service_info["name"]}
-**Optimized For:** {service_info["description"]}
-**Config Type:** {config_data.get("type")}
-
-**VMess Link for HTTP Injector:**
-```
-{config_data.get("link", "N/A")}
-```
-
-**Payload for HTTP Injector:**
-```
-{config_data.get("payload", "No payload available")}
-```
-
-**Transport:** {config_data.get("config", {}).get("net", "tcp")} (Optimized for speed tests)
-**Multiplexing:** Disabled (Better for speed tests)
-**Direct Routing:** Enabled for speed test domains
-"""
+            name = f"service_config:{service_key}"
+            return self.catalog.render(
+                name if name in self.catalog.messages else "service_config:*",
+                config_type=config_data.get("type"),
+                link=config_data.get("link", "N/A"),
+                payload=config_data.get("payload", "No payload available"),
+                net=config_data.get("config", {}).get("net", "tcp")
+            )
         else:
             return self.formatter.format_config(config_data)
 
@@ -723,37 +872,14 @@ class SSHVPNBot:
     async def handle_admin_panel(self, query, context):
         """Handle admin panel"""
         user_id = query.from_user.id
-        if not self.is_admin(user_id):
-            await query.answer("❌ Admin access required.", show_alert=True)
-            return
-        
-        keyboard = [
-            [InlineKeyboardButton("💰 Get Testing Credits", callback_data="admin_get_credits")],
-            [InlineKeyboardButton("🧪 Test Service Packages", callback_data="admin_test_services")],
-            [InlineKeyboardButton("📊 View Bot Statistics", callback_data="admin_stats")],
-            [InlineKeyboardButton("🔙 Main Menu", callback_data="main_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
         
         # Get admin's current credits
         admin_user = db.get_user(user_id)
         current_credits = admin_user['points'] if admin_user else 0
         
         await query.edit_message_text(
-            "👑 **Admin Control Panel**\n\n"
-            f"💰 **Your Credits:** {current_credits}\n\n"
-            "**Admin Privileges:**\n"
-            "✅ Unlimited config generation\n"
-            "✅ Test all service packages\n"
-            "✅ Credit management system\n"
-            "✅ User management tools\n"
-            "✅ Speed test optimization\n\n"
-            "**Available Commands:**\n"
-            "/admin_credits - Get 1000 testing credits\n"
-            "/give_credits <user_id> <amount> - Give credits to user\n"
-            "/check_user <user_id> - Check user details\n"
-            "/admin_test - Test service packages",
-            reply_markup=reply_markup,
+            self.catalog.render("admin_panel", credits=current_credits),
+            reply_markup=self.catalog.keyboard("admin_panel"),
             parse_mode='Markdown'
         )
 
@@ -762,6 +888,13 @@ class SSHVPNBot:
         """Handle points callback"""
         await query.edit_message_text("Use /points command to check your points.")
 
+    async def handle_history_callback(self, query, context, direction, cursor):
+        """Show the history page next to the cursor carried in the button"""
+        page = self.history.page(query.from_user.id, direction, cursor)
+        await query.edit_message_text(
+            self.history_text(page), reply_markup=self.catalog.history_keyboard(page), parse_mode='Markdown'
+        )
+
     async def handle_refer_callback(self, query, context):
         """Handle referral callback"""
         user_id = query.from_user.id
@@ -797,28 +930,9 @@ Share this link with friends to earn points!
             )
             return
         
-        channel_buttons = []
-        for channel in CHANNELS:
-            channel_buttons.append([InlineKeyboardButton(
-                f"📢 Join {channel['name']}", 
-                url=channel['url']
-            )])
-        
-        channel_buttons.append([InlineKeyboardButton(
-            "✅ I Joined Both Channels", 
-            callback_data="check_channels"
-        )])
-        
-        reply_markup = InlineKeyboardMarkup(channel_buttons)
-        
         await query.edit_message_text(
-            f"📢 **Join Sponsor Channels**\n\n"
-            f"Join **BOTH** channels below to earn **{POINTS_CONFIG['channel_join']} coins**:\n\n"
-            f"1️⃣ {CHANNELS[0]['name']}\n"
-            f"2️⃣ {CHANNELS[1]['name']}\n\n"
-            "After joining **both** channels, click the button below to verify and claim your coins!\n\n"
-            "💡 **Important:** You must join BOTH channels to get the reward.",
-            reply_markup=reply_markup,
+            self.catalog.render("join_channels"),
+            reply_markup=self.catalog.keyboard("channels"),
             parse_mode='Markdown'
         )
 
@@ -835,22 +949,44 @@ Share this link with friends to earn points!
             )
             return
         
-        # Try to verify membership (simplified - in production you'd check actual membership)
         try:
-            # For now, we'll trust the user and award points
-            # In production, you would verify membership using bot.get_chat_member()
-            success = db.add_points(user_id, POINTS_CONFIG['channel_join'], "Joined channels")
+            result = await membership_verifier.verify(context.bot, user_id)
             
-            if success:
-                db.set_channels_joined(user_id, True)
+            if result.missing:
+                names = "\n".join(
+                    f"• {channel['name']}" for channel in CHANNELS if channel["id"] in result.missing
+                )
+                await query.edit_message_text(
+                    "❌ **Not Joined Yet**\n\n"
+                    f"Please join these channels first:\n{names}\n\n"
+                    "Then tap the button again to claim your coins.",
+                    reply_markup=self.catalog.keyboard("channels")
+                )
+                return
+            
+            if not result.joined:
+                await query.edit_message_text(
+                    "⏳ **Couldn't Verify Right Now**\n\n"
+                    "Telegram didn't answer in time. Please try again in a moment.",
+                    reply_markup=self.catalog.keyboard("channels")
+                )
+                return
+            
+            claimed = db.claim_channel_reward(user_id, POINTS_CONFIG['channel_join'])
+            if claimed:
                 await query.edit_message_text(
                     f"🎉 **Congratulations!**\n\n"
                     f"You earned **+{POINTS_CONFIG['channel_join']} coins** for joining both channels!\n\n"
-                    f"💰 Total coins: **{user['points'] + POINTS_CONFIG['channel_join']}**\n\n"
+                    f"💰 Total coins: **{claimed['points']}**\n\n"
                     "Now you can generate more files! Use /generate to create SSH or V2Ray files."
                 )
             else:
-                await query.edit_message_text("❌ Error awarding coins. Please try again later.")
+                # Users who left and came back are marked as joined again, without a second reward
+                db.set_channels_joined(user_id, True)
+                await query.edit_message_text(
+                    "✅ **Already Claimed!**\n\n"
+                    f"You have already claimed your {POINTS_CONFIG['channel_join']} coins for joining channels."
+                )
         except Exception as e:
             logger.error(f"Error checking channels for user {user_id}: {e}")
             await query.edit_message_text("❌ Error verifying membership. Please try again later.")
@@ -861,13 +997,13 @@ Share this link with friends to earn points!
 
     async def handle_help_callback(self, query, context):
         """Handle help callback"""
-        await query.edit_message_text(MESSAGES["help"], parse_mode='Markdown')
+        await query.edit_message_text(self.catalog.render("help"), parse_mode='Markdown')
 
     async def handle_qr_referral(self, query, context):
         """Handle QR code generation for referral"""
         await query.edit_message_text("📱 QR code generation coming soon!")
 
-    async def handle_qr_config(self, query, context):
+    async def handle_qr_config(self, query, context, config_type):
         """Handle QR code generation for config"""
         await query.edit_message_text("📱 QR code generation coming soon!")
 
@@ -878,9 +1014,6 @@ Share this link with friends to earn points!
     async def handle_admin_get_credits(self, query, context):
         """Handle admin get credits callback"""
         user_id = query.from_user.id
-        if not self.is_admin(user_id):
-            await query.answer("❌ Admin access required.", show_alert=True)
-            return
         
         try:
             success = db.give_admin_credits(user_id, 1000)
@@ -908,47 +1041,14 @@ Share this link with friends to earn points!
 
     async def handle_admin_test_services(self, query, context):
         """Handle admin test services callback"""
-        user_id = query.from_user.id
-        if not self.is_admin(user_id):
-            await query.answer("❌ Admin access required.", show_alert=True)
-            return
-        
-        keyboard = []
-        for service_key, service_data in SERVICE_PACKAGES.items():
-            keyboard.append([InlineKeyboardButton(
-                f"🧪 Test {service_data['name']}", 
-                callback_data=f"admin_test_{service_key}"
-            )])
-        
-        keyboard.append([InlineKeyboardButton("🔙 Admin Panel", callback_data="admin_panel")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         await query.edit_message_text(
-            "🧪 **Admin Service Testing**\n\n"
-            "Test any service package to ensure proper functionality:\n\n"
-            "**Available Packages:**\n"
-            "• YouTube - Video streaming optimization\n"
-            "• WhatsApp - Messaging & calls\n"
-            "• Zoom - Video conferencing\n"
-            "• Facebook - Social media\n"
-            "• Instagram - Photo sharing\n"
-            "• TikTok - Short videos\n"
-            "• Netflix - Movie streaming\n"
-            "• Telegram - Messaging\n"
-            "• Speed Test - Network testing\n"
-            "• All Sites - Universal access\n\n"
-            "Select a service to generate a test file:",
-            reply_markup=reply_markup,
+            self.catalog.render("admin_test_services"),
+            reply_markup=self.catalog.keyboard("admin_test_services"),
             parse_mode='Markdown'
         )
 
     async def handle_admin_stats(self, query, context):
         """Handle admin statistics callback"""
-        user_id = query.from_user.id
-        if not self.is_admin(user_id):
-            await query.answer("❌ Admin access required.", show_alert=True)
-            return
-        
         try:
             stats = db.get_user_stats()
             
@@ -973,15 +1073,26 @@ Share this link with friends to earn points!
 🧪 Testing Mode: Available
 """
             
-            keyboard = [[InlineKeyboardButton("🔙 Admin Panel", callback_data="admin_panel")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await query.edit_message_text(stats_text, reply_markup=reply_markup, parse_mode='Markdown')
+            await query.edit_message_text(
+                stats_text, reply_markup=self.catalog.keyboard("back_to_admin"), parse_mode='Markdown'
+            )
             
         except Exception as e:
             logger.error(f"Error getting admin stats: {e}")
             await query.edit_message_text("❌ Error retrieving statistics.")
 
+    async def handle_admin_profile(self, query, context):
+        """Handle admin profiling callback"""
+        await self.run_profile(query.message.chat_id, PROFILER_CONFIG["default_seconds"], context)
+
+    async def handle_admin_loop(self, query, context):
+        """Handle admin event loop report callback"""
+        await query.edit_message_text(self.loop_report(), reply_markup=self.catalog.keyboard("back_to_admin"))
+
+    async def handle_admin_memory(self, query, context):
+        """Handle admin memory report callback"""
+        await query.edit_message_text(self.memory_report(context), reply_markup=self.catalog.keyboard("back_to_admin"))
+
     async def generate_config_direct(self, query, context, config_type):
         """Generate SSH or auto config directly"""
         user_id = query.from_user.id
@@ -1000,7 +1111,8 @@ Share this link with friends to earn points!
             else:
                 points_remaining = "Unlimited (Admin)"
             
-            config_data = generator.generate_config(config_type)
+            regions = await self.regions.order(user_id, query.from_user.language_code)
+            config_data = await generator.generate_config(config_type, regions=regions)
             
             if not config_data:
                 await query.edit_message_text(
@@ -1010,8 +1122,11 @@ Share this link with friends to earn points!
                 )
                 return
             
-            db.save_config(user_id, config_data["type"], str(config_data))
+            config_id = db.save_config(user_id, config_data["type"], str(config_data))
+            self.history.invalidate(user_id)
             stats_collector.update_config_stats(config_data["type"])
+            if config_data.get("region"):
+                await self.regions.record_success(user_id, config_data["region"])
             
             formatted_config = self.formatter.format_config(config_data)
             
@@ -1037,14 +1152,12 @@ Share this link with friends to earn points!
 💡 **This file provides secure shell access for browsing!**
 """ + (speed_test_note or "")
             
-            keyboard = [
-                [InlineKeyboardButton("🔄 Generate Another", callback_data="generate")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await query.edit_message_text(success_message, reply_markup=reply_markup, parse_mode='Markdown')
+            await query.edit_message_text(
+                success_message, reply_markup=self.catalog.keyboard("generate_another"), parse_mode='Markdown'
+            )
             
-            context.user_data['last_config'] = config_data
+            if config_id:
+                context.user_data['last_config'] = config_id
             
         except Exception as e:
             logger.error(f"Error generating config: {e}")
@@ -1058,17 +1171,36 @@ Share this link with friends to earn points!
         """Setup all command and callback handlers"""
         app = self.application
         
-        # Command handlers
-        app.add_handler(CommandHandler("start", self.start_command))
-        app.add_handler(CommandHandler("generate", self.generate_command))
-        app.add_handler(CommandHandler("points", self.points_command))
-        app.add_handler(CommandHandler("admin_test", self.admin_test_command))
-        app.add_handler(CommandHandler("admin_credits", self.admin_credits_command))
-        app.add_handler(CommandHandler("give_credits", self.give_credits_command))
-        app.add_handler(CommandHandler("check_user", self.check_user_command))
+        # Command handlers (timed per command)
+        commands = [
+            ("start", self.start_command),
+            ("generate", self.generate_command),
+            ("points", self.points_command),
+            ("history", self.history_command),
+            ("region", self.region_command),
+            ("leaderboard", self.leaderboard_command),
+            ("admin_test", self.admin_test_command),
+            ("admin_credits", self.admin_credits_command),
+            ("give_credits", self.give_credits_command),
+            ("check_user", self.check_user_command),
+            ("admin_profile", self.admin_profile_command),
+            ("admin_loop", self.admin_loop_command),
+            ("admin_memory", self.admin_memory_command),
+            ("admin_bulk", self.admin_bulk_command),
+            ("admin_reverify", self.admin_reverify_command)
+        ]
+        for name, callback in commands:
+            app.add_handler(CommandHandler(
+                name, timed_handler("command", name, traced_handler("command", name, callback))
+            ))
+        
+        # Callback query handler (middleware per route in self.router)
+        app.add_handler(CallbackQueryHandler(traced_handler(
+            "callback", lambda update: self.router.route_name(update.callback_query.data or ""), self.router.dispatch
+        )))
         
-        # Callback query handler
-        app.add_handler(CallbackQueryHandler(self.button_callback))
+        QUEUE_DEPTH.labels("updates").set_function(app.update_queue.qsize)
+        bind_memory_metrics(app)
         
         # Error handler
         app.add_error_handler(self.error_handler)
@@ -1080,11 +1212,25 @@ Share this link with friends to earn points!
         logger.error(f"Exception while handling an update: {context.error}")
         logger.error(traceback.format_exc())
 
+    def start_metrics(self):
+        """Serve /metrics; worker N of a multi-process setup uses METRICS_PORT + 1 + N"""
+        if not METRICS_CONFIG["enabled"]:
+            return
+        port = METRICS_CONFIG["port"]
+        if self.shard_index is not None:
+            port += 1 + self.shard_index
+        try:
+            start_metrics_server(METRICS_CONFIG["host"], port)
+        except OSError as e:
+            logger.error(f"Metrics endpoint failed to start: {e}")
+
     def run(self):
         """Run the bot"""
         try:
             self.initialize()
             self.setup_handlers()
+            configure_tracing(TRACING_CONFIG)
+            self.start_metrics()
             
             logger.info("Starting Enhanced SSH/V2Ray Service Bot (Python 3.13 Compatible)...")
             
@@ -1105,12 +1251,57 @@ Share this link with friends to earn points!
             logger.error(traceback.format_exc())
             raise
 
+    async def serve_shard(self, index: int, path: Optional[str] = None, base_url: Optional[str] = None):
+        """Process the updates the shard front routes to worker ``index`` until SIGINT/SIGTERM"""
+        self.shard_index = index
+        self.initialize(base_url)
+        self.setup_handlers()
+        configure_tracing(TRACING_CONFIG)
+        self.start_metrics()
+        
+        app = self.application
+        
+        async def enqueue(data: Dict):
+            await app.update_queue.put(Update.de_json(data, app.bot))
+        
+        worker = ShardWorker(path or socket_path(index), enqueue)
+        async with app:
+            await self.post_init(app)
+            await app.start()
+            await worker.start()
+            logger.info(f"Shard worker {index} ready")
+            try:
+                await wait_for_signal()
+            finally:
+                await worker.stop()
+                await app.stop()
+                await self.post_shutdown(app)
+
+    def run_worker(self, index: int):
+        """Run as worker ``index`` behind the shard front"""
+        try:
+            asyncio.run(self.serve_shard(index))
+        except Exception as e:
+            logger.error(f"Error running shard worker {index}: {e}")
+            logger.error(traceback.format_exc())
+            raise
+
 # Main execution
 def main():
     """Main function to run the bot"""
     try:
-        bot = SSHVPNBot()
-        bot.run()
+        if "--worker" in sys.argv:
+            SSHVPNBot().run_worker(int(sys.argv[sys.argv.index("--worker") + 1]))
+        elif SHARD_CONFIG["workers"] > 1:
+            # Front process: poll Telegram and route updates to the workers.
+            # Migrate once here so the workers start on the fast path.
+            db.migrate()
+            if METRICS_CONFIG["enabled"]:
+                start_metrics_server(METRICS_CONFIG["host"], METRICS_CONFIG["port"])
+            asyncio.run(run_front(Bot(BOT_TOKEN)))
+        else:
+            bot = SSHVPNBot()
+            bot.run()
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     except Exception as e:
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from metrics import BOT_API_BUDGET_TOKENS, BOT_API_CALLS, Counter
+
+class ApiBudget:
+    """Token bucket for outbound API calls (the Bot API, provider sites)
+
+    ``rate`` calls per second refill up to ``burst``. Interactive calls
+    ``charge(caller)`` and never wait (the bucket may go into debt); background
+    work ``await acquire(caller)``, which also leaves ``reserve`` tokens
+    untouched, and so only uses what interactive traffic leaves. Usage is
+    counted per caller in ``calls`` (``bot_api_calls_total`` by default) and
+    the remaining tokens are exported through ``gauge``. A transport that
+    charges every call with ``charge_call`` skips calls made inside
+    ``prepaid()``, whose token the caller already took.
+    """
+
+    def __init__(self, rate: float = 25.0, burst: int = 30, reserve: float = 0.0,
+                 gauge=BOT_API_BUDGET_TOKENS, calls: Counter = BOT_API_CALLS):
+        self.rate = rate
+        self.burst = burst
+        self.reserve = reserve
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop = None
+        self.calls = calls
+        self.used: Dict[str, int] = {}
+        # True while a call whose token was already taken is in flight
+        self._prepaid: ContextVar[bool] = ContextVar(f"api_budget_prepaid_{id(self)}", default=False)
+        gauge.set_function(self.available)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self) -> float:
+        """Tokens currently available
+
+        Read-only: the gauge calls this from the metrics server thread, so it
+        must not refill (and race with ``charge``/``acquire`` on the loop).
+        """
+        return min(self.burst, self._tokens + (time.monotonic() - self._updated) * self.rate)
+
+    def charge(self, caller: str):
+        """Take a token without waiting (debt is capped at one burst)"""
+        self._refill()
+        self._tokens = max(self._tokens - 1, -self.burst)
+        self._count(caller)
+
+    async def acquire(self, caller: str):
+        """Wait for a token and charge it to ``caller``"""
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock, self._loop = asyncio.Lock(), loop
+        # One waiter at a time so tokens are handed out in arrival order
+        async with self._lock:
+            needed = min(1 + self.reserve, self.burst)
+            self._refill()
+            while self._tokens < needed:
+                await asyncio.sleep((needed - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+        self._count(caller)
+
+    def charge_call(self, caller: str):
+        """Charge an outbound call at the transport, unless it is ``prepaid``"""
+        if not self._prepaid.get():
+            self.charge(caller)
+
+    @contextmanager
+    def prepaid(self):
+        """Mark calls made inside the block as already charged or acquired"""
+        token = self._prepaid.set(True)
+        try:
+            yield
+        finally:
+            self._prepaid.reset(token)
+
+    def _count(self, caller: str):
+        self.used[caller] = self.used.get(caller, 0) + 1
+        self.calls.labels(caller).inc()
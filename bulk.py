@@ -0,0 +1,204 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+import zipfile
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from config import BULK_CONFIG
+from generator import generator, is_demo_config
+from metrics import BULK_CONFIGS
+from qrgen import qr_generator
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class BulkProgress:
+    """Counters for one bulk generation job"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.saved = 0
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def rate(self) -> float:
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    def text(self) -> str:
+        """One-line progress for chat messages and logs"""
+        processed = self.done + self.failed
+        percent = processed * 100 // self.total if self.total else 100
+        line = f"{processed}/{self.total} ({percent}%) • {self.done} ok • {self.failed} failed • {self.rate:.1f}/s"
+        if self.finished is None and self.rate > 0:
+            line += f" • ~{(self.total - processed) / self.rate:.0f}s left"
+        return line
+
+class JsonlSink:
+    """Write one JSON object per config, one line each"""
+
+    extension = "jsonl"
+    wants_qr = False
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+
+    def write(self, index: int, config: Dict, qr: Optional[bytes] = None):
+        line = json.dumps({"index": index, **config}, default=str, ensure_ascii=False)
+        self.fileobj.write(line.encode("utf-8") + b"\n")
+
+    def close(self):
+        self.fileobj.flush()
+
+class ZipSink:
+    """Write config-NNNN.json and config-NNNN.png per config into a zip archive"""
+
+    extension = "zip"
+    wants_qr = True
+
+    def __init__(self, fileobj, width: int = 4):
+        self.archive = zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED)
+        self.width = width
+
+    def write(self, index: int, config: Dict, qr: Optional[bytes] = None):
+        name = f"config-{index + 1:0{self.width}d}"
+        self.archive.writestr(f"{name}.json", json.dumps(config, default=str, ensure_ascii=False, indent=2))
+        if qr:
+            # PNG is already compressed
+            self.archive.writestr(f"{name}.png", qr, compress_type=zipfile.ZIP_STORED)
+
+    def close(self):
+        self.archive.close()
+
+SINKS = {"jsonl": JsonlSink, "zip": ZipSink}
+
+class BulkGenerator:
+    """Generate many configs with bounded concurrency and stream them to a sink
+
+    At most ``concurrency`` configs are generated at a time; provider HTTP is
+    awaited on the loop and VMess/QR rendering runs in worker threads. Finished configs pass through a queue of
+    ``2 * concurrency`` slots, so a slow sink pauses the workers instead of
+    letting results pile up; only the pending database batch is kept.
+    """
+
+    def __init__(self, main_generator, qr_generator=None, concurrency: int = 8, flush_size: int = 100):
+        self.generator = main_generator
+        self.qr_generator = qr_generator
+        self.concurrency = concurrency
+        self.flush_size = flush_size
+
+    async def make_one(self, config_type: str, service: str, with_qr: bool) -> Tuple[Optional[Dict], Optional[bytes]]:
+        """Generate one config (and its QR code); CPU-bound steps run in a worker thread"""
+        if config_type == "service":
+            config = await asyncio.to_thread(self.generator.generate_service_config, service)
+        else:
+            config = await self.generator.generate_config(config_type, service)
+        if config is None:
+            return None, None
+        if is_demo_config(config):
+            # Providers failed and the generator fell back to a placeholder
+            logger.warning(f"Bulk {config_type} config fell back to a demo config; counted as failed")
+            return None, None
+        qr = None
+        if with_qr and self.qr_generator:
+            qr = await asyncio.to_thread(self.qr_generator.generate_config_qr, config)
+        return config, qr
+
+    async def stream(self, count: int, config_type: str = "service", service: str = "all_sites",
+                     with_qr: bool = False, concurrency: int = None) -> AsyncIterator[Tuple[int, Optional[Dict], Optional[bytes]]]:
+        """Yield (index, config, qr) in completion order; config is None on failure"""
+        concurrency = max(1, min(concurrency or self.concurrency, count or 1))
+        queue: asyncio.Queue = asyncio.Queue(maxsize=2 * concurrency)
+        indexes = iter(range(count))
+        done = object()
+
+        async def worker():
+            for index in indexes:
+                try:
+                    config, qr = await self.make_one(config_type, service, with_qr)
+                except Exception as e:
+                    logger.error(f"Bulk config {index} failed: {e}")
+                    config, qr = None, None
+                await queue.put((index, config, qr))
+            await queue.put(done)
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        try:
+            remaining = len(workers)
+            while remaining:
+                item = await queue.get()
+                if item is done:
+                    remaining -= 1
+                    continue
+                yield item
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def run(self, count: int, sink, config_type: str = "service", service: str = "all_sites",
+                  user_id: int = None, database=None, concurrency: int = None,
+                  on_progress: Callable = None, progress_interval: float = 2.0) -> BulkProgress:
+        """Generate ``count`` configs into ``sink``, saving them in bulk for ``user_id``
+
+        ``on_progress(progress)`` may be a coroutine function; it is called at
+        most every ``progress_interval`` seconds and once at the end.
+        """
+        progress = BulkProgress(count)
+        batch_id = uuid.uuid4().hex
+        pending: List[Dict] = []
+        last_report = time.monotonic()
+
+        async def flush():
+            if pending and database is not None and user_id is not None:
+                progress.saved += await asyncio.to_thread(database.save_configs, user_id, list(pending), batch_id)
+            pending.clear()
+
+        async def report():
+            if on_progress is None:
+                return
+            try:
+                result = on_progress(progress)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.warning(f"Bulk progress callback failed: {e}")
+
+        try:
+            async for index, config, qr in self.stream(count, config_type, service, sink.wants_qr, concurrency):
+                if config is None:
+                    progress.failed += 1
+                    BULK_CONFIGS.labels("failed").inc()
+                else:
+                    sink.write(index, config, qr)
+                    progress.done += 1
+                    BULK_CONFIGS.labels("ok").inc()
+                    pending.append(config)
+                    if len(pending) >= self.flush_size:
+                        await flush()
+
+                if time.monotonic() - last_report >= progress_interval:
+                    last_report = time.monotonic()
+                    await report()
+            await flush()
+        finally:
+            sink.close()
+            progress.finished = time.monotonic()
+
+        logger.info(f"Bulk job {batch_id} finished: {progress.text()}")
+        await report()
+        return progress
+
+# Global bulk generator instance
+bulk_generator = BulkGenerator(
+    generator, qr_generator, concurrency=BULK_CONFIG["concurrency"], flush_size=BULK_CONFIG["flush_size"]
+)
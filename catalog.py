@@ -0,0 +1,338 @@
+import hashlib
+import json
+import logging
+import time
+from typing import Dict, Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+import config
+import generator
+from utils import Template
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def build_service_packages(payloads: Dict) -> Dict:
+    """Service package display data derived from SERVICE_PAYLOADS"""
+    packages = {}
+    for key, payload_data in payloads.items():
+        packages[key] = {
+            "name": payload_data["name"],
+            "hosts": [payload_data["host"]] if payload_data["host"] != "www.google.com" else ["*"],
+            "description": payload_data["description"],
+            "emoji": payload_data["name"][0] if payload_data["name"] else "🔧"
+        }
+    return packages
+
+SERVICE_CONFIG_TEXT = """
+🚀 **{service_name} Configuration**
+
+**Service Package:** {emoji} {service_name}
+**Optimized For:** {description}
+**Config Type:** {config_type}
+
+**VMess Link for HTTP Injector:**
+```
+{link}
+```
+
+**Payload for HTTP Injector:**
+```
+{payload}
+```
+
+**Transport:** {net} (Optimized for speed tests)
+**Multiplexing:** Disabled (Better for speed tests)
+**Direct Routing:** Enabled for speed test domains
+"""
+
+SERVICE_SUCCESS_TEXT = """
+✅ **{service_name} File Generated Successfully!**
+
+💰 Coins remaining: **{points_remaining}**
+
+📋 **File Details:**
+{formatted_config}
+
+⚡ **Speed Test Information:**
+{speed_test_info}
+
+🔧 **How to Use This File:**
+1. Copy the VMess link above
+2. Download HTTP Injector app from Play Store
+3. Open app → Config → Import → VMess
+4. Paste the link and save
+5. Use the payload for best performance
+6. Connect and browse any website freely!{admin_note}
+
+💡 **This file allows unrestricted internet access!**
+"""
+
+class Catalog:
+    """Keyboards and message templates built once and shared by every update
+
+    Markups are immutable PTB objects, so one instance per role can be sent
+    in any number of messages. The catalog fingerprints SERVICE_PAYLOADS and
+    the config values it renders, re-checks them at most every
+    ``revalidate_interval`` seconds and rebuilds when they changed.
+    """
+
+    def __init__(self, router, revalidate_interval: float = 5.0):
+        self.router = router
+        self.revalidate_interval = revalidate_interval
+        self.services: Dict[str, Dict] = {}
+        self.keyboards: Dict[str, InlineKeyboardMarkup] = {}
+        self.messages: Dict[str, Template] = {}
+        self.version = 0
+        self._fingerprint: Optional[str] = None
+        self._next_check = 0.0
+        self._after_service: Dict[str, InlineKeyboardMarkup] = {}
+        self.refresh()
+
+    @staticmethod
+    def fingerprint() -> str:
+        """Digest of every input the catalog is built from"""
+        inputs = [generator.SERVICE_PAYLOADS, config.MESSAGES, config.POINTS_CONFIG, config.CHANNELS]
+        raw = json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+    def refresh(self) -> bool:
+        """Rebuild if the inputs changed; returns True when rebuilt"""
+        self._next_check = time.monotonic() + self.revalidate_interval
+        fingerprint = self.fingerprint()
+        if fingerprint == self._fingerprint:
+            return False
+        self._build()
+        self._fingerprint = fingerprint
+        self.version += 1
+        logger.info(f"Keyboard and message catalog built (version {self.version})")
+        return True
+
+    def invalidate(self):
+        """Force a fingerprint check on the next lookup"""
+        self._next_check = 0.0
+
+    def _check(self):
+        if time.monotonic() >= self._next_check:
+            self.refresh()
+
+    def keyboard(self, name: str) -> InlineKeyboardMarkup:
+        """Prebuilt markup by name"""
+        self._check()
+        return self.keyboards[name]
+
+    def render(self, name: str, **values) -> str:
+        """Render a prebuilt message template"""
+        self._check()
+        return self.messages[name].render(**values)
+
+    def service_done_keyboard(self, config_type: str, admin_test: bool) -> InlineKeyboardMarkup:
+        """Markup shown under a generated service config"""
+        self._check()
+        if admin_test:
+            return self.keyboards["service_done:admin"]
+        markup = self._after_service.get(config_type)
+        if markup is None:
+            markup = self._after_service[config_type] = InlineKeyboardMarkup([
+                [self._button("📱 Generate QR Code", "qr_config", config_type)],
+                [self._button("🔄 Generate Another", "generate")]
+            ])
+        return markup
+
+    def history_keyboard(self, page) -> Optional[InlineKeyboardMarkup]:
+        """Prev/next buttons carrying the page's keyset cursors"""
+        row = []
+        if page.newer:
+            row.append(self._button("⬅️ Newer", "history", "n", page.newer))
+        if page.older:
+            row.append(self._button("Older ➡️", "history", "o", page.older))
+        return InlineKeyboardMarkup([row]) if row else None
+
+    def _button(self, text: str, route: str, *args) -> InlineKeyboardButton:
+        return InlineKeyboardButton(text, callback_data=self.router.encode(route, *args))
+
+    def _build(self):
+        services = build_service_packages(generator.SERVICE_PAYLOADS)
+        messages = config.MESSAGES
+        points = config.POINTS_CONFIG
+        channels = config.CHANNELS
+        button = self._button
+
+        main_rows = [
+            [button("🔐 Generate Config", "generate"), button("🎯 My Points", "points")],
+            [button("🔗 Refer Friends", "refer"), button("📢 Join Channels", "join")],
+            [button("📊 Statistics", "stats"), button("❓ Help", "help")]
+        ]
+        service_rows = []
+        for service_key, service_data in services.items():
+            if not service_rows or len(service_rows[-1]) == 2:
+                service_rows.append([])
+            service_rows[-1].append(button(service_data["name"], "service", service_key))
+
+        keyboards = {
+            "start:user": InlineKeyboardMarkup(main_rows),
+            "start:admin": InlineKeyboardMarkup(main_rows + [[button("👑 Admin Panel", "admin_panel")]]),
+            "earn": InlineKeyboardMarkup([
+                [button("🔗 Refer Friends", "refer")],
+                [button("📢 Join Channels", "join")]
+            ]),
+            "points": InlineKeyboardMarkup([
+                [button("🔗 Get Referral Link", "refer"), button("📢 Join Channels", "join")],
+                [button("📜 Config History", "history", "o", "")]
+            ]),
+            "config_types": InlineKeyboardMarkup([
+                [button("🔐 SSH Config", "gen", "ssh"), button("🚀 V2Ray Config", "gen", "v2ray")],
+                [button("🎲 Random Config", "gen", "auto")]
+            ]),
+            "services": InlineKeyboardMarkup(service_rows + [[button("🔙 Back", "generate")]]),
+            "unknown_service": InlineKeyboardMarkup([[button("🔙 Back", "generate")]]),
+            "generate_another": InlineKeyboardMarkup([[button("🔄 Generate Another", "generate")]]),
+            "admin_test": InlineKeyboardMarkup([
+                [button(service_data["name"], "admin_test", service_key)]
+                for service_key, service_data in services.items()
+            ]),
+            "admin_test_services": InlineKeyboardMarkup([
+                [button(f"🧪 Test {service_data['name']}", "admin_test", service_key)]
+                for service_key, service_data in services.items()
+            ] + [[button("🔙 Admin Panel", "admin_panel")]]),
+            "admin_panel": InlineKeyboardMarkup([
+                [button("💰 Get Testing Credits", "admin_get_credits")],
+                [button("🧪 Test Service Packages", "admin_test_services")],
+                [button("📊 View Bot Statistics", "admin_stats")],
+                [button("🔬 Profile Bot (30s)", "admin_profile")],
+                [button("🐢 Loop Blocking Report", "admin_loop")],
+                [button("🧠 Memory Report", "admin_memory")],
+                [button("🔙 Main Menu", "main_menu")]
+            ]),
+            "back_to_admin": InlineKeyboardMarkup([[button("🔙 Admin Panel", "admin_panel")]]),
+            "service_done:admin": InlineKeyboardMarkup([
+                [button("🧪 Test Another Service", "admin_test_services")],
+                [button("👑 Admin Panel", "admin_panel")]
+            ]),
+            "channels": InlineKeyboardMarkup(
+                [[InlineKeyboardButton(f"📢 Join {channel['name']}", url=channel["url"])] for channel in channels]
+                + [[button("✅ I Joined Both Channels", "check_channels")]]
+            )
+        }
+
+        command_types = (
+            "🔧 **Choose File Type:**\n\n"
+            "• **SSH** - SSH tunneling files for terminal access\n"
+            "• **V2Ray** - Advanced proxy files with service packages\n"
+            "• **Random** - Let me choose the best option for you\n\n"
+            f"💰 **Cost: {points['config_cost']} coins per file**"
+        )
+        callback_types = (
+            "🔧 **Choose Configuration Type:**\n\n"
+            "• **SSH** - Secure Shell access + CLI speed tests\n"
+            "• **V2Ray** - Service-specific proxy with speed test optimization\n"
+            "• **Random** - Let me choose for you\n\n"
+            "⚡ **All configs include speed test optimization!**"
+        )
+        templates = {
+            "welcome:user": Template(messages["welcome"]),
+            "welcome:admin": Template(messages["welcome"] + "\n\n" + messages["admin_welcome"]),
+            "help": Template(messages["help"]),
+            "insufficient_points": Template(
+                messages["insufficient_points"], cost=points["config_cost"],
+                referral=points["referral"], channel_join=points["channel_join"]
+            ),
+            "config_types:command:user": Template(command_types),
+            "config_types:command:admin": Template(command_types + "\n\n👑 **Admin Mode: Unlimited Testing**"),
+            "config_types:callback:user": Template(callback_types),
+            "config_types:callback:admin": Template(callback_types + "\n\n👑 **Admin Mode: Unlimited**"),
+            "services": Template(
+                "📦 **Select Service Package:**\n\n"
+                "Choose which app/service you want to use:\n\n"
+                "🎥 **YouTube** - For video streaming\n"
+                "📱 **WhatsApp** - For messaging & calls\n"
+                "📹 **Zoom** - For video conferences\n"
+                "📘 **Facebook** - For social media\n"
+                "📷 **Instagram** - For photo sharing\n"
+                "🎵 **TikTok** - For short videos\n"
+                "🎬 **Netflix** - For movies & shows\n"
+                "✈️ **Telegram** - For messaging\n"
+                "⚡ **Speed Test** - For testing speed\n"
+                "🌐 **All Sites** - Universal access\n\n"
+                f"💰 **Cost: {points['config_cost']} coins**"
+            ),
+            "admin_test": Template(
+                "👑 **Admin Testing Panel**\n\n"
+                "Select any service to generate unlimited test configs with speed test optimization:"
+            ),
+            "admin_test_services": Template(
+                "🧪 **Admin Service Testing**\n\n"
+                "Test any service package to ensure proper functionality:\n\n"
+                "**Available Packages:**\n"
+                "• YouTube - Video streaming optimization\n"
+                "• WhatsApp - Messaging & calls\n"
+                "• Zoom - Video conferencing\n"
+                "• Facebook - Social media\n"
+                "• Instagram - Photo sharing\n"
+                "• TikTok - Short videos\n"
+                "• Netflix - Movie streaming\n"
+                "• Telegram - Messaging\n"
+                "• Speed Test - Network testing\n"
+                "• All Sites - Universal access\n\n"
+                "Select a service to generate a test file:"
+            ),
+            "admin_panel": Template(
+                "👑 **Admin Control Panel**\n\n"
+                "💰 **Your Credits:** {credits}\n\n"
+                "**Admin Privileges:**\n"
+                "✅ Unlimited config generation\n"
+                "✅ Test all service packages\n"
+                "✅ Credit management system\n"
+                "✅ User management tools\n"
+                "✅ Speed test optimization\n\n"
+                "**Available Commands:**\n"
+                "/admin_credits - Get 1000 testing credits\n"
+                "/give_credits <user_id> <amount> - Give credits to user\n"
+                "/check_user <user_id> - Check user details\n"
+                "/admin_test - Test service packages\n"
+                "/admin_profile <seconds> - Profile the bot\n"
+                "/admin_loop - Event loop blocking report\n"
+                "/admin_memory [start|stop] - Memory report"
+            ),
+            "join_channels": Template(
+                "📢 **Join Sponsor Channels**\n\n"
+                f"Join **BOTH** channels below to earn **{points['channel_join']} coins**:\n\n"
+                + "".join(f"{index}️⃣ {channel['name']}\n" for index, channel in enumerate(channels, 1))
+                + "\nAfter joining **both** channels, click the button below to verify and claim your coins!\n\n"
+                "💡 **Important:** You must join BOTH channels to get the reward."
+            ),
+            "service_generating": Template(
+                "{admin_prefix}🔄 **Generating {service_name} Configuration...**\n\n"
+                "Creating optimized V2Ray config with:\n"
+                "• Speed test optimization enabled\n"
+                "• Direct routing for speed test sites\n"
+                "• TCP optimization for performance\n"
+                "• HTTP Injector compatibility\n\n"
+                "Please wait a moment..."
+            ),
+            "service_success": Template(SERVICE_SUCCESS_TEXT),
+            "history": Template("📜 **Your Config History**\n\n{lines}"),
+            "leaderboard": Template("🏆 **Top Referrers**\n\n{lines}"),
+            "leaderboard_empty": Template(
+                "🏆 **Top Referrers**\n\nNo referrals yet. Share your link to be the first!"
+            ),
+            "history_empty": Template(
+                "📜 **Your Config History**\n\nNo configs yet. Use /generate to create your first one!"
+            )
+        }
+        # One VMess display template per service with its name, emoji and description baked in
+        for service_key, service_data in services.items():
+            templates[f"service_config:{service_key}"] = Template(
+                SERVICE_CONFIG_TEXT, service_name=service_data["name"],
+                emoji=service_data["emoji"], description=service_data["description"]
+            )
+        templates["service_config:*"] = Template(
+            SERVICE_CONFIG_TEXT, service_name="Custom Service", emoji="🔧", description="Custom configuration"
+        )
+
+        self.services = services
+        self.keyboards = keyboards
+        self.messages = templates
+        self._after_service = {}
@@ -37,6 +37,29 @@ CHANNELS = [
     }
 ]
 
+# Channel Membership Verification
+MEMBERSHIP_CONFIG = {
+    "ttl": float(os.getenv("MEMBERSHIP_TTL", "600")),  # Seconds a confirmed membership is cached
+    "negative_ttl": 30.0,  # Non-members can retry right after joining
+    "deadline": float(os.getenv("MEMBERSHIP_DEADLINE", "5")),  # Seconds to wait for all channels
+    "cache_size": 10000
+}
+
+# Outbound Bot API budget (calls per second, burst); background checks wait for it
+BOT_API_BUDGET = {
+    "rate": float(os.getenv("BOT_API_RATE", "25")),
+    "burst": int(os.getenv("BOT_API_BURST", "30")),
+    "reserve": float(os.getenv("BOT_API_RESERVE", "10"))  # Tokens background work leaves for users
+}
+
+# Periodic re-verification of users who claimed the channel reward
+REVERIFY_CONFIG = {
+    "enabled": os.getenv("REVERIFY_ENABLED", "true").lower() == "true",
+    "interval": float(os.getenv("REVERIFY_INTERVAL", "86400")),  # Seconds between passes
+    "batch_size": 200,  # Users read from Mongo per batch
+    "concurrency": int(os.getenv("REVERIFY_CONCURRENCY", "8"))  # Users checked at once
+}
+
 # Points Configuration
 POINTS_CONFIG = {
     "initial_coins": 0,     # Initial coins for new users
@@ -47,24 +70,55 @@ POINTS_CONFIG = {
 }
 
 # Provider URLs - Updated with more reliable providers
+# SSH providers, tried in order; each one runs through the same engine (providers.py)
+# url/host: "{server}" is replaced by the server code; servers may also be
+#   {"code": ..., "host": ..., "port": ..., "region": ...} dicts to override one server
+#   (the region defaults to the code without digits, "sg1" -> "sg")
+# form: "page" GETs the creation page and posts its form (cached per server),
+#   "direct" posts the fields straight to url
+# fields: form field names for the generated username/password and the server code
+# success: words that mark a created account (the username always counts too)
+# concurrency: simultaneous creations; rate/burst: requests per second to the site
 SSH_PROVIDERS = [
     {
         "name": "SpeedSSH",
-        "url": "https://speedssh.com/create-ssh-server/sg1",
+        "url": "https://speedssh.com/create-ssh-server/{server}",
         "active": True,
-        "servers": ["sg1", "us1", "de1", "uk1"]
+        "servers": ["sg1", "us1", "de1", "uk1"],
+        "host": "{server}.speedssh.com",
+        "form": "page",
+        "statuses": [200, 201, 302],
+        "success": ["success", "created", "account", "ssh", "generated", "active", "ready"],
+        "ttl_days": 7,
+        "concurrency": 8,
+        "rate": 10.0,
+        "burst": 20
     },
     {
-        "name": "FastSSH", 
-        "url": "https://fastssh.com/create-ssh-server/sg",
+        "name": "FastSSH",
+        "url": "https://fastssh.com/create-ssh-server/{server}",
         "active": True,
-        "servers": ["sg", "us", "de", "uk"]
+        "servers": ["sg", "us", "de", "uk"],
+        "host": "{server}.fastssh.com",
+        "form": "direct",
+        "success": ["success", "created"],
+        "ttl_days": 7,
+        "concurrency": 4,
+        "rate": 5.0,
+        "burst": 10
     },
     {
         "name": "OpenTunnel",
-        "url": "https://opentunnel.net/create-ssh-server",
+        "url": "https://opentunnel.net/create-ssh-server/{server}",
         "active": True,
-        "servers": ["sg", "us", "de", "fr"]
+        "servers": ["sg", "us", "de", "fr"],
+        "host": "{server}.opentunnel.net",
+        "form": "direct",
+        "success": ["success", "created"],
+        "ttl_days": 7,
+        "concurrency": 4,
+        "rate": 5.0,
+        "burst": 10
     }
 ]
 
@@ -83,6 +137,7 @@ V2RAY_PROVIDERS = [
 
 # Rate Limiting
 RATE_LIMIT = {
+    "enabled": os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true",
     "requests_per_minute": 5,
     "max_configs_per_day": 10,
     "admin_unlimited": True
@@ -91,12 +146,140 @@ RATE_LIMIT = {
 # Logging Configuration
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
-# HTTP Client Configuration (Alternative to aiohttp)
+# Metrics Endpoint Configuration
+METRICS_CONFIG = {
+    "enabled": os.getenv("METRICS_ENABLED", "true").lower() == "true",
+    "host": os.getenv("METRICS_HOST", "127.0.0.1"),
+    "port": int(os.getenv("METRICS_PORT", "9108"))
+}
+
+# Tracing Configuration
+TRACING_CONFIG = {
+    "enabled": os.getenv("TRACING_ENABLED", "true").lower() == "true",
+    "sample_rate": float(os.getenv("TRACING_SAMPLE_RATE", "0.05")),
+    "exporter": os.getenv("TRACING_EXPORTER", "file"),  # "file" or "otlp"
+    "file_path": os.getenv("TRACING_FILE", "traces.jsonl"),
+    "otlp_endpoint": os.getenv("TRACING_OTLP_ENDPOINT", "http://127.0.0.1:4318/v1/traces")
+}
+
+# On-demand Profiler Configuration (admin only)
+PROFILER_CONFIG = {
+    "interval": float(os.getenv("PROFILER_INTERVAL", "0.005")),  # Seconds between samples
+    "default_seconds": 30,
+    "max_seconds": 300
+}
+
+# Event Loop Monitor Configuration
+LOOP_MONITOR_CONFIG = {
+    "enabled": os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true",
+    "threshold": float(os.getenv("LOOP_MONITOR_THRESHOLD", "0.1")),  # Seconds blocked before capturing a stack
+    "interval": float(os.getenv("LOOP_MONITOR_INTERVAL", "0.05"))  # Heartbeat period
+}
+
+# Bulk Generation Configuration
+BULK_CONFIG = {
+    "max_count": int(os.getenv("BULK_MAX_COUNT", "1000")),
+    "concurrency": int(os.getenv("BULK_CONCURRENCY", "8")),  # Configs generated at once
+    "flush_size": 100,  # Configs per bulk database insert
+    "progress_interval": 3.0  # Seconds between progress message edits
+}
+
+# Config History Configuration (/history)
+HISTORY_CONFIG = {
+    "page_size": 5,
+    "pages_per_user": 6,  # Cached pages per user
+    "max_users": 500,  # Users with cached pages
+    "ttl": 300.0
+}
+
+# Provider HTTP Client Configuration (async httpx client shared by the generators)
 HTTP_CONFIG = {
-    "timeout": 30,
+    "connect_timeout": float(os.getenv("PROVIDER_CONNECT_TIMEOUT", "5")),  # TCP + TLS handshake
+    "read_timeout": float(os.getenv("PROVIDER_READ_TIMEOUT", "15")),  # Between received bytes
+    "write_timeout": 10.0,
+    "pool_timeout": 5.0,  # Waiting for a free pooled connection
+    "total_timeout": float(os.getenv("PROVIDER_TOTAL_TIMEOUT", "30")),  # One request including retries
     "max_retries": 3,
-    "backoff_factor": 0.3,
-    "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+    "backoff_factor": 0.3,  # Retry n waits backoff_factor * 2 ** n seconds
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 60.0,  # Seconds an idle connection is kept open
+    "http2": os.getenv("PROVIDER_HTTP2", "true").lower() == "true",  # Needs the h2 package
+    "verify_tls": os.getenv("PROVIDER_VERIFY_TLS", "true").lower() == "true",
+    "max_scan_bytes": int(os.getenv("PROVIDER_MAX_SCAN_BYTES", "262144")),  # Body read while looking for success words
+    "scan_chunk_size": 16384,
+    "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+}
+
+# Provider creation forms (action and hidden fields) cached per server; refreshed when a submit fails
+FORM_CACHE_CONFIG = {
+    "ttl": float(os.getenv("FORM_CACHE_TTL", "600"))
+}
+
+# DNS cache for provider hosts (TTLs come from the records when dnspython is installed)
+DNS_CONFIG = {
+    "min_ttl": 30.0,
+    "max_ttl": 3600.0,
+    "default_ttl": float(os.getenv("DNS_DEFAULT_TTL", "300")),  # Used with the system resolver
+    "negative_ttl": float(os.getenv("DNS_NEGATIVE_TTL", "30")),  # Failed lookups
+    "timeout": 5.0,
+    "max_entries": 1024
+}
+
+# Keep a warm connection to provider sites so the first generation after idle skips DNS and TLS
+PREWARM_CONFIG = {
+    "enabled": os.getenv("PREWARM_ENABLED", "true").lower() == "true",
+    "interval": float(os.getenv("PREWARM_INTERVAL", "30")),  # Below HTTP_CONFIG keepalive_expiry
+    "active_window": 3600.0,  # Hosts used this recently are kept warm too
+    "origins": ["https://speedssh.com", "https://fastssh.com", "https://opentunnel.net"]
+}
+
+# Background TCP/TLS probes of V2Ray endpoints and SSH hosts; results rank the servers handed out
+PROBER_CONFIG = {
+    "enabled": os.getenv("PROBER_ENABLED", "true").lower() == "true",
+    "interval": float(os.getenv("PROBER_INTERVAL", "60")),
+    "concurrency": int(os.getenv("PROBER_CONCURRENCY", "32")),  # Probes in flight
+    "connect_timeout": 3.0,
+    "handshake_timeout": 5.0,  # TLS handshake or SSH banner
+    "alpha": 0.3,  # EWMA weight of the newest RTT sample
+    "unhealthy_after": 2  # Consecutive failures before an endpoint is ranked last
+}
+
+# Per-user SSH region selection (explicit /region choice, past successes, then Telegram language)
+REGION_CONFIG = {
+    "regions": {
+        "sg": "🇸🇬 Singapore",
+        "us": "🇺🇸 United States",
+        "de": "🇩🇪 Germany",
+        "uk": "🇬🇧 United Kingdom",
+        "fr": "🇫🇷 France"
+    },
+    # Telegram language_code (full tag first, then the language) -> nearest region
+    "languages": {
+        "en-gb": "uk", "en": "us", "es": "us", "pt-br": "us",
+        "si": "sg", "ta": "sg", "hi": "sg", "bn": "sg", "id": "sg", "ms": "sg", "th": "sg",
+        "vi": "sg", "zh": "sg", "ja": "sg", "ko": "sg", "fil": "sg",
+        "de": "de", "nl": "de", "pl": "de", "cs": "de", "ru": "de", "uk": "de", "tr": "de", "fa": "de",
+        "fr": "fr", "it": "fr", "pt": "fr", "ar": "fr"
+    },
+    "ttl": float(os.getenv("REGION_CACHE_TTL", "300")),  # Seconds a user's region order is reused
+    "max_users": 10000
+}
+
+# context.user_data stored in Mongo; dirty keys are written in batches every interval
+PERSISTENCE_CONFIG = {
+    "enabled": os.getenv("PERSISTENCE_ENABLED", "true").lower() == "true",
+    "update_interval": float(os.getenv("PERSISTENCE_INTERVAL", "30"))
+}
+
+# Multi-process mode: a front process polls Telegram and routes each update by user id
+# (consistent hash) to one of SHARD_WORKERS worker processes over Unix sockets
+SHARD_CONFIG = {
+    "workers": int(os.getenv("SHARD_WORKERS", "1")),  # 1 = single process, no front
+    "socket_dir": os.getenv("SHARD_SOCKET_DIR", "/tmp/ssh_v2ray_bot"),
+    "replicas": 160,  # Virtual nodes per worker on the hash ring
+    "health_interval": float(os.getenv("SHARD_HEALTH_INTERVAL", "5")),  # Unanswered ping by the next round = down
+    "restart_backoff": 1.0  # Seconds before a crashed worker is started again
 }
 
 # Messages
@@ -189,6 +372,11 @@ Welcome, Admin! You have unlimited access to all bot features:
 /give_credits <user_id> <amount> - Give credits to any user
 /check_user <user_id> - View user details
 /admin_test - Test service packages
+/admin_profile <seconds> - Profile the bot and get a flamegraph file
+/admin_loop - Show call sites that blocked the event loop
+/admin_memory [start|stop] - Memory report and allocation growth
+/admin_bulk <count> [service|ssh|v2ray] [jsonl|zip] - Generate configs in bulk
+/admin_reverify [restart] - Re-check channel members now
 
 Use the Admin Panel button below for quick access!
 """,
@@ -226,6 +414,8 @@ Use the Admin Panel button below for quick access!
 
 **🆘 Troubleshooting:**
 • Generate new configs if old ones stop working
+• Use /history to see the configs you generated
+• Use /region to pick the SSH server region closest to you
 • Try different service packages
 • Use alternative speed test sites
 • Check your internet connection
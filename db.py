@@ -1,31 +1,109 @@
-from pymongo import MongoClient
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from datetime import datetime, timedelta, timezone
 import logging
+import sys
+import threading
 from typing import Optional, Dict, List
 from config import MONGO_URI, DB_NAME
+from metrics import observe_db
+from tracing import traced
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def create_mongo_client(uri: str):
+    """Create a MongoClient, or an in-memory stand-in for mongomock:// URIs"""
+    if uri.startswith("mongomock://"):
+        # Local Mongo stand-in for offline load tests
+        import mongomock
+        return mongomock.MongoClient()
+    return MongoClient(uri)
+
+def instrumented(operation: str):
+    """Time and trace a Database operation"""
+    def decorator(func):
+        return observe_db(operation)(traced(f"db.{operation}")(func))
+    return decorator
+
+# Bump when migrate() gains a step (new index, data migration)
+SCHEMA_VERSION = 1
+
 class Database:
-    def __init__(self):
+    """MongoDB access; connects on first use
+    
+    Nothing touches the network at construction (or import). The client and
+    collection handles are created the first time one is used, and indexes
+    and data migrations live in ``migrate()``, run once per schema version
+    (``python db.py migrate`` as a release step, or by the bot before it
+    starts serving).
+    """
+    
+    COLLECTIONS = ("users", "configs", "stats", "referrals", "user_data")
+    _connect_lock = threading.Lock()
+    
+    def __init__(self, uri: str = None, name: str = None):
+        self.uri = uri or MONGO_URI
+        self.name = name or DB_NAME
+    
+    def __getattr__(self, name):
+        # Only called for attributes not set yet: the client and collections before connect()
+        if name in ("client", "db") + self.COLLECTIONS:
+            self.connect()
+            return self.__dict__[name]
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+    
+    def connect(self):
+        """Create the client and collection handles (once)"""
+        with self._connect_lock:
+            if "client" in self.__dict__:
+                return
+            try:
+                client = create_mongo_client(self.uri)
+                database = client[self.name]
+                self.db = database
+                self.users = database.users
+                self.configs = database.configs
+                self.stats = database.stats
+                self.referrals = database.referrals
+                self.user_data = database.user_data  # PTB context.user_data, one document per user (_id = user_id)
+                self.client = client
+                logger.info("Database client created")
+            except Exception as e:
+                logger.error(f"Database connection failed: {e}")
+                raise
+    
+    def migrate(self, force: bool = False) -> bool:
+        """Create indexes and run data migrations unless the schema is current; True if they ran"""
         try:
-            self.client = MongoClient(MONGO_URI)
-            self.db = self.client[DB_NAME]
-            self.users = self.db.users
-            self.configs = self.db.configs
-            self.stats = self.db.stats
+            schema = self.stats.find_one({"_id": "schema"}) or {}
+            if not force and schema.get("version", 0) >= SCHEMA_VERSION:
+                return False
             
-            # Create indexes for better performance
             self.users.create_index("user_id", unique=True)
-            self.configs.create_index([("user_id", 1), ("created_at", -1)])
+            # _id breaks ties between configs saved in the same batch (keyset pagination)
+            self.configs.create_index([("user_id", 1), ("created_at", -1), ("_id", -1)])
+            self.referrals.create_index([("referrer_id", 1), ("referred_id", 1)], unique=True)
+            self.users.create_index([("referral_count", -1), ("user_id", 1)])
+            self.users.create_index([("joined_channels", 1), ("_id", 1)])
             
-            logger.info("Database connection established successfully")
+            self.migrate_referrals()
+            
+            self.stats.replace_one(
+                {"_id": "schema"},
+                {"version": SCHEMA_VERSION, "migrated_at": datetime.now(timezone.utc)},
+                upsert=True
+            )
+            logger.info(f"Database migrated to schema version {SCHEMA_VERSION}")
+            return True
         except Exception as e:
-            logger.error(f"Database connection failed: {e}")
+            logger.error(f"Database migration failed: {e}")
             raise
 
+    @instrumented("add_user")
     def add_user(self, user_id: int, username: str = None, referrer_id: int = None) -> bool:
         """Add new user to database"""
         try:
@@ -35,7 +113,7 @@ class Database:
                 "username": username,
                 "points": POINTS_CONFIG["initial_coins"],  # Give 10 coins to start
                 "referrer_id": referrer_id,
-                "referred_users": [],
+                "referral_count": 0,
                 "free_used": False,
                 "joined_channels": False,
                 "total_configs": 0,
@@ -61,6 +139,7 @@ class Database:
             logger.error(f"Error adding user {user_id}: {e}")
             return False
 
+    @instrumented("get_user")
     def get_user(self, user_id: int) -> Optional[Dict]:
         """Get user data"""
         try:
@@ -76,6 +155,7 @@ class Database:
             logger.error(f"Error getting user {user_id}: {e}")
             return None
 
+    @instrumented("add_points")
     def add_points(self, user_id: int, points: int, reason: str = "") -> bool:
         """Add points to user"""
         try:
@@ -96,6 +176,7 @@ class Database:
             logger.error(f"Error adding points to user {user_id}: {e}")
             return False
 
+    @instrumented("set_points")
     def set_points(self, user_id: int, points: int, reason: str = "Admin action") -> bool:
         """Set exact points for user (admin function)"""
         try:
@@ -118,6 +199,7 @@ class Database:
             logger.error(f"Error setting points for user {user_id}: {e}")
             return False
 
+    @instrumented("give_admin_credits")
     def give_admin_credits(self, admin_id: int, amount: int = 1000) -> bool:
         """Give admin user testing credits"""
         try:
@@ -145,6 +227,7 @@ class Database:
             logger.error(f"Error giving admin credits to {admin_id}: {e}")
             return False
 
+    @instrumented("deduct_points")
     def deduct_points(self, user_id: int, points: int) -> bool:
         """Deduct points from user"""
         try:
@@ -166,6 +249,7 @@ class Database:
             logger.error(f"Error deducting points from user {user_id}: {e}")
             return False
 
+    @instrumented("use_free_config")
     def use_free_config(self, user_id: int) -> bool:
         """Mark free config as used"""
         try:
@@ -178,33 +262,106 @@ class Database:
             logger.error(f"Error using free config for user {user_id}: {e}")
             return False
 
+    @instrumented("add_referral")
     def add_referral(self, referrer_id: int, referred_id: int) -> bool:
         """Add referral and award points"""
         try:
             from config import POINTS_CONFIG
-            # Check if referral already exists
-            referrer = self.users.find_one({"user_id": referrer_id})
-            if not referrer or referred_id in referrer.get("referred_users", []):
+            # The unique (referrer_id, referred_id) index rejects duplicates
+            try:
+                self.referrals.insert_one({
+                    "referrer_id": referrer_id,
+                    "referred_id": referred_id,
+                    "created_at": datetime.now(timezone.utc)
+                })
+            except DuplicateKeyError:
                 return False
-                
-            # Add to referrer's list and award points
+            
+            # Award points and count the referral on the referrer
             result = self.users.update_one(
                 {"user_id": referrer_id},
-                {
-                    "$push": {"referred_users": referred_id},
-                    "$inc": {"points": POINTS_CONFIG["referral"]}  # Award 3 points
-                }
+                {"$inc": {"points": POINTS_CONFIG["referral"], "referral_count": 1}}  # Award 3 points
             )
             
             if result.modified_count > 0:
                 logger.info(f"Referral added: {referrer_id} -> {referred_id}")
                 return True
+            
+            # Unknown referrer
+            self.referrals.delete_one({"referrer_id": referrer_id, "referred_id": referred_id})
             return False
             
         except Exception as e:
             logger.error(f"Error adding referral {referrer_id} -> {referred_id}: {e}")
             return False
 
+    @instrumented("get_top_referrers")
+    def get_top_referrers(self, limit: int = 10) -> List[Dict]:
+        """Users with the most referrals, read from the referral_count index"""
+        try:
+            return list(self.users.find(
+                {"referral_count": {"$gt": 0}},
+                {"_id": 0, "user_id": 1, "username": 1, "referral_count": 1}
+            ).sort([("referral_count", -1), ("user_id", 1)]).limit(limit))
+        except Exception as e:
+            logger.error(f"Error getting top referrers: {e}")
+            return []
+
+    def migrate_referrals(self, batch_size: int = 500) -> int:
+        """Move legacy embedded referred_users arrays into the referrals collection
+        
+        Idempotent: referrals already present are skipped by the unique index and
+        referral_count is set from the array. Returns the number of users migrated;
+        raises on failure so ``migrate()`` does not record the schema version.
+        """
+        migrated = 0
+        try:
+            cursor = self.users.find(
+                {"referred_users": {"$exists": True}}, {"user_id": 1, "referred_users": 1}
+            ).batch_size(batch_size)
+            batch = []
+            for user in cursor:
+                batch.append(user)
+                if len(batch) >= batch_size:
+                    migrated += self._migrate_referral_batch(batch)
+                    batch = []
+            migrated += self._migrate_referral_batch(batch)
+            if migrated:
+                logger.info(f"Migrated referrals of {migrated} users to the referrals collection")
+        except Exception as e:
+            logger.error(f"Error migrating referrals after {migrated} users: {e}")
+            raise
+        return migrated
+
+    def _migrate_referral_batch(self, users: List[Dict]) -> int:
+        if not users:
+            return 0
+        now = datetime.now(timezone.utc)
+        referrals = [
+            {"referrer_id": user["user_id"], "referred_id": referred_id, "created_at": now}
+            for user in users
+            for referred_id in set(user.get("referred_users") or [])
+        ]
+        if referrals:
+            try:
+                self.referrals.insert_many(referrals, ordered=False)
+            except BulkWriteError as e:
+                # Duplicates from an interrupted earlier run are fine; anything else is not
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+        self.users.bulk_write([
+            UpdateOne(
+                {"_id": user["_id"]},
+                {
+                    "$set": {"referral_count": len(set(user.get("referred_users") or []))},
+                    "$unset": {"referred_users": ""}
+                }
+            )
+            for user in users
+        ], ordered=False)
+        return len(users)
+
+    @instrumented("set_channels_joined")
     def set_channels_joined(self, user_id: int, joined: bool = True) -> bool:
         """Mark user as having joined channels"""
         try:
@@ -217,8 +374,143 @@ class Database:
             logger.error(f"Error setting channels joined for user {user_id}: {e}")
             return False
 
-    def save_config(self, user_id: int, config_type: str, config_data: str) -> bool:
-        """Save generated config"""
+    @instrumented("get_region_profile")
+    def get_region_profile(self, user_id: int) -> Dict:
+        """Explicit region choice and per-region SSH successes of a user"""
+        try:
+            user = self.users.find_one({"user_id": user_id}, {"region": 1, "region_successes": 1, "_id": 0})
+            return user or {}
+        except Exception as e:
+            logger.error(f"Error getting region profile for user {user_id}: {e}")
+            return {}
+
+    @instrumented("set_region")
+    def set_region(self, user_id: int, region: Optional[str]) -> bool:
+        """Store the user's chosen region; None goes back to automatic selection"""
+        try:
+            update = {"$set": {"region": region}} if region else {"$unset": {"region": ""}}
+            result = self.users.update_one({"user_id": user_id}, update)
+            return result.matched_count > 0
+        except Exception as e:
+            logger.error(f"Error setting region for user {user_id}: {e}")
+            return False
+
+    @instrumented("record_region_success")
+    def record_region_success(self, user_id: int, region: str) -> bool:
+        """Count a config created in ``region`` for the user"""
+        try:
+            result = self.users.update_one({"user_id": user_id}, {"$inc": {f"region_successes.{region}": 1}})
+            return result.modified_count > 0
+        except Exception as e:
+            logger.error(f"Error recording region success for user {user_id}: {e}")
+            return False
+
+    @instrumented("get_user_context")
+    def get_user_context(self, user_id: int) -> Optional[Dict]:
+        """Stored ``context.user_data`` of a user ({} if none, None if it could not be read)"""
+        try:
+            return self.user_data.find_one({"_id": user_id}, {"_id": 0}) or {}
+        except Exception as e:
+            logger.error(f"Error loading user_data for user {user_id}: {e}")
+            return None
+
+    @instrumented("write_user_contexts")
+    def write_user_contexts(self, changes: Dict[int, tuple]) -> bool:
+        """Apply ``{user_id: (changed keys, removed keys)}`` with one unordered bulk write"""
+        operations = []
+        for user_id, (changed, removed) in changes.items():
+            update = {}
+            if changed:
+                update["$set"] = changed
+            if removed:
+                update["$unset"] = {key: "" for key in removed}
+            if update:
+                operations.append(UpdateOne({"_id": user_id}, update, upsert=True))
+        if not operations:
+            return True
+        try:
+            self.user_data.bulk_write(operations, ordered=False)
+            return True
+        except Exception as e:
+            logger.error(f"Error writing user_data for {len(operations)} users: {e}")
+            return False
+
+    @instrumented("drop_user_context")
+    def drop_user_context(self, user_id: int) -> bool:
+        """Delete a user's stored ``context.user_data``"""
+        try:
+            self.user_data.delete_one({"_id": user_id})
+            return True
+        except Exception as e:
+            logger.error(f"Error dropping user_data for user {user_id}: {e}")
+            return False
+
+    @instrumented("claim_channel_reward")
+    def claim_channel_reward(self, user_id: int, points: int) -> Optional[Dict]:
+        """Atomically mark channels joined and award points once; None if already claimed"""
+        try:
+            return self.users.find_one_and_update(
+                {"user_id": user_id, "joined_channels": {"$ne": True}, "channel_reward_claimed": {"$ne": True}},
+                {"$set": {"joined_channels": True, "channel_reward_claimed": True}, "$inc": {"points": points}},
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            logger.error(f"Error claiming channel reward for user {user_id}: {e}")
+            return None
+
+    @instrumented("get_joined_users")
+    def get_joined_users(self, after=None, limit: int = 200) -> List[Dict]:
+        """Next batch of users marked as joined, in ``_id`` order after ``after``"""
+        try:
+            query = {"joined_channels": True}
+            if after is not None:
+                query["_id"] = {"$gt": after}
+            return list(self.users.find(query, {"user_id": 1}).sort("_id", 1).limit(limit))
+        except Exception as e:
+            logger.error(f"Error getting joined users: {e}")
+            return []
+
+    @instrumented("mark_channels_left")
+    def mark_channels_left(self, user_ids: List[int]) -> int:
+        """Record users who left the channels; the reward stays claimed"""
+        if not user_ids:
+            return 0
+        try:
+            result = self.users.update_many(
+                {"user_id": {"$in": user_ids}, "joined_channels": True},
+                {"$set": {
+                    "joined_channels": False,
+                    "channel_reward_claimed": True,
+                    "channels_left_at": datetime.now(timezone.utc)
+                }}
+            )
+            return result.modified_count
+        except Exception as e:
+            logger.error(f"Error marking {len(user_ids)} users as left: {e}")
+            return 0
+
+    @instrumented("get_job_state")
+    def get_job_state(self, job: str) -> Optional[Dict]:
+        """Saved checkpoint of a background job"""
+        try:
+            return self.stats.find_one({"_id": f"job:{job}"})
+        except Exception as e:
+            logger.error(f"Error loading {job} checkpoint: {e}")
+            return None
+
+    @instrumented("save_job_state")
+    def save_job_state(self, job: str, state: Dict) -> bool:
+        """Save the checkpoint of a background job"""
+        try:
+            self.stats.replace_one({"_id": f"job:{job}"}, {**state, "updated_at": datetime.now(timezone.utc)}, upsert=True)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving {job} checkpoint: {e}")
+            return False
+
+    @instrumented("save_config")
+    def save_config(self, user_id: int, config_type: str, config_data: str) -> Optional[str]:
+        """Save generated config; returns its id, None on failure"""
         try:
             config_entry = {
                 "user_id": user_id,
@@ -227,7 +519,7 @@ class Database:
                 "created_at": datetime.now(timezone.utc)
             }
             
-            self.configs.insert_one(config_entry)
+            config_id = self.configs.insert_one(config_entry).inserted_id
             
             # Update user stats
             self.users.update_one(
@@ -238,12 +530,47 @@ class Database:
                 }
             )
             
-            return True
+            return str(config_id)
             
         except Exception as e:
             logger.error(f"Error saving config for user {user_id}: {e}")
-            return False
+            return None
 
+    @instrumented("save_configs")
+    def save_configs(self, user_id: int, configs: List[Dict], batch_id: str = None) -> int:
+        """Save a batch of generated configs with one bulk insert; returns the number saved"""
+        if not configs:
+            return 0
+        try:
+            now = datetime.now(timezone.utc)
+            entries = [
+                {
+                    "user_id": user_id,
+                    "config_type": config["type"],
+                    "config_data": str(config),
+                    "batch_id": batch_id,
+                    "created_at": now
+                }
+                for config in configs
+            ]
+            result = self.configs.insert_many(entries, ordered=False)
+            saved = len(result.inserted_ids)
+            
+            self.users.update_one(
+                {"user_id": user_id},
+                {
+                    "$inc": {"total_configs": saved},
+                    "$set": {"last_config": now}
+                }
+            )
+            
+            return saved
+            
+        except Exception as e:
+            logger.error(f"Error saving config batch for user {user_id}: {e}")
+            return 0
+
+    @instrumented("get_user_configs")
     def get_user_configs(self, user_id: int, limit: int = 10) -> List[Dict]:
         """Get user's config history"""
         try:
@@ -255,6 +582,47 @@ class Database:
             logger.error(f"Error getting configs for user {user_id}: {e}")
             return []
 
+    @instrumented("get_config")
+    def get_config(self, user_id: int, config_id: str) -> Optional[Dict]:
+        """One of the user's configs by id (e.g. the ``last_config`` reference in user_data)"""
+        try:
+            return self.configs.find_one({"_id": ObjectId(config_id), "user_id": user_id})
+        except InvalidId:
+            return None
+        except Exception as e:
+            logger.error(f"Error getting config {config_id} for user {user_id}: {e}")
+            return None
+
+    @instrumented("get_config_page")
+    def get_config_page(self, user_id: int, cursor: tuple = None, newer: bool = False,
+                        limit: int = 5, fields: tuple = ("config_type", "created_at")) -> List[Dict]:
+        """Configs next to a (created_at, _id) keyset cursor, newest first
+        
+        Reads ``limit + 1`` documents so the caller can tell whether another
+        page exists. ``newer`` pages towards recent configs. Both $or branches
+        are bounded ranges on the (user_id, created_at, _id) index; no skip.
+        """
+        try:
+            query = {"user_id": user_id}
+            if cursor is not None:
+                created_at, config_id = cursor
+                op = "$gt" if newer else "$lt"
+                query["$or"] = [
+                    {"created_at": {op: created_at}},
+                    {"created_at": created_at, "_id": {op: config_id}}
+                ]
+            direction = 1 if newer else -1
+            configs = list(self.configs.find(query, {field: 1 for field in fields})
+                           .sort([("created_at", direction), ("_id", direction)])
+                           .limit(limit + 1))
+            if newer:
+                configs.reverse()
+            return configs
+        except Exception as e:
+            logger.error(f"Error getting config page for user {user_id}: {e}")
+            return []
+
+    @instrumented("get_user_stats")
     def get_user_stats(self) -> Dict:
         """Get overall user statistics"""
         try:
@@ -273,6 +641,7 @@ class Database:
             logger.error(f"Error getting user stats: {e}")
             return {}
 
+    @instrumented("can_generate_config")
     def can_generate_config(self, user_id: int) -> Dict[str, any]:
         """Check if user can generate config"""
         try:
@@ -296,5 +665,13 @@ class Database:
             logger.error(f"Error checking config generation for user {user_id}: {e}")
             return {"can_generate": False, "reason": "database_error"}
 
-# Global database instance
-db = Database()
\ No newline at end of file
+# Global database instance (connects on first use)
+db = Database()
+
+if __name__ == "__main__":
+    # Release step: python db.py migrate [--force]
+    if sys.argv[1:2] == ["migrate"]:
+        db.migrate(force="--force" in sys.argv)
+    else:
+        print("Usage: python db.py migrate [--force]")
+        sys.exit(2)
\ No newline at end of file
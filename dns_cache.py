@@ -0,0 +1,168 @@
+import asyncio
+import ipaddress
+import logging
+import socket
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import httpcore
+
+from metrics import CacheMetrics, DNS_LOOKUPS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+try:
+    import dns.asyncresolver
+    import dns.exception
+    import dns.resolver
+except ImportError:
+    # dnspython is optional; without it record TTLs are unknown and default_ttl applies
+    dns = None
+
+class DNSCache:
+    """Async host name cache that honors record TTLs and caches failures
+
+    With dnspython installed, A/AAAA records are queried directly and cached
+    for their TTL (clamped to [min_ttl, max_ttl]); otherwise the system
+    resolver is used through ``getaddrinfo`` and answers live ``default_ttl``
+    seconds. Failed lookups are remembered for ``negative_ttl`` seconds and
+    raise ``socket.gaierror`` again without touching the network. Concurrent
+    lookups of one host share a single query.
+    """
+
+    def __init__(self, min_ttl: float = 30.0, max_ttl: float = 3600.0, default_ttl: float = 300.0,
+                 negative_ttl: float = 30.0, timeout: float = 5.0, max_entries: int = 1024):
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.max_entries = max_entries
+        # host -> (expires, addresses or None for a failed lookup)
+        self._cache: "OrderedDict[str, Tuple[float, Optional[List[str]]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._resolver = dns.asyncresolver.Resolver() if dns is not None else None
+        self._metrics = CacheMetrics("dns")
+
+    async def resolve(self, host: str) -> List[str]:
+        """Addresses for ``host``; raises socket.gaierror if it does not resolve"""
+        try:
+            ipaddress.ip_address(host)
+            return [host]
+        except ValueError:
+            pass
+
+        entry = self._cache.get(host)
+        if entry is not None and entry[0] > time.monotonic():
+            self._cache.move_to_end(host)
+            self._metrics.hit()
+            if entry[1] is None:
+                raise socket.gaierror(socket.EAI_NONAME, f"{host} did not resolve (cached)")
+            return entry[1]
+        self._metrics.miss()
+
+        future = self._inflight.get(host)
+        if future is None:
+            future = asyncio.ensure_future(self._lookup(host))
+            self._inflight[host] = future
+            future.add_done_callback(lambda done: self._finished(host, done))
+        return await asyncio.shield(future)
+
+    def _finished(self, host: str, future: asyncio.Future):
+        self._inflight.pop(host, None)
+        if not future.cancelled():
+            # Mark the error as retrieved even if every waiter gave up
+            future.exception()
+
+    async def _lookup(self, host: str) -> List[str]:
+        started = time.perf_counter()
+        try:
+            if self._resolver is not None:
+                addresses, ttl = await self._query(host)
+            else:
+                addresses, ttl = await self._getaddrinfo(host), self.default_ttl
+        except (socket.gaierror, asyncio.TimeoutError) as e:
+            DNS_LOOKUPS.labels("error").observe(time.perf_counter() - started)
+            self.store(host, None, self.negative_ttl)
+            if isinstance(e, socket.gaierror):
+                raise
+            raise socket.gaierror(socket.EAI_AGAIN, f"DNS lookup of {host} timed out") from e
+        DNS_LOOKUPS.labels("ok").observe(time.perf_counter() - started)
+        self.store(host, addresses, min(max(ttl, self.min_ttl), self.max_ttl))
+        return addresses
+
+    async def _query(self, host: str) -> Tuple[List[str], float]:
+        """A and AAAA records with the smallest TTL of the answers (dnspython)"""
+        addresses, ttls = [], []
+        for record_type in ("A", "AAAA"):
+            try:
+                answer = await self._resolver.resolve(host, record_type, lifetime=self.timeout)
+            except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.resolver.NoNameservers):
+                continue
+            except dns.exception.Timeout as e:
+                raise asyncio.TimeoutError() from e
+            addresses.extend(record.address for record in answer)
+            ttls.append(answer.rrset.ttl)
+        if not addresses:
+            raise socket.gaierror(socket.EAI_NONAME, f"{host} has no A/AAAA records")
+        return addresses, min(ttls)
+
+    async def _getaddrinfo(self, host: str) -> List[str]:
+        infos = await asyncio.wait_for(
+            asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM),
+            self.timeout
+        )
+        # Unique addresses, IPv4 first like most dual-stack clients fall back
+        addresses = list(dict.fromkeys(info[4][0] for info in sorted(infos, key=lambda i: i[0] != socket.AF_INET)))
+        if not addresses:
+            raise socket.gaierror(socket.EAI_NONAME, f"{host} did not resolve")
+        return addresses
+
+    def store(self, host: str, addresses: Optional[List[str]], ttl: float):
+        self._cache[host] = (time.monotonic() + ttl, addresses)
+        self._cache.move_to_end(host)
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def invalidate(self, host: str = None):
+        """Forget one host, or everything"""
+        if host is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(host, None)
+
+class ResolvingBackend(httpcore.AsyncNetworkBackend):
+    """httpcore network backend that connects through the DNS cache
+
+    TLS still uses the original host name for SNI and certificate checks;
+    only the TCP connect goes to a cached address. Addresses are tried in
+    order until one accepts the connection.
+    """
+
+    def __init__(self, resolver: DNSCache, backend: Optional[httpcore.AsyncNetworkBackend] = None):
+        self.resolver = resolver
+        self.backend = backend or httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        try:
+            addresses = await self.resolver.resolve(host)
+        except socket.gaierror as e:
+            raise httpcore.ConnectError(str(e)) from e
+        error = None
+        for address in addresses:
+            try:
+                return await self.backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        # Every cached address failed: look the host up again next time
+        self.resolver.invalidate(host)
+        raise error
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self.backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds: float):
+        await self.backend.sleep(seconds)
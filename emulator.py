@@ -0,0 +1,288 @@
+import asyncio
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+import httpx
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FAKE_BOT_USER = {
+    "id": 100000001,
+    "is_bot": True,
+    "first_name": "LoadTest",
+    "username": "loadtest_bot",
+    "can_join_groups": True,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False
+}
+
+PROVIDER_FORM_PAGE = """<html><head><title>Create SSH Account</title></head>
+<body>
+<div class="nav"><a href="/">Home</a> <a href="/servers">Servers</a></div>
+<form method="post" action="/create-ssh-server/{code}/submit">
+  <input type="hidden" name="csrf_token" value="{token}">
+  <input type="hidden" name="server_id" value="{code}">
+  <input type="text" name="username">
+  <input type="password" name="password">
+  <button type="submit">Create Account</button>
+</form>
+</body></html>"""
+
+PROVIDER_SUCCESS_PAGE = """<html><body>
+<div class="alert">Account {username} has been created successfully.</div>
+<table><tr><td>Host</td><td>{host}</td></tr><tr><td>Expired</td><td>7 days</td></tr></table>
+</body></html>"""
+
+PROVIDER_ERROR_PAGE = "<html><body><h1>503 Service Unavailable</h1></body></html>"
+
+
+class ProviderEmulator(httpx.AsyncBaseTransport):
+    """httpx transport that answers SSH provider URLs locally
+
+    Mount it on the provider HTTP client to run the generators fully offline:
+    GET requests return a creation form, POST requests return a success page
+    that echoes the submitted username. Latency is simulated with
+    ``asyncio.sleep``, like a real network wait on the async client.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 failure_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.requests = Counter()
+
+    def install(self, http):
+        """Route every request of a ProviderHTTP client through the emulator"""
+        http.mount(self)
+        return http
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        """Answer a request with a canned provider page"""
+        url = request.url
+        self.requests[url.host] += 1
+
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            return self._build_response(503, PROVIDER_ERROR_PAGE)
+
+        code = url.path.rstrip("/").split("/")[-1] or "default"
+        if request.method == "GET":
+            token = "%032x" % self.random.getrandbits(128)
+            return self._build_response(200, PROVIDER_FORM_PAGE.format(code=code, token=token))
+
+        form = self._parse_body(await request.aread())
+        username = form.get("username", "user")
+        host = f"{form.get('server', code)}.{url.host}"
+        return self._build_response(200, PROVIDER_SUCCESS_PAGE.format(username=username, host=host))
+
+    @staticmethod
+    def _parse_body(body) -> Dict[str, str]:
+        """Decode an urlencoded form body"""
+        if not body:
+            return {}
+        if isinstance(body, bytes):
+            body = body.decode("utf-8", "replace")
+        return {key: values[0] for key, values in parse_qs(body).items()}
+
+    @staticmethod
+    def _build_response(status: int, body: str) -> httpx.Response:
+        """Build an httpx.Response from canned content"""
+        return httpx.Response(
+            status, content=body.encode("utf-8"),
+            headers={"Content-Type": "text/html; charset=utf-8"}
+        )
+
+
+class FakeBotAPIServer:
+    """Minimal local HTTP server that speaks enough of the Telegram Bot API
+
+    Point the bot at it with ``SSHVPNBot.initialize(base_url=server.base_url)``.
+    Every method call is counted in ``self.calls``; responses are built from
+    the request parameters so python-telegram-bot can deserialize them.
+    getChatMember reports ``left_users`` as having left every channel.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, left_users=()):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.left_users = set(left_users)
+        self.calls = Counter()
+        self._server = None
+        self._message_id = 0
+
+    @property
+    def base_url(self) -> str:
+        """Bot API base URL; the token is appended by python-telegram-bot"""
+        return f"http://{self.host}:{self.port}/bot"
+
+    async def start(self) -> str:
+        """Start listening and return the base URL"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Fake Bot API listening on {self.base_url}")
+        return self.base_url
+
+    async def stop(self):
+        """Stop the server"""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve keep-alive HTTP/1.1 requests on one connection"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0) or 0)
+                body = await reader.readexactly(length) if length else b""
+
+                path = request_line.decode("latin-1").split(" ")[1]
+                api_method = path.rstrip("/").split("/")[-1]
+                params = self._parse_params(headers.get("content-type", ""), body)
+
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+
+                payload = json.dumps({"ok": True, "result": self._dispatch(api_method, params)}).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: application/json\r\n"
+                    b"Connection: keep-alive\r\n"
+                    b"Content-Length: " + str(len(payload)).encode() + b"\r\n\r\n" + payload
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _parse_params(content_type: str, body: bytes) -> Dict:
+        """Extract the request parameters from a form, JSON or multipart body"""
+        if not body:
+            return {}
+        if "application/json" in content_type:
+            return json.loads(body)
+        if "multipart/form-data" in content_type:
+            return {
+                name.decode(): value.decode("utf-8", "replace")
+                for name, value in re.findall(rb'name="([^"]+)"\r\n\r\n([^\r]*)\r\n', body)
+            }
+        return {key: values[0] for key, values in parse_qs(body.decode("utf-8", "replace")).items()}
+
+    def _dispatch(self, api_method: str, params: Dict):
+        """Build the result object for a Bot API method"""
+        self.calls[api_method] += 1
+        api_method = api_method.lower()
+
+        if api_method == "getme":
+            return FAKE_BOT_USER
+        if api_method in ("sendmessage", "sendphoto", "senddocument", "editmessagetext",
+                          "editmessagereplymarkup", "editmessagecaption"):
+            return self._message_result(params)
+        if api_method == "getchatmember":
+            user_id = self._as_int(params.get("user_id"), 0)
+            return {
+                "status": "left" if user_id in self.left_users else "member",
+                "user": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+            }
+        if api_method == "getupdates":
+            return []
+        return True
+
+    def _message_result(self, params: Dict) -> Dict:
+        """Build a Message echoing the sent text"""
+        self._message_id += 1
+        chat_id = self._as_int(params.get("chat_id"), FAKE_BOT_USER["id"])
+        return {
+            "message_id": self._as_int(params.get("message_id"), self._message_id),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": FAKE_BOT_USER,
+            "text": params.get("text", "")
+        }
+
+    @staticmethod
+    def _as_int(value, default: int) -> int:
+        """Parse a (possibly JSON-encoded) integer parameter"""
+        try:
+            return int(str(value).strip('"'))
+        except (TypeError, ValueError):
+            return default
+
+
+
+class OTLPCollectorStandIn:
+    """Local OTLP/HTTP JSON trace collector that keeps received spans in memory"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.spans: List[Dict] = []
+        collector = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0) or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                for resource in payload.get("resourceSpans", []):
+                    for scope in resource.get("scopeSpans", []):
+                        collector.spans.extend(scope.get("spans", []))
+                body = b"{}"
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self.endpoint = f"http://{host}:{self._server.server_address[1]}/v1/traces"
+        self._thread = threading.Thread(target=self._server.serve_forever, name="otlp-collector", daemon=True)
+
+    def start(self) -> str:
+        """Start serving and return the /v1/traces endpoint"""
+        self._thread.start()
+        return self.endpoint
+
+    def stop(self):
+        """Stop serving"""
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def in_memory_database(name: str = "emulator"):
+    """A migrated Database on a fresh in-memory mongomock store"""
+    # Imported here: the load harness imports this module before it points config at mongomock
+    from db import Database
+    database = Database("mongomock://", name)
+    database.migrate()
+    return database
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Streaming export of the users and configs collections for analytics
+
+Documents are read with projected, ``_id``-ordered cursors and written through
+a generator pipeline into compressed segment files, so memory stays flat
+regardless of collection size. Each partition (a range of ``_id``) records a
+checkpoint after every finished segment; rerunning the same command resumes
+from the last exported ``_id``.
+
+Usage:
+    python export.py users configs --format csv --out exports
+    python export.py configs --format parquet --partitions 4 --batch-size 10000
+    python export.py users --restart
+"""
+
+import argparse
+import csv
+import glob
+import gzip
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from bson import ObjectId, json_util
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Exported fields and their Parquet column types; "_id" is always included
+EXPORT_FIELDS = {
+    "users": {
+        "user_id": "int64", "username": "string", "points": "int64", "referrer_id": "int64",
+        "free_used": "bool", "joined_channels": "bool", "total_configs": "int64",
+        "last_config": "timestamp", "created_at": "timestamp", "last_active": "timestamp"
+    },
+    "configs": {
+        "user_id": "int64", "config_type": "string", "batch_id": "string", "created_at": "timestamp"
+    }
+}
+
+def iter_documents(collection, fields: List[str], start=None, end=None, after=None,
+                   batch_size: int = 5000) -> Iterator[Dict]:
+    """Projected documents in ``_id`` order within [start, end), resuming after ``after``"""
+    id_range = {}
+    if after is not None:
+        id_range["$gt"] = after
+    elif start is not None:
+        id_range["$gte"] = start
+    if end is not None:
+        id_range["$lt"] = end
+    query = {"_id": id_range} if id_range else {}
+    projection = {field: 1 for field in fields}
+    cursor = collection.find(query, projection).sort("_id", 1).batch_size(batch_size)
+    try:
+        yield from cursor
+    finally:
+        cursor.close()
+
+def to_rows(documents: Iterator[Dict], fields: List[str]) -> Iterator[Tuple[object, Dict]]:
+    """(original _id, flat row) pairs; lists and sub-documents become JSON strings"""
+    for doc in documents:
+        row = {"_id": str(doc["_id"])}
+        for field in fields:
+            value = doc.get(field)
+            if isinstance(value, (list, dict)):
+                value = json.dumps(value, default=str)
+            elif isinstance(value, ObjectId):
+                value = str(value)
+            row[field] = value
+        yield doc["_id"], row
+
+def _text(value) -> Optional[str]:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+class JsonlSegment:
+    """One gzip-compressed JSON Lines segment file"""
+
+    extension = "jsonl.gz"
+
+    def __init__(self, path: str, columns: Dict[str, str]):
+        self.file = gzip.open(path, "wt", encoding="utf-8")
+
+    def write(self, row: Dict):
+        self.file.write(json.dumps({k: _text(v) for k, v in row.items()}, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.file.close()
+
+class CsvSegment:
+    """One gzip-compressed CSV segment file with its own header"""
+
+    extension = "csv.gz"
+
+    def __init__(self, path: str, columns: Dict[str, str]):
+        self.file = gzip.open(path, "wt", encoding="utf-8", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=list(columns))
+        self.writer.writeheader()
+
+    def write(self, row: Dict):
+        self.writer.writerow({k: _text(v) for k, v in row.items()})
+
+    def close(self):
+        self.file.close()
+
+class ParquetSegment:
+    """One Parquet segment file, written one row group at a time (requires pyarrow)"""
+
+    extension = "parquet"
+    row_group_size = 5000
+
+    def __init__(self, path: str, columns: Dict[str, str]):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export requires pyarrow: pip install pyarrow")
+        types = {"int64": pa.int64(), "bool": pa.bool_(), "string": pa.string(),
+                 "timestamp": pa.timestamp("us", tz="UTC")}
+        self.pa = pa
+        self.schema = pa.schema([(name, types[kind]) for name, kind in columns.items()])
+        self.writer = pq.ParquetWriter(path, self.schema, compression="snappy")
+        self.rows: List[Dict] = []
+
+    def write(self, row: Dict):
+        self.rows.append(row)
+        if len(self.rows) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self.rows:
+            self.writer.write_table(self.pa.Table.from_pylist(self.rows, schema=self.schema))
+            self.rows = []
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+FORMATS = {"jsonl": JsonlSegment, "csv": CsvSegment, "parquet": ParquetSegment}
+
+class CollectionExporter:
+    """Resumable, optionally partitioned export of one collection
+
+    Output goes to ``<out>/<name>/part-PPP-SSSSS.<ext>``. A segment is written
+    to a temporary name and renamed when complete; the partition checkpoint
+    (last ``_id``, next segment, row count) is saved right after, so a crash
+    loses at most the segment in progress. Partition bounds are stored in
+    ``manifest.json`` and reused when resuming.
+    """
+
+    def __init__(self, collection, name: str, output_dir: str, fmt: str = "jsonl",
+                 fields: Optional[Dict[str, str]] = None, batch_size: int = 5000,
+                 segment_rows: int = 100000):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format {fmt!r}")
+        self.collection = collection
+        self.name = name
+        self.directory = os.path.join(output_dir, name)
+        self.segment_class = FORMATS[fmt]
+        self.fields = dict(fields if fields is not None else EXPORT_FIELDS.get(name, {}))
+        self.columns = {"_id": "string", **self.fields}
+        self.batch_size = batch_size
+        self.segment_rows = segment_rows
+
+    # Partitioning
+
+    def partition_bounds(self, partitions: int) -> List[Tuple]:
+        """Split the ``_id`` range into [start, end) pieces by ObjectId timestamp"""
+        first = self.collection.find_one({}, {"_id": 1}, sort=[("_id", 1)])
+        last = self.collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        if partitions <= 1 or first is None or not isinstance(first["_id"], ObjectId) \
+                or not isinstance(last["_id"], ObjectId):
+            return [(None, None)]
+
+        low = first["_id"].generation_time.timestamp()
+        high = last["_id"].generation_time.timestamp() + 1
+        step = (high - low) / partitions
+        cuts = []
+        for i in range(1, partitions):
+            cut = ObjectId.from_datetime(datetime.fromtimestamp(low + step * i, timezone.utc))
+            if not cuts or cut > cuts[-1]:
+                cuts.append(cut)
+        edges = [None] + cuts + [None]
+        return list(zip(edges[:-1], edges[1:]))
+
+    def _load_manifest(self, partitions: int) -> List[Tuple]:
+        path = os.path.join(self.directory, "manifest.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                return [tuple(bounds) for bounds in json_util.loads(f.read())["partitions"]]
+        bounds = self.partition_bounds(partitions)
+        with open(path, "w") as f:
+            f.write(json_util.dumps({"collection": self.name, "columns": self.columns, "partitions": bounds}))
+        return bounds
+
+    # Checkpoints
+
+    def _checkpoint_path(self, index: int) -> str:
+        return os.path.join(self.directory, f"part-{index:03d}.checkpoint.json")
+
+    def _load_checkpoint(self, index: int) -> Dict:
+        path = self._checkpoint_path(index)
+        if not os.path.exists(path):
+            return {"after": None, "segment": 0, "rows": 0, "done": False}
+        with open(path) as f:
+            return json_util.loads(f.read())
+
+    def _save_checkpoint(self, index: int, state: Dict):
+        path = self._checkpoint_path(index)
+        with open(path + ".tmp", "w") as f:
+            f.write(json_util.dumps(state))
+        os.replace(path + ".tmp", path)
+
+    # Export
+
+    def _segment_path(self, index: int, segment: int) -> str:
+        return os.path.join(self.directory, f"part-{index:03d}-{segment:05d}.{self.segment_class.extension}")
+
+    def export_partition(self, index: int, start=None, end=None) -> int:
+        """Export one [start, end) range, resuming from its checkpoint; returns total rows"""
+        state = self._load_checkpoint(index)
+        if state["done"]:
+            return state["rows"]
+
+        # Drop segments left half-written by an interrupted run
+        for stale in glob.glob(os.path.join(self.directory, f"part-{index:03d}-*.tmp")):
+            os.remove(stale)
+
+        rows = to_rows(
+            iter_documents(self.collection, list(self.fields), start, end, state["after"], self.batch_size),
+            list(self.fields)
+        )
+        segment, written, last_id = None, 0, None
+        try:
+            for last_id, row in rows:
+                if segment is None:
+                    path = self._segment_path(index, state["segment"])
+                    segment = self.segment_class(path + ".tmp", self.columns)
+                    written = 0
+                segment.write(row)
+                written += 1
+                if written >= self.segment_rows:
+                    segment.close()
+                    segment = None
+                    self._finish_segment(index, state, last_id, written)
+            if segment is not None:
+                segment.close()
+                segment = None
+                self._finish_segment(index, state, last_id, written)
+        finally:
+            if segment is not None:
+                segment.close()
+
+        state["done"] = True
+        self._save_checkpoint(index, state)
+        return state["rows"]
+
+    def _finish_segment(self, index: int, state: Dict, last_id, written: int):
+        path = self._segment_path(index, state["segment"])
+        os.replace(path + ".tmp", path)
+        state.update(after=last_id, segment=state["segment"] + 1, rows=state["rows"] + written)
+        self._save_checkpoint(index, state)
+        logger.info(f"{self.name} part {index}: {state['rows']} rows exported (last _id {last_id})")
+
+    def run(self, partitions: int = 1, restart: bool = False) -> Dict:
+        """Export every partition, in parallel threads when there are several"""
+        if restart and os.path.isdir(self.directory):
+            for path in glob.glob(os.path.join(self.directory, "*")):
+                os.remove(path)
+        os.makedirs(self.directory, exist_ok=True)
+
+        started = time.perf_counter()
+        bounds = self._load_manifest(partitions)
+        with ThreadPoolExecutor(max_workers=len(bounds)) as pool:
+            counts = list(pool.map(lambda item: self.export_partition(item[0], *item[1]), enumerate(bounds)))
+        elapsed = time.perf_counter() - started
+        return {
+            "collection": self.name,
+            "rows": sum(counts),
+            "partitions": counts,
+            "files": len(glob.glob(os.path.join(self.directory, f"part-*.{self.segment_class.extension}"))),
+            "seconds": round(elapsed, 3)
+        }
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Stream users/configs to compressed files")
+    parser.add_argument("collections", nargs="+", choices=sorted(EXPORT_FIELDS))
+    parser.add_argument("--format", choices=sorted(FORMATS), default="jsonl")
+    parser.add_argument("--out", default="exports", help="Output directory")
+    parser.add_argument("--partitions", type=int, default=1, help="Parallel _id range partitions")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Cursor batch size")
+    parser.add_argument("--segment-rows", type=int, default=100000, help="Rows per output file")
+    parser.add_argument("--with-config-data", action="store_true", help="Include the full configs.config_data text")
+    parser.add_argument("--restart", action="store_true", help="Discard checkpoints and start over")
+    args = parser.parse_args()
+
+    from db import db
+
+    for name in args.collections:
+        fields = dict(EXPORT_FIELDS[name])
+        if name == "configs" and args.with_config_data:
+            fields["config_data"] = "string"
+        exporter = CollectionExporter(
+            db.db[name], name, args.out, args.format, fields,
+            batch_size=args.batch_size, segment_rows=args.segment_rows
+        )
+        summary = exporter.run(args.partitions, args.restart)
+        print(json.dumps(summary))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+
+from metrics import CacheMetrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# First <form ...> ... </form> of a page; only this slice is handed to the parser
+FORM_PATTERN = re.compile(rb"<form\b.*?</form\s*>", re.IGNORECASE | re.DOTALL)
+
+class FormSchema:
+    """What a provider's creation form needs: where to post and which fields to send"""
+
+    __slots__ = ("action", "method", "hidden", "fields")
+
+    def __init__(self, action: str, method: str, hidden: Dict[str, str], fields: List[str]):
+        self.action = action
+        self.method = method
+        self.hidden = hidden
+        self.fields = fields
+
+    def form_data(self, **values) -> Dict[str, str]:
+        """Hidden fields plus the given values"""
+        return {**self.hidden, **values}
+
+def extract_form(page, base_url: str) -> Optional[FormSchema]:
+    """Parse the first <form> of ``page`` (str or bytes) with lxml; None without a form"""
+    if isinstance(page, str):
+        page = page.encode("utf-8", "replace")
+    match = FORM_PATTERN.search(page)
+    if match is None:
+        return None
+    # lxml.html costs ~30 ms to import; only the first page form pays it, not bot startup
+    import lxml.html
+    from lxml import etree
+    try:
+        form = lxml.html.fragment_fromstring(match.group(0))
+    except etree.ParserError:
+        return None
+    if form.tag != "form":
+        form = form.find(".//form")
+        if form is None:
+            return None
+
+    hidden, fields = {}, []
+    for element in form.iter("input", "select", "textarea"):
+        name = element.get("name")
+        if not name:
+            continue
+        if element.tag == "input" and (element.get("type") or "").lower() == "hidden":
+            hidden[name] = element.get("value", "")
+        else:
+            fields.append(name)
+    action = urljoin(base_url, form.get("action") or base_url)
+    return FormSchema(action, (form.get("method") or "get").upper(), hidden, fields)
+
+class FormCache:
+    """Form schemas per provider server, kept for ``ttl`` seconds
+
+    Callers drop an entry with ``invalidate`` when a submit based on it
+    fails, so the next attempt fetches the page again.
+    """
+
+    def __init__(self, ttl: float = 600.0, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._metrics = CacheMetrics("provider_forms")
+
+    def get(self, key: str) -> Optional[FormSchema]:
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._cache.move_to_end(key)
+            self._metrics.hit()
+            return entry[1]
+        self._metrics.miss()
+        return None
+
+    def store(self, key: str, schema: FormSchema):
+        self._cache[key] = (time.monotonic() + self.ttl, schema)
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def invalidate(self, key: str):
+        self._cache.pop(key, None)
@@ -1,25 +1,32 @@
-import requests
-from bs4 import BeautifulSoup
 import random
 import string
 import json
 import base64
 import re
 import logging
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple
 from datetime import datetime, timedelta, timezone
 import time
 import uuid
-import urllib3
-from urllib.parse import urljoin, urlparse
 
-# Disable SSL warnings for providers with certificate issues
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from config import FORM_CACHE_CONFIG
+from forms import FormCache, FormSchema, extract_form
+from metrics import ProviderAttempt
+from prober import EndpointProber, prober as endpoint_prober
+from provider_http import provider_http
+from providers import SPEED_TEST_NOTE, Provider, providers as provider_registry
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Marks the placeholder configs returned when every provider fails
+DEMO_NOTE = "Demo config - For testing purposes only"
+
+def is_demo_config(config: Dict) -> bool:
+    """Whether ``config`` is a demo placeholder rather than a working account"""
+    return config.get("note") == DEMO_NOTE
+
 # Service-specific payloads for HTTP Injector with speed test optimization
 SERVICE_PAYLOADS = {
     "youtube": {
@@ -105,20 +112,9 @@ SERVICE_PAYLOADS = {
 }
 
 class ConfigGenerator:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Cache-Control': 'no-cache'
-        })
-        # Disable SSL verification for problematic providers
-        self.session.verify = False
-        # Set timeout
-        self.timeout = 30
+    def __init__(self, http=None):
+        # Shared async client: pooled keep-alive connections, retries and timeouts from HTTP_CONFIG
+        self.http = http or provider_http
         
     def generate_username(self, length: int = 8) -> str:
         """Generate random username"""
@@ -132,220 +128,184 @@ class ConfigGenerator:
         return ''.join(random.choices(chars, k=length))
 
 class SSHGenerator(ConfigGenerator):
-    def __init__(self):
-        super().__init__()
+    """Creates SSH accounts on the providers declared in ``SSH_PROVIDERS``
+
+    Every provider runs through ``create_account``: its servers are tried
+    healthiest first (by live probes, then config order) inside the
+    provider's concurrency slot, each request is charged to
+    the provider's budget, and every server attempt is recorded in the
+    provider metrics. Adding a provider or server is a config change.
+    """
+
+    def __init__(self, http=None, forms: FormCache = None, providers: List[Provider] = None,
+                 prober: EndpointProber = None):
+        super().__init__(http)
+        # Creation form schemas per server, so a cached form needs only the POST
+        self.forms = forms or FormCache(FORM_CACHE_CONFIG["ttl"])
+        self.providers = providers if providers is not None else provider_registry
+        # SSH hosts are probed in the background so servers that stopped answering are tried last
+        self.prober = prober or endpoint_prober
+        for provider in self.providers:
+            for server in provider.servers:
+                self.prober.add(server['host'], server['port'], kind="ssh")
         
-    def create_speedssh_account(self) -> Optional[Dict]:
-        """Create SSH account from SpeedSSH with improved error handling"""
-        servers = [
-            {'code': 'sg1', 'host': 'sg1.speedssh.com', 'port': 22},
-            {'code': 'us1', 'host': 'us1.speedssh.com', 'port': 22},
-            {'code': 'de1', 'host': 'de1.speedssh.com', 'port': 22},
-            {'code': 'uk1', 'host': 'uk1.speedssh.com', 'port': 22}
-        ]
+    def provider(self, name: str) -> Optional[Provider]:
+        return next((provider for provider in self.providers if provider.name == name), None)
         
-        for server in servers:
-            try:
-                logger.info(f"Attempting to create SpeedSSH account on {server['code']}")
-                
-                # Generate credentials
-                username = self.generate_username()
-                password = self.generate_password()
-                
-                # First get the creation page to extract any tokens/forms
-                create_url = f"https://speedssh.com/create-ssh-server/{server['code']}"
-                
-                try:
-                    response = self.session.get(create_url, timeout=self.timeout)
-                    if response.status_code != 200:
-                        logger.warning(f"SpeedSSH {server['code']} page returned {response.status_code}")
-                        continue
-                except Exception as e:
-                    logger.error(f"Failed to access SpeedSSH {server['code']}: {e}")
-                    continue
-                
-                # Parse the form
-                soup = BeautifulSoup(response.text, 'html.parser')
-                form = soup.find('form')
-                
-                if not form:
-                    logger.warning(f"No form found on SpeedSSH {server['code']}")
-                    continue
-                
-                # Prepare form data
-                form_data = {
-                    'username': username,
-                    'password': password,
-                    'server': server['code']
-                }
-                
-                # Extract hidden fields if any
-                for hidden in soup.find_all('input', type='hidden'):
-                    name = hidden.get('name')
-                    value = hidden.get('value', '')
-                    if name:
-                        form_data[name] = value
-                
-                # Submit form
-                try:
-                    form_action = form.get('action', create_url)
-                    if not form_action.startswith('http'):
-                        form_action = urljoin(create_url, form_action)
-                    
-                    submit_response = self.session.post(
-                        form_action, 
-                        data=form_data, 
-                        timeout=self.timeout,
-                        allow_redirects=True
-                    )
-                    
-                    if submit_response.status_code in [200, 201, 302]:
-                        # Check if creation was successful
-                        response_text = submit_response.text.lower()
-                        success_indicators = [
-                            'success', 'created', 'account', username.lower(), 
-                            'ssh', 'generated', 'active', 'ready'
-                        ]
-                        
-                        if any(indicator in response_text for indicator in success_indicators):
-                            logger.info(f"Successfully created SpeedSSH account on {server['code']}")
-                            return {
-                                "type": "SSH",
-                                "host": server['host'],
-                                "port": server['port'],
-                                "username": username,
-                                "password": password,
-                                "created_at": datetime.now(timezone.utc).isoformat(),
-                                "expires_at": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat(),
-                                "server": server['code'],
-                                "provider": "SpeedSSH",
-                                "speed_test_note": "SSH Speed Test Commands:\n• speedtest-cli\n• curl -s https://raw.githubusercontent.com/sivel/speedtest-cli/master/speedtest.py | python3\n• wget -O /dev/null http://speedtest.wdc01.softlayer.com/downloads/test100.zip"
-                            }
-                    
-                except Exception as e:
-                    logger.error(f"Failed to submit form to SpeedSSH {server['code']}: {e}")
-                    continue
-                    
-            except Exception as e:
-                logger.error(f"SpeedSSH server {server['code']} failed: {e}")
-                continue
-                
-        logger.warning("All SpeedSSH servers failed")
-        return None
+    async def fetch_form(self, provider: Provider, url: str, cache_key: str) -> Optional[FormSchema]:
+        """GET a creation page and cache its form schema; None if it has no usable form"""
+        try:
+            await provider.request_token()
+            response = await self.http.get(url)
+        except Exception as e:
+            logger.error(f"Failed to access {url}: {e}")
+            return None
+        if response.status_code != 200:
+            logger.warning(f"{url} returned {response.status_code}")
+            return None
+        
+        schema = extract_form(response.content, str(response.url))
+        if schema is None:
+            logger.warning(f"No form found on {url}")
+            return None
+        self.forms.store(cache_key, schema)
+        return schema
     
-    def create_fastssh_account(self) -> Optional[Dict]:
-        """Create SSH account from FastSSH"""
-        servers = [
-            {'code': 'sg', 'host': 'sg.fastssh.com', 'port': 22},
-            {'code': 'us', 'host': 'us.fastssh.com', 'port': 22},
-            {'code': 'de', 'host': 'de.fastssh.com', 'port': 22}
-        ]
+    def plan(self, regions: Optional[List[str]] = None) -> List[Tuple[Provider, List[Dict]]]:
+        """Attempts as (provider, servers) in the order they are tried
+
+        Without ``regions``: active providers in config order, each with its
+        servers healthiest first. With a region order, servers are grouped by
+        region across providers (the first region on every provider before
+        the second), and servers that probe as down come after all others.
+        """
+        active = [provider for provider in self.providers if provider.active]
+        ranked = {
+            provider.name: self.prober.rank(provider.servers, key=lambda s: (s['host'], s['port']))
+            for provider in active
+        }
+        if not regions:
+            return [(provider, ranked[provider.name]) for provider in active]
         
-        for server in servers:
+        position = {region: index for index, region in enumerate(regions)}
+        candidates = sorted(
+            (
+                (self.prober.is_healthy(server['host'], server['port']) is False,
+                 position.get(server['region'], len(position)), provider_index, server_index),
+                provider, server
+            )
+            for provider_index, provider in enumerate(active)
+            for server_index, server in enumerate(ranked[provider.name])
+        )
+        steps = []
+        for _, provider, server in candidates:
+            # Consecutive servers of one provider share a single attempt
+            if steps and steps[-1][0] is provider:
+                steps[-1][1].append(server)
+            else:
+                steps.append((provider, [server]))
+        return steps
+    
+    async def create_account(self, provider: Provider, servers: Optional[List[Dict]] = None) -> Optional[Dict]:
+        """Create an account on the first of ``servers`` (default: all, healthiest first) that accepts one"""
+        if servers is None:
+            servers = self.prober.rank(provider.servers, key=lambda s: (s['host'], s['port']))
+        async with provider.slot():
+            provider.in_flight.inc()
             try:
-                logger.info(f"Attempting to create FastSSH account on {server['code']}")
-                
-                username = self.generate_username()
-                password = self.generate_password()
-                
-                url = f"https://fastssh.com/create-ssh-server/{server['code']}"
-                
-                form_data = {
-                    'username': username,
-                    'password': password,
-                    'server': server['code']
-                }
-                
-                response = self.session.post(url, data=form_data, timeout=self.timeout)
-                
-                if response.status_code == 200:
-                    response_text = response.text.lower()
-                    if any(word in response_text for word in ['success', 'created', username.lower()]):
-                        logger.info(f"Successfully created FastSSH account on {server['code']}")
-                        return {
-                            "type": "SSH",
-                            "host": server['host'],
-                            "port": server['port'],
-                            "username": username,
-                            "password": password,
-                            "created_at": datetime.now(timezone.utc).isoformat(),
-                            "expires_at": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat(),
-                            "server": server['code'],
-                            "provider": "FastSSH",
-                            "speed_test_note": "SSH Speed Test Commands:\n• speedtest-cli\n• curl -s https://raw.githubusercontent.com/sivel/speedtest-cli/master/speedtest.py | python3"
-                        }
+                for server in servers:
+                    attempt = ProviderAttempt(provider.name, server['code'])
+                    try:
+                        logger.info(f"Attempting to create {provider.name} account on {server['code']}")
                         
-            except Exception as e:
-                logger.error(f"FastSSH server {server['code']} failed: {e}")
-                continue
+                        username = self.generate_username()
+                        password = self.generate_password()
+                        
+                        if not await self.submit_account(provider, server, username, password):
+                            continue
+                        
+                        logger.info(f"Successfully created {provider.name} account on {server['code']}")
+                        attempt.success()
+                        return self.account(provider, server, username, password)
+                        
+                    except Exception as e:
+                        logger.error(f"{provider.name} server {server['code']} failed: {e}")
+                        continue
+                    finally:
+                        attempt.finish()
+            finally:
+                provider.in_flight.dec()
                 
+        logger.warning(f"No {provider.name} server created an account")
         return None
     
-    def create_opentunnel_account(self) -> Optional[Dict]:
-        """Create SSH account from OpenTunnel"""
-        servers = [
-            {'code': 'sg', 'host': 'sg.opentunnel.net', 'port': 22},
-            {'code': 'us', 'host': 'us.opentunnel.net', 'port': 22},
-            {'code': 'de', 'host': 'de.opentunnel.net', 'port': 22}
-        ]
+    async def submit_account(self, provider: Provider, server: Dict, username: str, password: str) -> bool:
+        """Submit one creation request; True if the response reports a created account"""
+        create_url = provider.create_url(server)
+        form_data = provider.form_data(server, username, password)
+        if provider.form == "direct":
+            return await self.submit_form(provider, create_url, form_data, username)
         
-        for server in servers:
-            try:
-                logger.info(f"Attempting to create OpenTunnel account on {server['code']}")
-                
-                username = self.generate_username()
-                password = self.generate_password()
-                
-                url = f"https://opentunnel.net/create-ssh-server/{server['code']}"
-                
-                form_data = {
-                    'username': username,
-                    'password': password,
-                    'server': server['code']
-                }
-                
-                response = self.session.post(url, data=form_data, timeout=self.timeout)
-                
-                if response.status_code == 200:
-                    response_text = response.text.lower()
-                    if any(word in response_text for word in ['success', 'created', username.lower()]):
-                        logger.info(f"Successfully created OpenTunnel account on {server['code']}")
-                        return {
-                            "type": "SSH",
-                            "host": server['host'],
-                            "port": server['port'],
-                            "username": username,
-                            "password": password,
-                            "created_at": datetime.now(timezone.utc).isoformat(),
-                            "expires_at": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat(),
-                            "server": server['code'],
-                            "provider": "OpenTunnel",
-                            "speed_test_note": "SSH Speed Test Commands:\n• speedtest-cli\n• curl -s https://raw.githubusercontent.com/sivel/speedtest-cli/master/speedtest.py | python3"
-                        }
-                        
-            except Exception as e:
-                logger.error(f"OpenTunnel server {server['code']} failed: {e}")
-                continue
-                
-        return None
+        # Reuse the cached form (action and hidden fields) when we have one
+        cache_key = f"{provider.name}:{server['code']}"
+        schema = self.forms.get(cache_key)
+        cached = schema is not None
+        if schema is None:
+            schema = await self.fetch_form(provider, create_url, cache_key)
+            if schema is None:
+                return False
+        
+        created = await self.submit_form(provider, schema.action, schema.form_data(**form_data), username)
+        if not created and cached:
+            # Stale token or changed form: refresh the schema and try once more
+            self.forms.invalidate(cache_key)
+            schema = await self.fetch_form(provider, create_url, cache_key)
+            created = schema is not None and await self.submit_form(
+                provider, schema.action, schema.form_data(**form_data), username
+            )
+        
+        if not created:
+            self.forms.invalidate(cache_key)
+        return created
     
-    def generate_ssh_config(self) -> Optional[Dict]:
-        """Generate SSH config from available providers"""
+    async def submit_form(self, provider: Provider, url: str, form_data: Dict, username: str) -> bool:
+        """POST a creation form; True if a success word shows up in the response"""
         try:
-            # Try SpeedSSH first
-            config = self.create_speedssh_account()
-            if config:
-                return config
-            
-            # Try FastSSH as backup
-            config = self.create_fastssh_account()
-            if config:
-                return config
-            
-            # Try OpenTunnel as last resort
-            config = self.create_opentunnel_account()
-            if config:
-                return config
+            await provider.request_token()
+            # Streams the body and stops reading at the first success word
+            found = await self.http.find("POST", url, provider.success_words(username),
+                                         statuses=provider.statuses, data=form_data)
+        except Exception as e:
+            logger.error(f"Failed to submit form to {provider.name} ({url}): {e}")
+            return False
+        return found is not None
+    
+    def account(self, provider: Provider, server: Dict, username: str, password: str) -> Dict:
+        created_at = datetime.now(timezone.utc)
+        return {
+            "type": "SSH",
+            "host": server['host'],
+            "port": server['port'],
+            "username": username,
+            "password": password,
+            "created_at": created_at.isoformat(),
+            "expires_at": (created_at + timedelta(days=provider.ttl_days)).isoformat(),
+            "server": server['code'],
+            "region": server['region'],
+            "provider": provider.name,
+            "speed_test_note": SPEED_TEST_NOTE
+        }
+    
+    async def generate_ssh_config(self, regions: Optional[List[str]] = None) -> Optional[Dict]:
+        """Generate SSH config from the first provider that creates an account
+
+        ``regions`` (e.g. from RegionSelector) decides which servers go first.
+        """
+        try:
+            for provider, servers in self.plan(regions):
+                config = await self.create_account(provider, servers)
+                if config:
+                    return config
                 
         except Exception as e:
             logger.error(f"SSH generation failed: {e}")
@@ -368,14 +328,124 @@ class SSHGenerator(ConfigGenerator):
             "expires_at": (datetime.now(timezone.utc) + timedelta(hours=24)).isoformat(),
             "server": "demo",
             "provider": "Demo",
-            "note": "Demo config - For testing purposes only",
-            "speed_test_note": "SSH Speed Test Commands:\n• speedtest-cli\n• curl -s https://raw.githubusercontent.com/sivel/speedtest-cli/master/speedtest.py | python3\n• wget -O /dev/null http://speedtest.wdc01.softlayer.com/downloads/test100.zip"
+            "note": DEMO_NOTE,
+            "speed_test_note": SPEED_TEST_NOTE
         }
 
+class VMessTemplate:
+    """Pre-serialized VMess link and client config for one (server, service)
+
+    Everything except the UUID is encoded once. A UUID string is always 36
+    ASCII bytes, so the base64 of the link splits into a pre-encoded head, a
+    short middle chunk covering the UUID (re-encoded per config) and a
+    pre-encoded tail. The client config is copied only along the path to the
+    user entry; its other sub-trees are shared between configs and must be
+    treated as read-only.
+    """
+    
+    UUID_LENGTH = 36
+    
+    def __init__(self, vmess_config: Dict, client_config: Dict, source: tuple):
+        self.source = source
+        self.vmess = vmess_config
+        self.client = client_config
+        marker = vmess_config["id"].encode()
+        
+        head, tail = json.dumps(vmess_config, separators=(',', ':')).encode().split(marker)
+        cut = len(head) - len(head) % 3
+        self._link_head = "vmess://" + base64.b64encode(head[:cut]).decode()
+        self._head_rest = head[cut:]
+        extra = -(len(self._head_rest) + self.UUID_LENGTH) % 3
+        self._tail_rest = tail[:extra]
+        self._link_tail = base64.b64encode(tail[extra:]).decode()
+        
+        self._json_head, self._json_tail = json.dumps(client_config).encode().split(marker)
+        
+        outbound = client_config["outbounds"][0]
+        self._vnext = outbound["settings"]["vnext"][0]
+        self._user = self._vnext["users"][0]
+    
+    def link(self, config_uuid: str) -> str:
+        """vmess:// link with ``config_uuid`` spliced into the encoded JSON"""
+        middle = base64.b64encode(self._head_rest + config_uuid.encode() + self._tail_rest).decode()
+        return self._link_head + middle + self._link_tail
+    
+    def vmess_config(self, config_uuid: str) -> Dict:
+        return {**self.vmess, "id": config_uuid}
+    
+    def client_config(self, config_uuid: str) -> Dict:
+        client = self.client
+        outbounds = client["outbounds"]
+        outbound = outbounds[0]
+        settings = outbound["settings"]
+        vnext = {**self._vnext, "users": [{**self._user, "id": config_uuid}]}
+        return {
+            **client,
+            "outbounds": [{**outbound, "settings": {**settings, "vnext": [vnext]}}] + outbounds[1:]
+        }
+    
+    def client_json(self, config_uuid: str) -> bytes:
+        """Client config serialized with ``json.dumps`` defaults"""
+        return self._json_head + config_uuid.encode() + self._json_tail
+    
+    def render(self, config_uuid: str) -> tuple:
+        """(vmess config, vmess link, client config) for one UUID"""
+        return self.vmess_config(config_uuid), self.link(config_uuid), self.client_config(config_uuid)
+
 class V2RayGenerator(ConfigGenerator):
-    def __init__(self):
+    def __init__(self, prober: EndpointProber = None):
         super().__init__()
+        self.prober = prober or endpoint_prober
+        self._servers: Optional[List[Dict]] = None
+        self._templates: Dict[tuple, VMessTemplate] = {}
+        
+    def servers_by_priority(self) -> List[Dict]:
+        """Working servers, fastest healthy endpoint first; static priority breaks ties"""
+        if self._servers is None:
+            self._servers = sorted(self.get_working_servers(), key=lambda x: x.get('priority', 999))
+            for server in self._servers:
+                self.prober.add(server["add"], server["port"], kind="v2ray", tls=server.get("tls") == "tls")
+        return self.prober.rank(self._servers, key=lambda server: (server["add"], server["port"]))
+    
+    def template_for(self, server_config: Dict, service: str, service_config: Dict) -> VMessTemplate:
+        """Cached template for (server, service), rebuilt when either changes"""
+        source = (
+            tuple(server_config.items()), service_config["name"], service_config["host"],
+            service_config["sni"], tuple(service_config.get("direct_domains", []))
+        )
+        key = (server_config["add"], service)
+        template = self._templates.get(key)
+        if template is None or template.source != source:
+            template = self.build_template(server_config, service_config, source)
+            self._templates[key] = template
+        return template
+    
+    def build_template(self, server_config: Dict, service_config: Dict, source: tuple = ()) -> VMessTemplate:
+        """Build a template and check it against the reference encoding"""
+        marker = str(uuid.uuid4())
+        vmess_config = self.build_vmess_config(server_config, service_config, marker)
+        template = VMessTemplate(vmess_config, self.create_v2ray_client_config(vmess_config, service_config), source)
+        if not self.verify_template(template, server_config, service_config, str(uuid.uuid4())):
+            raise ValueError(f"VMess template for {server_config['add']} does not match reference output")
+        return template
+    
+    def verify_template(self, template: VMessTemplate, server_config: Dict, service_config: Dict,
+                        config_uuid: str) -> bool:
+        """True when the template output is byte-identical to the reference path"""
+        vmess_config = self.build_vmess_config(server_config, service_config, config_uuid)
+        vmess_json = json.dumps(vmess_config, separators=(',', ':'))
+        reference_link = "vmess://" + base64.b64encode(vmess_json.encode()).decode()
+        reference_client = json.dumps(self.create_v2ray_client_config(vmess_config, service_config))
         
+        config, link, client = template.render(config_uuid)
+        return (
+            link == reference_link
+            and json.dumps(config, separators=(',', ':')) == vmess_json
+            and json.dumps(client) == reference_client
+            and template.client_json(config_uuid) == reference_client.encode()
+        )
+        
+
     def get_working_servers(self) -> List[Dict]:
         """Get list of working V2Ray servers with speed test optimization"""
         return [
@@ -430,38 +500,14 @@ class V2RayGenerator(ConfigGenerator):
         """Create VMess config optimized for specific service with speed test support"""
         try:
             service_config = SERVICE_PAYLOADS.get(service, SERVICE_PAYLOADS["all_sites"])
-            working_servers = self.get_working_servers()
-            
-            # Sort by priority
-            working_servers.sort(key=lambda x: x.get('priority', 999))
-            
-            for server_config in working_servers:
+            for server_config in self.servers_by_priority():
                 try:
                     # Generate UUID
                     config_uuid = str(uuid.uuid4())
                     
-                    # Create VMess config
-                    vmess_config = {
-                        "v": "2",
-                        "ps": f"{service_config['name']} - SpeedTest Optimized",
-                        "add": server_config["add"],
-                        "port": server_config["port"], 
-                        "id": config_uuid,
-                        "aid": "0",
-                        "net": server_config["net"],
-                        "type": "none",
-                        "host": service_config["host"],
-                        "path": server_config["path"],
-                        "tls": server_config["tls"],
-                        "sni": service_config["sni"]
-                    }
-                    
-                    # Encode to VMess link
-                    vmess_json = json.dumps(vmess_config, separators=(',', ':'))
-                    vmess_link = "vmess://" + base64.b64encode(vmess_json.encode()).decode()
-                    
-                    # Create V2Ray client config with routing
-                    v2ray_client_config = self.create_v2ray_client_config(vmess_config, service_config)
+                    template = self.template_for(server_config, service, service_config)
+                    vmess_config, vmess_link, v2ray_client_config = template.render(config_uuid)
+                    now = datetime.now(timezone.utc)
                     
                     config_data = {
                         "type": "VMess",
@@ -477,8 +523,8 @@ class V2RayGenerator(ConfigGenerator):
                         "host": service_config["host"],
                         "sni": service_config["sni"],
                         "v2ray_config": v2ray_client_config,
-                        "created_at": datetime.now(timezone.utc).isoformat(),
-                        "expires_at": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+                        "created_at": now.isoformat(),
+                        "expires_at": (now + timedelta(days=1)).isoformat(),
                         "injector_instructions": "Import VMess link in HTTP Injector and use provided payload",
                         "speed_test_support": True,
                         "speed_test_alternatives": [
@@ -507,6 +553,23 @@ class V2RayGenerator(ConfigGenerator):
             
         return None
     
+    def build_vmess_config(self, server_config: Dict, service_config: Dict, config_uuid: str) -> Dict:
+        """Reference VMess config; the template cache reproduces it byte for byte"""
+        return {
+            "v": "2",
+            "ps": f"{service_config['name']} - SpeedTest Optimized",
+            "add": server_config["add"],
+            "port": server_config["port"], 
+            "id": config_uuid,
+            "aid": "0",
+            "net": server_config["net"],
+            "type": "none",
+            "host": service_config["host"],
+            "path": server_config["path"],
+            "tls": server_config["tls"],
+            "sni": service_config["sni"]
+        }
+    
     def create_v2ray_client_config(self, vmess_config: Dict, service_config: Dict) -> Dict:
         """Create V2Ray client configuration with routing"""
         return {
@@ -642,7 +705,7 @@ class V2RayGenerator(ConfigGenerator):
                 "fast.com (Netflix speed test)",
                 "Mobile apps work better than web versions"
             ],
-            "note": "Demo config - For testing purposes only"
+            "note": DEMO_NOTE
         }
 
 # Main generator class
@@ -655,13 +718,14 @@ class MainGenerator:
         """Get list of available services"""
         return SERVICE_PAYLOADS
     
-    def generate_config(self, config_type: str = "auto", service: str = "all_sites") -> Optional[Dict]:
-        """Generate config based on type and service"""
+    async def generate_config(self, config_type: str = "auto", service: str = "all_sites",
+                              regions: Optional[List[str]] = None) -> Optional[Dict]:
+        """Generate config based on type and service; ``regions`` orders SSH servers"""
         try:
             config_type = config_type.lower()
             
             if config_type in ["ssh", "auto"]:
-                config = self.ssh_gen.generate_ssh_config()
+                config = await self.ssh_gen.generate_ssh_config(regions)
                 if config:
                     return config
                     
@@ -0,0 +1,119 @@
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from metrics import CacheMetrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+OLDER = "o"
+NEWER = "n"
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MILLISECOND = timedelta(milliseconds=1)
+
+def encode_cursor(config: Dict) -> str:
+    """Compact keyset cursor: created_at in hex milliseconds and the _id"""
+    created_at = config["created_at"]
+    if created_at.tzinfo is None:
+        # pymongo returns naive UTC datetimes
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return f"{(created_at - EPOCH) // MILLISECOND:x}.{config['_id']}"
+
+def decode_cursor(token: str) -> Tuple[datetime, ObjectId]:
+    """Inverse of encode_cursor; raises ValueError on malformed tokens"""
+    millis, _, config_id = token.partition(".")
+    try:
+        created_at = EPOCH + int(millis, 16) * MILLISECOND
+        return created_at, ObjectId(config_id)
+    except (InvalidId, TypeError, OverflowError) as e:
+        raise ValueError(f"Invalid history cursor {token!r}") from e
+
+class HistoryPage:
+    """One page of a user's configs with cursors for the neighbouring pages"""
+
+    __slots__ = ("items", "newer", "older")
+
+    def __init__(self, items: List[Dict], newer: Optional[str], older: Optional[str]):
+        self.items = items
+        self.newer = newer
+        self.older = older
+
+class HistoryPager:
+    """Keyset pagination over a user's configs with a small per-user page cache
+
+    Pages are cached per (direction, cursor) for ``ttl`` seconds, at most
+    ``pages_per_user`` per user and ``max_users`` users, least recently used
+    first out. Saving a config should call ``invalidate(user_id)``.
+    """
+
+    def __init__(self, database, page_size: int = 5, pages_per_user: int = 6,
+                 max_users: int = 500, ttl: float = 300.0):
+        self.database = database
+        self.page_size = page_size
+        self.pages_per_user = pages_per_user
+        self.max_users = max_users
+        self.ttl = ttl
+        self._cache: "OrderedDict[int, OrderedDict]" = OrderedDict()
+        self._metrics = CacheMetrics("history_pages")
+
+    def page(self, user_id: int, direction: str = OLDER, token: str = "") -> HistoryPage:
+        """Page of configs after ``token`` in ``direction``; the newest page without a token"""
+        key = (direction, token)
+        pages = self._cache.get(user_id)
+        if pages is not None:
+            self._cache.move_to_end(user_id)
+            cached = pages.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                pages.move_to_end(key)
+                self._metrics.hit()
+                return cached[1]
+        self._metrics.miss()
+
+        page = self._fetch(user_id, direction, token)
+        if pages is None:
+            pages = self._cache[user_id] = OrderedDict()
+            if len(self._cache) > self.max_users:
+                self._cache.popitem(last=False)
+        pages[key] = (time.monotonic() + self.ttl, page)
+        if len(pages) > self.pages_per_user:
+            pages.popitem(last=False)
+        return page
+
+    def _fetch(self, user_id: int, direction: str, token: str) -> HistoryPage:
+        cursor = None
+        if token:
+            try:
+                cursor = decode_cursor(token)
+            except ValueError as e:
+                logger.warning(f"{e}; showing the newest page")
+                direction = OLDER
+        newer = direction == NEWER and cursor is not None
+
+        configs = self.database.get_config_page(user_id, cursor, newer, self.page_size)
+        more = len(configs) > self.page_size
+        if newer:
+            items = configs[1:] if more else configs
+            has_newer, has_older = more, True
+        else:
+            items = configs[:self.page_size]
+            has_newer, has_older = cursor is not None, more
+        if not items:
+            # Nothing newer (or a stale cursor): fall back to the newest page
+            return self._fetch(user_id, OLDER, "") if cursor is not None else HistoryPage([], None, None)
+        return HistoryPage(
+            items,
+            encode_cursor(items[0]) if has_newer else None,
+            encode_cursor(items[-1]) if has_older else None
+        )
+
+    def invalidate(self, user_id: int):
+        """Drop cached pages after the user's history changed"""
+        self._cache.pop(user_id, None)
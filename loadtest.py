@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""
+End-to-end load harness for the SSH/V2Ray bot
+
+Builds the real SSHVPNBot Application against a local fake Bot API server,
+an in-memory Mongo stand-in and the offline provider emulator, then replays
+thousands of synthetic updates and reports per-handler latency percentiles,
+throughput and event-loop lag.
+
+Usage:
+    python loadtest.py --users 200 --updates 5000 --concurrency 64
+    python loadtest.py --soak-hours 4 --rss-budget-mb 50
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from emulator import FakeBotAPIServer, ProviderEmulator, FAKE_BOT_USER
+
+logger = logging.getLogger(__name__)
+
+# Offline environment; applied before config.py is imported
+LOADTEST_ENV = {
+    "BOT_TOKEN": "100000001:LOADTEST-OFFLINE-TOKEN",
+    "MONGO_URI": "mongomock://loadtest",
+    "DB_NAME": "sshbot_loadtest",
+    "ADMIN_IDS": "1",
+    # Synthetic users press buttons far faster than the per-user limits allow
+    "RATE_LIMIT_ENABLED": "false",
+    # Probes would go to the real V2Ray endpoints and SSH hosts
+    "PROBER_ENABLED": "false"
+}
+
+# Relative weight of each synthetic update kind
+DEFAULT_MIX = {
+    "/start": 0.15,
+    "/generate": 0.15,
+    "generate": 0.10,
+    "gen_ssh": 0.15,
+    "service_*": 0.30,
+    "check_channels": 0.10,
+    "points": 0.05
+}
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(q / 100.0 * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(1, rank)) - 1]
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """Parse a mix override such as 'gen_ssh=0.5,service_*=0.5'"""
+    mix = {}
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        route, _, weight = item.partition("=")
+        mix[route.strip()] = float(weight)
+    return mix
+
+def prepare_environment():
+    """Point config.py at the offline stand-ins"""
+    if "config" in sys.modules and not sys.modules["config"].MONGO_URI.startswith("mongomock://"):
+        raise RuntimeError("config.py was already imported with a real MONGO_URI; "
+                           "run the load harness in a fresh interpreter")
+    for key, value in LOADTEST_ENV.items():
+        os.environ[key] = value
+
+class UpdateFactory:
+    """Build synthetic Telegram update payloads"""
+
+    def __init__(self, service_keys: List[str], seed: Optional[int] = None):
+        self.service_keys = service_keys
+        self.random = random.Random(seed)
+        self.update_id = 0
+        self.message_id = 0
+
+    def _next_ids(self):
+        self.update_id += 1
+        self.message_id += 1
+        return self.update_id, self.message_id
+
+    @staticmethod
+    def _user(user_id: int) -> Dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}",
+                "username": f"user{user_id}", "language_code": "en"}
+
+    def command(self, user_id: int, command: str) -> Dict:
+        """Build a private-chat /command message update"""
+        update_id, message_id = self._next_ids()
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": self._user(user_id),
+                "text": command,
+                "entities": [{"type": "bot_command", "offset": 0, "length": len(command.split()[0])}]
+            }
+        }
+
+    def callback(self, user_id: int, data: str) -> Dict:
+        """Build a callback-query update attached to a bot message"""
+        update_id, message_id = self._next_ids()
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": FAKE_BOT_USER,
+                    "text": "menu"
+                }
+            }
+        }
+
+    def build(self, user_id: int, route: str) -> Dict:
+        """Build an update for a route from the mix table"""
+        if route.startswith("/"):
+            return self.command(user_id, route)
+        if route == "service_*":
+            return self.callback(user_id, f"service_{self.random.choice(self.service_keys)}")
+        return self.callback(user_id, route)
+
+class LoadHarness:
+    """Replay synthetic updates through SSHVPNBot and collect latency statistics"""
+
+    def __init__(self, users: int = 100, updates: int = 2000, concurrency: int = 32,
+                 mix: Optional[Dict[str, float]] = None, credits: int = 50,
+                 provider_latency: float = 0.05, provider_jitter: float = 0.02,
+                 provider_failure_rate: float = 0.05, api_latency: float = 0.0,
+                 lag_interval: float = 0.01, block_threshold: float = 0.05,
+                 trace_file: Optional[str] = None, seed: Optional[int] = 1):
+        self.users = users
+        self.updates = updates
+        self.concurrency = concurrency
+        self.mix = mix or dict(DEFAULT_MIX)
+        self.credits = credits
+        self.lag_interval = lag_interval
+        self.block_threshold = block_threshold
+        self.trace_file = trace_file
+        self.random = random.Random(seed)
+        self.seed = seed
+        self.api = FakeBotAPIServer(latency=api_latency)
+        self.providers = ProviderEmulator(
+            latency=provider_latency, jitter=provider_jitter,
+            failure_rate=provider_failure_rate, seed=seed
+        )
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.loop_lag = []
+        self.blocking_sites = []
+        self._current_route = {}
+
+    def _build_bot(self):
+        """Build SSHVPNBot wired to the offline stand-ins"""
+        prepare_environment()
+        from bot import SSHVPNBot
+        from provider_http import provider_http
+
+        self.providers.install(provider_http)
+        # The emulator is local, so the per-site politeness budgets would only cap the bot
+        from providers import providers
+        for provider in providers:
+            provider.budget.rate = provider.budget.burst = 10000
+
+        bot = SSHVPNBot()
+        bot.initialize(base_url=self.api.base_url)
+        bot.setup_handlers()
+        bot.application.add_error_handler(self._count_error)
+
+        if self.trace_file:
+            from tracing import configure_from
+            configure_from({"enabled": True, "sample_rate": 1.0, "exporter": "file", "file_path": self.trace_file})
+        return bot
+
+    async def _count_error(self, update, context):
+        """Attribute handler errors to the route being replayed"""
+        route = self._current_route.get(getattr(update, "update_id", None), "unknown")
+        self.errors[route] += 1
+
+    async def _sample_loop_lag(self, stop: asyncio.Event):
+        """Measure how late the event loop wakes a sleeping task"""
+        loop = asyncio.get_running_loop()
+        while not stop.is_set():
+            started = loop.time()
+            await asyncio.sleep(self.lag_interval)
+            self.loop_lag.append(max(0.0, loop.time() - started - self.lag_interval))
+
+    def _pick_route(self) -> str:
+        routes = list(self.mix)
+        return self.random.choices(routes, weights=[self.mix[r] for r in routes])[0]
+
+    async def _replay(self, application, payloads):
+        """Process updates with bounded concurrency, timing each one"""
+        from telegram import Update
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def process(route, payload):
+            async with semaphore:
+                update = Update.de_json(payload, application.bot)
+                self._current_route[update.update_id] = route
+                started = time.perf_counter()
+                try:
+                    await application.process_update(update)
+                except Exception:
+                    self.errors[route] += 1
+                self.latencies[route].append(time.perf_counter() - started)
+                self._current_route.pop(update.update_id, None)
+
+        await asyncio.gather(*(process(route, payload) for route, payload in payloads))
+
+    async def _setup(self):
+        """Start the stand-ins, build the bot and register the synthetic users"""
+        await self.api.start()
+        bot = self._build_bot()
+        application = bot.application
+
+        from generator import SERVICE_PAYLOADS
+
+        factory = UpdateFactory(list(SERVICE_PAYLOADS), seed=self.seed)
+        user_ids = [10_000 + i for i in range(self.users)]
+
+        from db import db
+        db.migrate()
+        await application.initialize()
+        await self._replay(application, [("warmup:/start", factory.command(uid, "/start")) for uid in user_ids])
+        self._fund(user_ids)
+        self.latencies.clear()
+        self.errors.clear()
+        return application, factory, user_ids
+
+    async def _teardown(self, application):
+        await application.shutdown()
+        await self.api.stop()
+        if self.trace_file:
+            from tracing import tracer
+            tracer.flush()
+
+    def _fund(self, user_ids: List[int]):
+        """Top up every synthetic user so generations proceed"""
+        from db import db
+        for uid in user_ids:
+            db.add_points(uid, self.credits, "Load test credits")
+
+    def _payloads(self, factory: "UpdateFactory", user_ids: List[int]) -> List[tuple]:
+        payloads = []
+        for _ in range(self.updates):
+            route = self._pick_route()
+            payloads.append((route, factory.build(self.random.choice(user_ids), route)))
+        return payloads
+
+    async def run(self) -> Dict:
+        """Run the whole scenario and return the report"""
+        application, factory, user_ids = await self._setup()
+        try:
+            payloads = self._payloads(factory, user_ids)
+
+            from loop_monitor import LoopMonitor
+            monitor = LoopMonitor(threshold=self.block_threshold, interval=self.lag_interval)
+            monitor.start()
+            stop = asyncio.Event()
+            sampler = asyncio.create_task(self._sample_loop_lag(stop))
+            started = time.perf_counter()
+            await self._replay(application, payloads)
+            elapsed = time.perf_counter() - started
+            stop.set()
+            await sampler
+            await monitor.stop()
+            self.blocking_sites = monitor.top_sites(5)
+        finally:
+            await self._teardown(application)
+
+        return self.report(elapsed)
+
+    async def soak(self, duration: float, rss_budget_mb: float) -> Dict:
+        """Replay rounds of updates for ``duration`` seconds and check RSS growth
+
+        RSS is baselined after the first round so that import and warm-up
+        allocations are not counted; the run fails if it then grows by more
+        than ``rss_budget_mb``.
+        """
+        import gc
+        from memory_diagnostics import memory_diagnostics, rss_bytes
+
+        application, factory, user_ids = await self._setup()
+        samples = []
+        try:
+            started = time.perf_counter()
+            baseline = None
+            rounds = 0
+            while rounds == 0 or time.perf_counter() - started < duration:
+                await self._replay(application, self._payloads(factory, user_ids))
+                self._fund(user_ids)
+                self.latencies.clear()
+                self._current_route.clear()
+                gc.collect()
+                rss = rss_bytes()
+                rounds += 1
+                if baseline is None:
+                    baseline = rss
+                samples.append({
+                    "round": rounds,
+                    "elapsed_s": round(time.perf_counter() - started, 1),
+                    "rss_mb": round(rss / 2**20, 1)
+                })
+                logger.info(f"Soak round {rounds}: RSS {rss / 2**20:.1f} MiB")
+            containers = memory_diagnostics.containers(application)
+        finally:
+            await self._teardown(application)
+
+        growth = (rss - baseline) / 2**20
+        return {
+            "rounds": rounds,
+            "updates_per_round": self.updates,
+            "elapsed_s": round(time.perf_counter() - started, 1),
+            "rss_baseline_mb": round(baseline / 2**20, 1),
+            "rss_final_mb": round(rss / 2**20, 1),
+            "rss_growth_mb": round(growth, 1),
+            "rss_budget_mb": rss_budget_mb,
+            "passed": growth <= rss_budget_mb,
+            "errors": dict(self.errors),
+            "containers": containers,
+            "samples": samples
+        }
+
+    def report(self, elapsed: float) -> Dict:
+        """Summarize latency, throughput and loop lag"""
+        handlers = {}
+        for route, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            handlers[route] = {
+                "count": len(samples),
+                "errors": self.errors.get(route, 0),
+                "p50_ms": round(percentile(samples, 50) * 1000, 2),
+                "p95_ms": round(percentile(samples, 95) * 1000, 2),
+                "p99_ms": round(percentile(samples, 99) * 1000, 2),
+                "max_ms": round(samples[-1] * 1000, 2) if samples else 0.0
+            }
+
+        lag = sorted(self.loop_lag)
+        total = sum(h["count"] for h in handlers.values())
+        return {
+            "users": self.users,
+            "updates": total,
+            "concurrency": self.concurrency,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_per_s": round(total / elapsed, 1) if elapsed else 0.0,
+            "handlers": handlers,
+            "loop_lag_ms": {
+                "p50": round(percentile(lag, 50) * 1000, 2),
+                "p99": round(percentile(lag, 99) * 1000, 2),
+                "max": round(lag[-1] * 1000, 2) if lag else 0.0
+            },
+            "blocking_sites": [
+                {
+                    "site": site.site,
+                    "blocked_in": site.leaf,
+                    "count": site.count,
+                    "total_ms": round(site.total * 1000, 1),
+                    "max_ms": round(site.max * 1000, 1)
+                }
+                for site in self.blocking_sites
+            ],
+            "bot_api_calls": dict(self.api.calls),
+            "provider_requests": dict(self.providers.requests)
+        }
+
+def format_report(report: Dict) -> str:
+    """Render the report as a plain-text table"""
+    lines = [
+        "📊 Load Test Report",
+        f"Users: {report['users']}  Updates: {report['updates']}  Concurrency: {report['concurrency']}",
+        f"Elapsed: {report['elapsed_s']}s  Throughput: {report['throughput_per_s']} updates/s",
+        "",
+        f"{'handler':<20}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    ]
+    for route, h in report["handlers"].items():
+        lines.append(
+            f"{route:<20}{h['count']:>8}{h['errors']:>8}{h['p50_ms']:>10}{h['p95_ms']:>10}{h['p99_ms']:>10}{h['max_ms']:>10}"
+        )
+    lag = report["loop_lag_ms"]
+    lines += ["", f"Event loop lag: p50 {lag['p50']} ms  p99 {lag['p99']} ms  max {lag['max']} ms"]
+    if report.get("blocking_sites"):
+        lines += ["", "Top blocking call sites:"]
+        for site in report["blocking_sites"]:
+            lines.append(f"  {site['total_ms']:>9} ms {site['count']:>5}x  {site['site']}  ({site['blocked_in']})")
+    return "\n".join(lines)
+
+def format_soak_report(report: Dict) -> str:
+    """Render a soak run as plain text"""
+    lines = [
+        "🧪 Soak Test Report",
+        f"Rounds: {report['rounds']} x {report['updates_per_round']} updates in {report['elapsed_s']}s",
+        f"RSS: {report['rss_baseline_mb']} MiB -> {report['rss_final_mb']} MiB "
+        f"(growth {report['rss_growth_mb']} MiB, budget {report['rss_budget_mb']} MiB)",
+        "",
+        "Long-lived containers:"
+    ]
+    for name, size in report["containers"].items():
+        lines.append(f"  {name}: {size['keys']} keys, {size['items']} items, ~{size['bytes']} bytes")
+    lines += ["", "✅ PASSED" if report["passed"] else "❌ FAILED: RSS growth over budget"]
+    return "\n".join(lines)
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Offline end-to-end load test for SSHVPNBot")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--credits", type=int, default=50, help="Coins granted to each synthetic user")
+    parser.add_argument("--mix", type=parse_mix, default=None, help="e.g. 'gen_ssh=0.5,service_*=0.5'")
+    parser.add_argument("--provider-latency", type=float, default=0.05)
+    parser.add_argument("--provider-jitter", type=float, default=0.02)
+    parser.add_argument("--provider-failure-rate", type=float, default=0.05)
+    parser.add_argument("--api-latency", type=float, default=0.0, help="Fake Bot API response delay")
+    parser.add_argument("--block-threshold", type=float, default=0.05,
+                        help="Loop stall (s) that captures a blocking stack")
+    parser.add_argument("--trace-file", default=None, help="Trace every update into this JSONL file")
+    parser.add_argument("--soak-hours", type=float, default=0.0,
+                        help="Repeat rounds of --updates for this long and check RSS growth")
+    parser.add_argument("--rss-budget-mb", type=float, default=50.0, help="Allowed RSS growth in soak mode")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Keep bot INFO logs")
+    args = parser.parse_args()
+
+    harness = LoadHarness(
+        users=args.users, updates=args.updates, concurrency=args.concurrency,
+        mix=args.mix, credits=args.credits, provider_latency=args.provider_latency,
+        provider_jitter=args.provider_jitter, provider_failure_rate=args.provider_failure_rate,
+        api_latency=args.api_latency, block_threshold=args.block_threshold,
+        trace_file=args.trace_file, seed=args.seed
+    )
+
+    if not args.verbose:
+        logging.disable(logging.ERROR)
+
+    if args.soak_hours > 0:
+        report = asyncio.run(harness.soak(args.soak_hours * 3600, args.rss_budget_mb))
+        print(json.dumps(report, indent=2) if args.json else format_soak_report(report))
+        sys.exit(0 if report["passed"] else 1)
+
+    report = asyncio.run(harness.run())
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from metrics import LOOP_BLOCKED_SECONDS, LOOP_BLOCKS, LOOP_LAG, LOOP_LAG_LAST
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Tooling modules never reported as call sites (the code calling into them is)
+SKIPPED_MODULES = ("loop_monitor.py", "emulator.py", "tracing.py", "metrics.py")
+
+class BlockingSite:
+    """Aggregated blocking events for one call site"""
+
+    __slots__ = ("site", "leaf", "stack", "count", "total", "max")
+
+    def __init__(self, site: str, leaf: str, stack: List[str]):
+        self.site = site
+        self.leaf = leaf
+        self.stack = stack
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, blocked: float):
+        self.count += 1
+        self.total += blocked
+        self.max = max(self.max, blocked)
+
+class LoopMonitor:
+    """Watchdog measuring event loop lag and capturing what blocks it
+
+    A heartbeat task sleeps ``interval`` seconds and measures how late it
+    wakes up. A monitor thread notices when the heartbeat is overdue by more
+    than ``threshold`` and captures the loop thread's stack while the blocking
+    code is still running. Blocks are aggregated per call site: the innermost
+    frames from this project that led to the blocking call.
+    """
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05):
+        self.threshold = threshold
+        self.interval = interval
+        self.sites: Dict[str, BlockingSite] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._task = None
+        self._thread = None
+        self._loop_thread = None
+        self._last_beat = 0.0
+        self._beat = 0
+        self._pending = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start monitoring the running event loop"""
+        if self.running:
+            return
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._thread.start()
+        logger.info(f"Event loop monitor started (threshold {self.threshold * 1000:.0f} ms)")
+
+    async def stop(self):
+        """Stop the heartbeat and the monitor thread"""
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+    async def _heartbeat(self):
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag = max(0.0, now - before - self.interval)
+            beat = self._beat
+            self._beat += 1
+            self._last_beat = now
+            LOOP_LAG.observe(lag)
+            LOOP_LAG_LAST.set(lag)
+            if lag >= self.threshold:
+                self._record_block(beat, lag)
+
+    def _watch(self):
+        """Monitor thread: capture the loop stack while it is blocked"""
+        poll = max(self.threshold / 4, 0.005)
+        while not self._stop.wait(poll):
+            overdue = time.perf_counter() - self._last_beat - self.interval
+            if overdue < self.threshold or self._pending is not None:
+                continue
+            beat = self._beat
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                self._pending = (beat, self._describe(frame))
+
+    @staticmethod
+    def _describe(frame) -> tuple:
+        """(site, leaf, short stack) for the frame the loop is stuck in"""
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append((code.co_filename, frame.f_lineno, code.co_name))
+            frame = frame.f_back
+
+        def label(entry):
+            return f"{os.path.basename(entry[0])}:{entry[1]} {entry[2]}"
+
+        leaf = label(frames[0])
+        # Innermost two project frames: the blocking call and the code that made it
+        own = [
+            label(entry) for entry in frames
+            if entry[0].startswith(PROJECT_DIR) and os.path.basename(entry[0]) not in SKIPPED_MODULES
+        ][:2]
+        site = " ← ".join(own) if own else leaf
+        stack = [label(entry) for entry in frames[:8]]
+        return site, leaf, stack
+
+    def _record_block(self, beat: int, blocked: float):
+        pending, self._pending = self._pending, None
+        if pending is not None and pending[0] == beat:
+            site, leaf, stack = pending[1]
+        else:
+            # Block ended before the monitor thread could look
+            site, leaf, stack = "<not captured>", "", []
+
+        with self._lock:
+            entry = self.sites.get(site)
+            if entry is None:
+                entry = self.sites[site] = BlockingSite(site, leaf, stack)
+            entry.add(blocked)
+        LOOP_BLOCKS.labels(site).inc()
+        LOOP_BLOCKED_SECONDS.labels(site).inc(blocked)
+        logger.warning(f"Event loop blocked for {blocked * 1000:.0f} ms at {site}")
+
+    def top_sites(self, limit: int = 10) -> List[BlockingSite]:
+        """Call sites ordered by total blocked time"""
+        with self._lock:
+            return sorted(self.sites.values(), key=lambda s: s.total, reverse=True)[:limit]
+
+    def summary(self, limit: int = 5) -> str:
+        """Admin summary of the worst blocking call sites"""
+        sites = self.top_sites(limit)
+        if not sites:
+            return "No blocking above the threshold recorded yet."
+        lines = []
+        for index, site in enumerate(sites, 1):
+            lines.append(
+                f"{index}. {site.site}\n"
+                f"   {site.count}× • total {site.total:.2f}s • max {site.max * 1000:.0f} ms"
+            )
+            if site.leaf and site.leaf != site.site:
+                lines.append(f"   blocked in {site.leaf}")
+        return "\n".join(lines)
+
+    def reset(self):
+        """Forget aggregated sites"""
+        with self._lock:
+            self.sites.clear()
+
+# Global monitor instance
+loop_monitor = LoopMonitor()
@@ -0,0 +1,43 @@
+import re
+from typing import AsyncIterable, Iterable, Optional
+
+class StreamMatcher:
+    """Finds the first of several words in a body that arrives in chunks
+
+    Matching is case-insensitive (ASCII) and every chunk is scanned once by
+    a single compiled alternation of all words, longest first. The last
+    ``len(longest) - 1`` bytes of a chunk are carried into the next scan, so
+    a word split across two chunks is still found while memory stays bounded
+    by the chunk size whatever the body length.
+    """
+
+    def __init__(self, words: Iterable[str]):
+        encoded = sorted({word.lower().encode() for word in words if word}, key=len, reverse=True)
+        if not encoded:
+            raise ValueError("StreamMatcher needs at least one word")
+        self._pattern = re.compile(b"|".join(re.escape(word) for word in encoded))
+        self._carry = len(encoded[0]) - 1
+        self._tail = b""
+        self.bytes_read = 0
+        self.match: Optional[str] = None
+
+    def feed(self, chunk: bytes) -> Optional[str]:
+        """Scan the next chunk; returns the matched word once one is found"""
+        if self.match is not None:
+            return self.match
+        self.bytes_read += len(chunk)
+        data = self._tail + chunk.lower()
+        found = self._pattern.search(data)
+        if found is not None:
+            self.match = found.group(0).decode()
+            return self.match
+        self._tail = data[-self._carry:] if self._carry else b""
+        return None
+
+    async def scan(self, chunks: AsyncIterable[bytes], max_bytes: int) -> Optional[str]:
+        """Feed ``chunks`` until a word matches or ``max_bytes`` have been read"""
+        async for chunk in chunks:
+            remaining = max_bytes - self.bytes_read
+            if self.feed(chunk[:remaining]) is not None or len(chunk) >= remaining:
+                break
+        return self.match
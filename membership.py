@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from telegram.error import BadRequest, TelegramError
+
+from budget import ApiBudget
+from config import BOT_API_BUDGET, CHANNELS, MEMBERSHIP_CONFIG
+from metrics import CacheMetrics, MEMBERSHIP_CHECKS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ChatMember statuses that count as joined ("restricted" only while is_member)
+MEMBER_STATUSES = ("creator", "administrator", "member")
+# get_chat_member errors about the user, not the channel ("chat not found" means a
+# wrong channel id or the bot was removed, and must not count as "not joined")
+USER_NOT_MEMBER_ERRORS = ("user not found", "participant_id_invalid")
+
+class MembershipResult:
+    """Per-channel membership: True, False, or None when it could not be checked"""
+
+    __slots__ = ("statuses",)
+
+    def __init__(self, statuses: Dict[int, Optional[bool]]):
+        self.statuses = statuses
+
+    @property
+    def joined(self) -> bool:
+        return all(status is True for status in self.statuses.values())
+
+    @property
+    def missing(self) -> List[int]:
+        return [channel_id for channel_id, status in self.statuses.items() if status is False]
+
+    @property
+    def unknown(self) -> List[int]:
+        return [channel_id for channel_id, status in self.statuses.items() if status is None]
+
+class MembershipVerifier:
+    """Checks sponsor channel membership with get_chat_member
+
+    All channels are queried concurrently and the check gives up after
+    ``deadline`` seconds (unanswered channels are reported as unknown).
+    Results are cached per (user, channel): members for ``ttl`` seconds,
+    non-members for ``negative_ttl`` so a user who just joined can retry.
+    Concurrent verifications for the same user share one in-flight check.
+    """
+
+    def __init__(self, channels: List[Dict], budget: ApiBudget, ttl: float = 600.0,
+                 negative_ttl: float = 30.0, deadline: float = 5.0, cache_size: int = 10000):
+        self.channels = channels
+        self.budget = budget
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.deadline = deadline
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._inflight: Dict[int, asyncio.Task] = {}
+        self._metrics = CacheMetrics("membership")
+
+    async def verify(self, bot, user_id: int, caller: str = "membership") -> MembershipResult:
+        """Membership of ``user_id`` in every channel"""
+        task = self._inflight.get(user_id)
+        if task is None:
+            task = asyncio.ensure_future(self._verify(bot, user_id, caller))
+            self._inflight[user_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+        # Shielded so one caller giving up does not cancel the check for the others
+        return await asyncio.shield(task)
+
+    async def _verify(self, bot, user_id: int, caller: str) -> MembershipResult:
+        statuses: Dict[int, Optional[bool]] = {}
+        pending = {}
+        for channel in self.channels:
+            cached = self.cached(user_id, channel["id"])
+            if cached is not None:
+                statuses[channel["id"]] = cached
+            else:
+                pending[channel["id"]] = asyncio.ensure_future(self.check(bot, channel["id"], user_id, caller))
+
+        if pending:
+            done, not_done = await asyncio.wait(pending.values(), timeout=self.deadline)
+            for task in not_done:
+                task.cancel()
+                MEMBERSHIP_CHECKS.labels("timeout").inc()
+            for channel_id, task in pending.items():
+                if task in done and task.exception() is not None:
+                    logger.error(f"Membership check for {user_id} in {channel_id} failed: {task.exception()}")
+                statuses[channel_id] = task.result() if task in done and task.exception() is None else None
+        return MembershipResult({channel["id"]: statuses[channel["id"]] for channel in self.channels})
+
+    async def check(self, bot, channel_id: int, user_id: int, caller: str = "membership",
+                    background: bool = False) -> Optional[bool]:
+        """One get_chat_member call; caches and returns the result (None on error)
+
+        Background checks wait for budget; interactive ones are only charged.
+        """
+        if background:
+            await self.budget.acquire(caller)
+        else:
+            self.budget.charge(caller)
+        try:
+            with self.budget.prepaid():
+                member = await bot.get_chat_member(chat_id=channel_id, user_id=user_id)
+        except BadRequest as e:
+            if any(error in str(e).lower() for error in USER_NOT_MEMBER_ERRORS):
+                MEMBERSHIP_CHECKS.labels("not_member").inc()
+                self.store(user_id, channel_id, False)
+                return False
+            MEMBERSHIP_CHECKS.labels("error").inc()
+            logger.warning(f"get_chat_member({channel_id}, {user_id}) failed: {e}")
+            return None
+        except TelegramError as e:
+            MEMBERSHIP_CHECKS.labels("error").inc()
+            logger.warning(f"get_chat_member({channel_id}, {user_id}) failed: {e}")
+            return None
+
+        is_member = member.status in MEMBER_STATUSES or (
+            member.status == "restricted" and getattr(member, "is_member", False)
+        )
+        MEMBERSHIP_CHECKS.labels("member" if is_member else "not_member").inc()
+        self.store(user_id, channel_id, is_member)
+        return is_member
+
+    def cached(self, user_id: int, channel_id: int) -> Optional[bool]:
+        """Unexpired cached membership, or None"""
+        entry = self._cache.get((user_id, channel_id))
+        if entry is not None and entry[0] > time.monotonic():
+            self._cache.move_to_end((user_id, channel_id))
+            self._metrics.hit()
+            return entry[1]
+        self._metrics.miss()
+        return None
+
+    def store(self, user_id: int, channel_id: int, is_member: bool):
+        ttl = self.ttl if is_member else self.negative_ttl
+        self._cache[(user_id, channel_id)] = (time.monotonic() + ttl, is_member)
+        self._cache.move_to_end((user_id, channel_id))
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        """Forget cached results for a user"""
+        for channel in self.channels:
+            self._cache.pop((user_id, channel["id"]), None)
+
+# Global budget and verifier instances
+api_budget = ApiBudget(BOT_API_BUDGET["rate"], BOT_API_BUDGET["burst"], BOT_API_BUDGET["reserve"])
+membership_verifier = MembershipVerifier(
+    CHANNELS, api_budget,
+    ttl=MEMBERSHIP_CONFIG["ttl"], negative_ttl=MEMBERSHIP_CONFIG["negative_ttl"],
+    deadline=MEMBERSHIP_CONFIG["deadline"], cache_size=MEMBERSHIP_CONFIG["cache_size"]
+)
@@ -0,0 +1,176 @@
+import logging
+import os
+import sys
+import tracemalloc
+from typing import Dict, List, Optional
+
+from metrics import CONTAINER_ITEMS, PROCESS_RSS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bot modules whose allocations are reported separately
+TRACKED_MODULES = ("generator", "qrgen", "utils", "db")
+
+def rss_bytes() -> int:
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Not Linux: fall back to the peak RSS (kilobytes on Linux/BSD, bytes on macOS)
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def deep_sizeof(obj) -> int:
+    """Approximate bytes held by a container and everything it references"""
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(item, "__dict__"):
+            stack.append(vars(item))
+    return total
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+class MemoryDiagnostics:
+    """On-demand tracemalloc snapshots and sizes of long-lived containers
+
+    Tracing is off until ``start()`` because tracemalloc slows every
+    allocation; the first snapshot becomes the baseline that later diffs
+    are compared against.
+    """
+
+    def __init__(self, frames: int = 25):
+        self.frames = frames
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        """Start tracemalloc and record the baseline snapshot"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            logger.info(f"tracemalloc started ({self.frames} frames)")
+        self.baseline = self.snapshot()
+
+    def stop(self):
+        """Stop tracemalloc and drop the baseline"""
+        tracemalloc.stop()
+        self.baseline = None
+
+    def snapshot(self) -> tracemalloc.Snapshot:
+        """Snapshot without tracemalloc's own and import machinery allocations"""
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>")
+        ))
+
+    def diff(self, snapshot: tracemalloc.Snapshot, limit: int = 10) -> List[tuple]:
+        """Allocation sites that grew the most since the baseline
+
+        Returns (site, size diff, size, count diff) tuples.
+        """
+        stats = snapshot.compare_to(self.baseline, "lineno")
+        sites = []
+        for stat in stats[:limit]:
+            frame = stat.traceback[-1]
+            site = f"{os.path.basename(frame.filename)}:{frame.lineno}"
+            sites.append((site, stat.size_diff, stat.size, stat.count_diff))
+        return sites
+
+    @staticmethod
+    def by_module(snapshot: tracemalloc.Snapshot) -> Dict[str, int]:
+        """Live bytes attributed to the innermost tracked bot module on each traceback"""
+        totals = {name: 0 for name in TRACKED_MODULES}
+        totals["other"] = 0
+        for stat in snapshot.statistics("traceback"):
+            owner = "other"
+            # Frames run from oldest to most recent
+            for frame in reversed(stat.traceback):
+                module = os.path.splitext(os.path.basename(frame.filename))[0]
+                if module in TRACKED_MODULES:
+                    owner = module
+                    break
+            totals[owner] += stat.size
+        return totals
+
+    @staticmethod
+    def containers(application=None) -> Dict[str, Dict]:
+        """Sizes of the long-lived structures known to grow with the user base"""
+        from utils import rate_limiter
+
+        requests = rate_limiter.requests
+        sizes = {
+            "rate_limiter.requests": {
+                "keys": len(requests),
+                "items": sum(len(timestamps) for timestamps in list(requests.values())),
+                "bytes": deep_sizeof(requests)
+            }
+        }
+
+        if application is not None:
+            configs = [data["last_config"] for data in list(application.user_data.values()) if data.get("last_config")]
+            sizes["user_data.last_config"] = {
+                "keys": len(application.user_data),
+                "items": len(configs),
+                "bytes": deep_sizeof(configs)
+            }
+        return sizes
+
+    def report(self, application=None, limit: int = 8) -> str:
+        """Plain-text report for the admin"""
+        lines = [f"RSS: {_format_bytes(rss_bytes())}", ""]
+
+        lines.append("Long-lived containers:")
+        for name, size in self.containers(application).items():
+            lines.append(f"• {name}: {size['keys']} keys, {size['items']} items, ~{_format_bytes(size['bytes'])}")
+
+        if self.tracing and self.baseline is not None:
+            snapshot = self.snapshot()
+            traced, peak = tracemalloc.get_traced_memory()
+            lines += ["", f"Traced: {_format_bytes(traced)} (peak {_format_bytes(peak)})", "", "By module:"]
+            for module, size in self.by_module(snapshot).items():
+                lines.append(f"• {module}: {_format_bytes(size)}")
+            lines += ["", "Growth since baseline:"]
+            for site, size_diff, size, count_diff in self.diff(snapshot, limit):
+                lines.append(f"• {site}: {'+' if size_diff >= 0 else ''}{_format_bytes(size_diff)} ({count_diff:+d} blocks)")
+        else:
+            lines += ["", "tracemalloc is off; start it to see allocation sites."]
+        return "\n".join(lines)
+
+def bind_metrics(application=None):
+    """Expose RSS and container sizes as scrape-time gauges"""
+    from utils import rate_limiter
+
+    PROCESS_RSS.set_function(rss_bytes)
+    CONTAINER_ITEMS.labels("rate_limiter.requests").set_function(lambda: len(rate_limiter.requests))
+    if application is not None:
+        CONTAINER_ITEMS.labels("user_data.last_config").set_function(
+            lambda: sum(1 for data in list(application.user_data.values()) if data.get("last_config"))
+        )
+
+# Global diagnostics instance
+memory_diagnostics = MemoryDiagnostics()
@@ -0,0 +1,492 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Metric children are updated without locks. Updates happen on the event loop
+# thread (or under the GIL from worker threads), and the exporter only reads,
+# so a scrape can at worst see a value that is one update behind.
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+class _GaugeChild:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        """Compute the value at scrape time instead of storing it"""
+        self.function = function
+
+    def get(self) -> float:
+        if self.function is not None:
+            try:
+                return float(self.function())
+            except Exception as e:
+                logger.error(f"Gauge callback failed: {e}")
+                return float("nan")
+        return self.value
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum", "count")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> "_Timer":
+        """Context manager observing the elapsed wall time"""
+        return _Timer(self)
+
+class _Timer:
+    __slots__ = ("child", "started")
+
+    def __init__(self, child: _HistogramChild):
+        self.child = child
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.child.observe(time.perf_counter() - self.started)
+        return False
+
+class _Metric:
+    """Base class for a metric family with an optional label set"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 registry: Optional["Registry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **kwargs):
+        """Return the child for a label set, creating it once
+
+        Bind children once (at import or setup time) and keep the reference
+        on the hot path; repeated calls are a single dict lookup.
+        """
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _label_text(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._children[()].inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{self._label_text(values)} {_format_value(child.value)}"]
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be computed at scrape time"""
+
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._children[()].set(value)
+
+    def set_function(self, function: Callable[[], float]):
+        self._children[()].set_function(function)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{self._label_text(values)} {_format_value(child.get())}"]
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS, registry: Optional["Registry"] = None):
+        self.upper_bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float):
+        self._children[()].observe(value)
+
+    def time(self):
+        return self._children[()].time()
+
+    def _render_child(self, values, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.upper_bounds, child.counts):
+            cumulative += count
+            le = 'le="%s"' % _format_value(bound)
+            lines.append(f"{self.name}_bucket{self._label_text(values, le)} {cumulative}")
+        cumulative += child.counts[-1]
+        le = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{self._label_text(values, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{self._label_text(values)} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{self._label_text(values)} {child.count}")
+        return lines
+
+class Registry:
+    """Collection of metric families rendered together"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        """Render every family in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+REGISTRY = Registry()
+
+# Handlers
+HANDLER_LATENCY = Histogram(
+    "bot_handler_latency_seconds", "Time spent handling an update",
+    ["kind", "route"]
+)
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors_total", "Updates whose handler raised",
+    ["kind", "route"]
+)
+
+# Providers
+PROVIDER_ATTEMPTS = Counter(
+    "provider_attempts_total", "Account creation attempts per provider server",
+    ["provider", "server"]
+)
+PROVIDER_SUCCESSES = Counter(
+    "provider_successes_total", "Successful account creations per provider server",
+    ["provider", "server"]
+)
+PROVIDER_LATENCY = Histogram(
+    "provider_attempt_latency_seconds", "Duration of an account creation attempt",
+    ["provider", "server"]
+)
+PROVIDER_REQUESTS = Counter(
+    "provider_requests_total", "Requests sent to provider sites under their request budget",
+    ["provider"]
+)
+PROVIDER_BUDGET_TOKENS = Gauge(
+    "provider_budget_tokens", "Requests currently available in each provider's budget",
+    ["provider"]
+)
+PROVIDER_IN_FLIGHT = Gauge(
+    "provider_creations_in_flight", "Account creations currently running per provider",
+    ["provider"]
+)
+PROVIDER_HTTP_RETRIES = Counter(
+    "provider_http_retries_total", "Provider HTTP requests retried after a transient failure",
+    ["host", "reason"]
+)
+PROVIDER_PREWARMS = Counter(
+    "provider_prewarm_total", "Connections opened ahead of time to provider hosts",
+    ["host", "result"]
+)
+PROVIDER_SCANNED_BYTES = Histogram(
+    "provider_response_scanned_bytes", "Response bytes read before a success verdict",
+    ["host", "verdict"],
+    buckets=(1024, 4096, 16384, 65536, 262144, 1048576)
+)
+ENDPOINT_PROBES = Counter(
+    "endpoint_probes_total", "TCP/TLS probes of V2Ray endpoints and SSH hosts",
+    ["kind", "result"]
+)
+ENDPOINT_PROBE_LATENCY = Histogram(
+    "endpoint_probe_latency_seconds", "Smoothed connect plus handshake time of healthy endpoints",
+    ["kind"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0, 2.0, 5.0)
+)
+REGION_SELECTIONS = Counter(
+    "region_selections_total", "Region orders computed per source of the preferred region",
+    ["source"]
+)
+DNS_LOOKUPS = Histogram(
+    "dns_lookup_seconds", "Uncached DNS lookups of provider hosts",
+    ["result"]
+)
+
+# Database
+DB_LATENCY = Histogram(
+    "db_operation_latency_seconds", "Duration of Database operations",
+    ["operation"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+# Rate limiting
+RATE_LIMIT_REJECTIONS = Counter(
+    "rate_limit_rejections_total", "Requests rejected by the rate limiter",
+    ["action"]
+)
+
+# Event loop
+LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a scheduled heartbeat",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+LOOP_LAG_LAST = Gauge("event_loop_lag_last_seconds", "Lag of the latest heartbeat")
+LOOP_BLOCKS = Counter(
+    "event_loop_blocked_total", "Times the event loop was blocked past the threshold",
+    ["site"]
+)
+LOOP_BLOCKED_SECONDS = Counter(
+    "event_loop_blocked_seconds_total", "Time the event loop spent blocked",
+    ["site"]
+)
+
+# Memory
+PROCESS_RSS = Gauge("process_resident_memory_bytes", "Resident set size of the bot process")
+CONTAINER_ITEMS = Gauge(
+    "memory_container_items", "Entries held by long-lived in-memory containers",
+    ["container"]
+)
+
+# Bot API and channel membership
+BOT_API_CALLS = Counter(
+    "bot_api_calls_total", "Bot API calls charged to the outbound budget",
+    ["caller"]
+)
+BOT_API_BUDGET_TOKENS = Gauge("bot_api_budget_tokens", "Calls currently available in the outbound budget")
+MEMBERSHIP_CHECKS = Counter(
+    "membership_checks_total", "get_chat_member results",
+    ["result"]
+)
+MEMBERSHIP_REVERIFIED = Counter(
+    "membership_reverified_total", "Users re-checked by the periodic membership job",
+    ["result"]
+)
+
+# Bulk generation
+BULK_CONFIGS = Counter(
+    "bulk_configs_total", "Configs produced by bulk generation jobs",
+    ["outcome"]
+)
+
+# Persistent user_data
+USER_DATA_LOADS = Counter("user_data_loads_total", "Users whose stored user_data was loaded on first use")
+USER_DATA_WRITES = Counter(
+    "user_data_writes_total", "Dirty user_data keys written to Mongo",
+    ["op"]
+)
+
+# Multi-process sharding
+SHARD_UPDATES = Counter(
+    "shard_updates_total", "Updates routed by the front to each worker",
+    ["worker"]
+)
+SHARD_REROUTES = Counter("shard_reroutes_total", "Updates re-routed because their worker was down")
+SHARD_WORKERS_UP = Gauge("shard_workers_up", "Workers currently on the hash ring")
+SHARD_RESTARTS = Counter(
+    "shard_worker_restarts_total", "Worker processes restarted after exiting",
+    ["worker"]
+)
+
+# Queues and caches
+QUEUE_DEPTH = Gauge(
+    "queue_depth", "Items waiting in an internal queue",
+    ["queue"]
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by result",
+    ["cache", "result"]
+)
+CACHE_HIT_RATIO = Gauge(
+    "cache_hit_ratio", "Share of cache lookups that were hits",
+    ["cache"]
+)
+
+class CacheMetrics:
+    """Pre-bound hit/miss counters and hit ratio gauge for one cache"""
+
+    __slots__ = ("hits", "misses")
+
+    def __init__(self, cache: str):
+        self.hits = CACHE_REQUESTS.labels(cache, "hit")
+        self.misses = CACHE_REQUESTS.labels(cache, "miss")
+        CACHE_HIT_RATIO.labels(cache).set_function(self.ratio)
+
+    def hit(self):
+        self.hits.inc()
+
+    def miss(self):
+        self.misses.inc()
+
+    def ratio(self) -> float:
+        total = self.hits.value + self.misses.value
+        return self.hits.value / total if total else 0.0
+
+class ProviderAttempt:
+    """Record one provider server attempt: count, latency and outcome"""
+
+    __slots__ = ("latency", "successes", "started", "finished")
+
+    def __init__(self, provider: str, server: str):
+        PROVIDER_ATTEMPTS.labels(provider, server).inc()
+        self.latency = PROVIDER_LATENCY.labels(provider, server)
+        self.successes = PROVIDER_SUCCESSES.labels(provider, server)
+        self.started = time.perf_counter()
+        self.finished = False
+
+    def success(self):
+        self.successes.inc()
+        self.finish()
+
+    def finish(self):
+        if not self.finished:
+            self.finished = True
+            self.latency.observe(time.perf_counter() - self.started)
+
+def observe_db(operation: str):
+    """Decorator timing a Database method"""
+    def decorator(func):
+        child = DB_LATENCY.labels(operation)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+def timed_handler(kind: str, route: str, callback):
+    """Wrap a PTB handler callback with latency and error metrics"""
+    latency = HANDLER_LATENCY.labels(kind, route)
+    errors = HANDLER_ERRORS.labels(kind, route)
+
+    @wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            result = callback(update, context)
+            # Plain (non-async) callbacks may return None instead of a coroutine
+            if result is not None:
+                result = await result
+            return result
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - started)
+    return wrapper
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(host: str = "127.0.0.1", port: int = 9108,
+                         registry: Optional[Registry] = None) -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread and return the server"""
+    handler = type("MetricsRequestHandler", (_MetricsRequestHandler,), {"registry": registry or REGISTRY})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    logger.info(f"Metrics endpoint listening on http://{host}:{server.server_address[1]}/metrics")
+    return server
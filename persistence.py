@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import logging
+import pickle
+from typing import Dict, Optional, Set, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from metrics import USER_DATA_LOADS, USER_DATA_WRITES
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def storable(key) -> bool:
+    """Whether a user_data key can be a top-level Mongo field"""
+    return isinstance(key, str) and key != "_id" and not key.startswith("$") and "." not in key
+
+def fingerprint(value) -> bytes:
+    """8-byte digest of a user_data value, to spot changes without keeping a copy"""
+    try:
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        data = repr(value).encode("utf-8", "replace")
+    return hashlib.blake2b(data, digest_size=8).digest()
+
+class MongoPersistence(BasePersistence):
+    """``context.user_data`` kept in Mongo, loaded lazily and written as dirty keys
+
+    Nothing is read at startup: a user's stored data is loaded once, when
+    their first update arrives (``refresh_user_data``). Every
+    ``update_interval`` seconds PTB hands over the users touched since the
+    last round; only keys whose fingerprint differs from what was last
+    loaded or written are queued, and all queued users go out in one
+    unordered bulk write. Only fingerprints are kept, not a second copy of
+    PTB's ``user_data``. A failed write is kept and retried with the next
+    round; a failed load is retried on the user's next update. Chat data,
+    bot data and conversations are not stored.
+    """
+
+    def __init__(self, database, update_interval: float = 30):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.database = database
+        self._stored: Dict[int, Dict[str, bytes]] = {}  # user_id -> key fingerprints as last loaded or written
+        self._unloaded: Set[int] = set()  # users whose load failed; retried on their next update
+        self._loading: Dict[int, asyncio.Future] = {}
+        self._pending: Dict[int, Tuple[Dict, Set[str]]] = {}  # user_id -> (changed keys, removed keys)
+        self._write_task: Optional[asyncio.Task] = None
+
+    async def get_user_data(self) -> Dict[int, Dict]:
+        # Loaded per user in refresh_user_data
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict):
+        """Fill ``user_data`` from Mongo the first time the user shows up"""
+        if user_id in self._stored and user_id not in self._unloaded:
+            return
+        loading = self._loading.get(user_id)
+        if loading is None:
+            loading = asyncio.ensure_future(asyncio.to_thread(self.database.get_user_context, user_id))
+            self._loading[user_id] = loading
+            USER_DATA_LOADS.inc()
+        stored = await loading
+        if self._loading.get(user_id) is loading:
+            self._loading.pop(user_id)
+        if stored is None:
+            # Not cached as empty: the next update tries again
+            self._unloaded.add(user_id)
+            return
+        if user_id in self._stored and user_id not in self._unloaded:
+            return
+        self._unloaded.discard(user_id)
+        self._stored[user_id] = {key: fingerprint(value) for key, value in stored.items()}
+        for key, value in stored.items():
+            user_data.setdefault(key, value)
+
+    async def update_user_data(self, user_id: int, data: Dict):
+        """Queue the keys that changed since the last load or write"""
+        stored = self._stored.get(user_id, {})
+        current = {key: fingerprint(value) for key, value in data.items() if storable(key)}
+        changed = {key: data[key] for key, digest in current.items() if stored.get(key) != digest}
+        removed = {key for key in stored if key not in current}
+        self._stored[user_id] = current
+        if changed or removed:
+            self._queue(user_id, changed, removed)
+
+    def _merge(self, user_id: int, changed: Dict, removed: Set[str]):
+        pending_changed, pending_removed = self._pending.setdefault(user_id, ({}, set()))
+        for key in removed:
+            pending_changed.pop(key, None)
+        pending_removed.difference_update(changed)
+        pending_removed.update(removed)
+        pending_changed.update(changed)
+
+    def _queue(self, user_id: int, changed: Dict, removed: Set[str]):
+        self._merge(user_id, changed, removed)
+        if self._write_task is None or self._write_task.done():
+            # update_persistence runs one update_user_data per touched user;
+            # this task runs after all of them have queued their keys
+            self._write_task = asyncio.get_running_loop().create_task(self._write())
+
+    async def _write(self):
+        while self._pending:
+            batch, self._pending = self._pending, {}
+            if not await asyncio.to_thread(self.database.write_user_contexts, batch):
+                # Keep the batch for the next round, with anything queued meanwhile on top
+                newer, self._pending = self._pending, batch
+                for user_id, (changed, removed) in newer.items():
+                    self._merge(user_id, changed, removed)
+                logger.warning(f"user_data write failed; {len(self._pending)} users kept for the next round")
+                return
+            for changed, removed in batch.values():
+                USER_DATA_WRITES.labels("set").inc(len(changed))
+                USER_DATA_WRITES.labels("unset").inc(len(removed))
+
+    async def drop_user_data(self, user_id: int):
+        self._stored.pop(user_id, None)
+        self._unloaded.discard(user_id)
+        self._pending.pop(user_id, None)
+        await asyncio.to_thread(self.database.drop_user_context, user_id)
+
+    async def flush(self):
+        """Write everything still queued (called by PTB on shutdown)"""
+        if self._write_task is not None:
+            await self._write_task
+        if self._pending:
+            await self._write()
+
+    # Only user_data is stored
+    async def get_chat_data(self) -> Dict:
+        return {}
+
+    async def get_bot_data(self) -> Dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> Dict:
+        return {}
+
+    async def update_conversation(self, name: str, key, new_state):
+        pass
+
+    async def update_chat_data(self, chat_id: int, data: Dict):
+        pass
+
+    async def update_bot_data(self, data: Dict):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict):
+        pass
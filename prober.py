@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import ssl
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import PROBER_CONFIG
+from dns_cache import DNSCache
+from metrics import ENDPOINT_PROBE_LATENCY, ENDPOINT_PROBES
+from provider_http import create_ssl_context, provider_http
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+Endpoint = Tuple[str, int]
+
+class EndpointHealth:
+    """Live state of one probed endpoint"""
+
+    __slots__ = ("kind", "tls", "rtt", "handshake", "failures", "checked", "error")
+
+    def __init__(self, kind: str, tls: bool):
+        self.kind = kind
+        self.tls = tls
+        self.rtt: Optional[float] = None  # Smoothed TCP connect time
+        self.handshake: Optional[float] = None  # Smoothed TLS handshake time
+        self.failures = 0  # Consecutive failed probes
+        self.checked: Optional[float] = None
+        self.error: Optional[str] = None
+
+    @property
+    def latency(self) -> Optional[float]:
+        """Connect plus handshake time, what a client pays before its first byte"""
+        if self.rtt is None:
+            return None
+        return self.rtt + (self.handshake or 0.0)
+
+class EndpointProber:
+    """Background TCP/TLS prober for the endpoints handed out to users
+
+    Every ``interval`` seconds each registered endpoint is probed, with at
+    most ``concurrency`` probes in flight: a TCP connect, then a TLS
+    handshake for TLS endpoints, or a read of the ``SSH-`` banner for SSH
+    hosts. Connect and handshake times are smoothed with an EWMA (``alpha``)
+    and an endpoint counts as down after ``unhealthy_after`` failures in a
+    row. ``rank`` orders endpoints healthy-and-fastest first; endpoints not
+    probed yet keep their given order between healthy and down ones.
+    """
+
+    def __init__(self, interval: float = 60.0, concurrency: int = 32, connect_timeout: float = 3.0,
+                 handshake_timeout: float = 5.0, alpha: float = 0.3, unhealthy_after: int = 2,
+                 resolver: Optional[DNSCache] = None):
+        self.interval = interval
+        self.concurrency = concurrency
+        self.connect_timeout = connect_timeout
+        self.handshake_timeout = handshake_timeout
+        self.alpha = alpha
+        self.unhealthy_after = unhealthy_after
+        self.resolver = resolver
+        self.endpoints: Dict[Endpoint, EndpointHealth] = {}
+        self._ssl_context: Optional[ssl.SSLContext] = None
+        self._task = None
+
+    @property
+    def ssl_context(self) -> ssl.SSLContext:
+        # Only the handshake time matters; fronting domains rarely match their certificates
+        if self._ssl_context is None:
+            self._ssl_context = create_ssl_context(verify=False)
+        return self._ssl_context
+
+    def add(self, host: str, port: int, kind: str = "tcp", tls: bool = False):
+        """Register an endpoint to probe ("v2ray", "ssh" or plain "tcp")"""
+        key = (host, int(port))
+        if key not in self.endpoints:
+            self.endpoints[key] = EndpointHealth(kind, tls)
+
+    def health(self, host: str, port: int) -> Optional[EndpointHealth]:
+        return self.endpoints.get((host, int(port)))
+
+    def is_healthy(self, host: str, port: int) -> Optional[bool]:
+        """True/False once probed, None while unknown"""
+        health = self.health(host, port)
+        if health is None or health.checked is None:
+            return None
+        if health.failures >= self.unhealthy_after:
+            return False
+        # A single failure before any success is not a verdict yet
+        return True if health.rtt is not None else None
+
+    def rank(self, items: List, key=lambda item: item) -> List:
+        """``items`` sorted by live health and latency; ``key`` maps an item to (host, port)"""
+        def order(indexed):
+            index, item = indexed
+            host, port = key(item)
+            healthy = self.is_healthy(host, port)
+            if healthy is None:
+                return (1, 0.0, index)
+            if not healthy:
+                return (2, 0.0, index)
+            return (0, self.health(host, port).latency, index)
+
+        return [item for _, item in sorted(enumerate(items), key=order)]
+
+    async def probe(self, host: str, port: int) -> bool:
+        """Probe one registered endpoint now and record the outcome"""
+        health = self.endpoints[(host, int(port))]
+        started = time.perf_counter()
+        writer = None
+        try:
+            address = (await self.resolver.resolve(host))[0] if self.resolver is not None else host
+            async with asyncio.timeout(self.connect_timeout):
+                reader, writer = await asyncio.open_connection(address, port)
+            rtt = time.perf_counter() - started
+            handshake = None
+            async with asyncio.timeout(self.handshake_timeout):
+                if health.tls:
+                    await writer.start_tls(self.ssl_context, server_hostname=host)
+                    handshake = time.perf_counter() - started - rtt
+                elif health.kind == "ssh":
+                    banner = await reader.readline()
+                    if not banner.startswith(b"SSH-"):
+                        raise ConnectionError(f"unexpected banner {banner[:32]!r}")
+        except (OSError, asyncio.TimeoutError) as e:
+            health.failures += 1
+            health.checked = time.monotonic()
+            health.error = str(e) or type(e).__name__
+            ENDPOINT_PROBES.labels(health.kind, "error").inc()
+            return False
+        finally:
+            if writer is not None:
+                writer.close()
+
+        health.rtt = self._smooth(health.rtt, rtt)
+        if handshake is not None:
+            health.handshake = self._smooth(health.handshake, handshake)
+        health.failures = 0
+        health.checked = time.monotonic()
+        health.error = None
+        ENDPOINT_PROBES.labels(health.kind, "ok").inc()
+        ENDPOINT_PROBE_LATENCY.labels(health.kind).observe(health.latency)
+        return True
+
+    def _smooth(self, previous: Optional[float], sample: float) -> float:
+        return sample if previous is None else previous + self.alpha * (sample - previous)
+
+    async def probe_all(self, endpoints: Iterable[Endpoint] = None) -> Dict[Endpoint, bool]:
+        """Probe every (or the given) endpoint, ``concurrency`` at a time"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        targets = list(endpoints if endpoints is not None else self.endpoints)
+
+        async def one(endpoint):
+            async with semaphore:
+                return await self.probe(*endpoint)
+
+        results = await asyncio.gather(*(one(endpoint) for endpoint in targets))
+        return dict(zip(targets, results))
+
+    def start(self):
+        """Probe now and then every ``interval`` seconds"""
+        if self._task is not None and not self._task.done():
+            return
+
+        async def loop():
+            while True:
+                try:
+                    results = await self.probe_all()
+                    logger.info(f"Probed {len(results)} endpoints, {sum(results.values())} up")
+                except Exception as e:
+                    logger.error(f"Endpoint probing failed: {e}")
+                await asyncio.sleep(self.interval)
+
+        self._task = asyncio.get_running_loop().create_task(loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# Global endpoint prober instance
+prober = EndpointProber(
+    interval=PROBER_CONFIG["interval"], concurrency=PROBER_CONFIG["concurrency"],
+    connect_timeout=PROBER_CONFIG["connect_timeout"], handshake_timeout=PROBER_CONFIG["handshake_timeout"],
+    alpha=PROBER_CONFIG["alpha"], unhealthy_after=PROBER_CONFIG["unhealthy_after"],
+    resolver=provider_http.resolver
+)
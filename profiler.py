@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _frame_label(code) -> str:
+    """Stable label for a code object (no ';', which separates collapsed frames)"""
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+def _thread_stack(frame) -> List[str]:
+    """Root-first labels of a thread's Python stack"""
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+def _await_stack(coro) -> List[str]:
+    """Root-first labels of a task's await chain, ending at what it waits on"""
+    stack = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            # Leaf awaitable (Future, Event waiter, ...)
+            stack.append(f"<{type(coro).__name__}>")
+            break
+        stack.append(_frame_label(frame.f_code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return stack
+
+class ProfileResult:
+    """Collapsed stacks collected by one profiling run"""
+
+    def __init__(self, stacks: Counter, samples: int, duration: float, interval: float):
+        self.stacks = stacks
+        self.samples = samples
+        self.duration = duration
+        self.interval = interval
+
+    def collapsed(self) -> str:
+        """Brendan Gregg collapsed-stack format (flamegraph.pl, speedscope)"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_frames(self, limit: int = 10, prefix: str = "thread") -> List[tuple]:
+        """Leaf frames with the most samples under a root prefix"""
+        leaves = Counter()
+        total = 0
+        for stack, count in self.stacks.items():
+            if not stack.startswith(prefix):
+                continue
+            # Report the innermost code frame rather than the Future it waits on
+            frames = [frame for frame in stack.split(";")[1:] if not frame.startswith("<")]
+            leaves[frames[-1] if frames else stack] += count
+            total += count
+        return [(frame, count, count * 100.0 / total) for frame, count in leaves.most_common(limit)] if total else []
+
+    def summary(self, limit: int = 8) -> str:
+        """Short text summary for the admin"""
+        lines = [
+            f"Samples: {self.samples} over {self.duration:.1f}s (every {self.interval * 1000:.0f} ms)",
+            "",
+            "Top frames on the event loop thread:"
+        ]
+        for frame, count, share in self.top_frames(limit, "thread"):
+            lines.append(f"• {share:.1f}% {frame}")
+        awaiting = self.top_frames(limit, "task")
+        if awaiting:
+            lines += ["", "Top awaits across tasks:"]
+            for frame, count, share in awaiting:
+                lines.append(f"• {share:.1f}% {frame}")
+        return "\n".join(lines)
+
+class SamplingProfiler:
+    """Wall-clock statistical profiler for the event loop thread and its tasks
+
+    A daemon thread wakes every ``interval`` seconds and records:
+    - the loop thread's Python stack (CPU work and blocking calls), and
+    - the await chain of every pending asyncio task, so time spent awaiting
+      Mongo, providers or the Bot API is attributed to the awaiting code.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def _sample(self, loop, thread_id: int, own_task, stop: threading.Event, stacks: Counter) -> int:
+        samples = 0
+        while not stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                stacks[";".join(["thread"] + _thread_stack(frame))] += 1
+            try:
+                tasks = asyncio.all_tasks(loop)
+            except RuntimeError:
+                tasks = set()
+            for task in tasks:
+                if task is own_task or task.done():
+                    continue
+                stack = _await_stack(task.get_coro())
+                if stack:
+                    stacks[";".join(["task"] + stack)] += 1
+            samples += 1
+        return samples
+
+    async def profile(self, seconds: float) -> ProfileResult:
+        """Sample the running loop for ``seconds`` and return the result"""
+        with self._lock:
+            if self._running:
+                raise RuntimeError("A profiling run is already in progress")
+            self._running = True
+
+        loop = asyncio.get_running_loop()
+        stop = threading.Event()
+        stacks = Counter()
+        outcome: Dict[str, int] = {}
+
+        def run():
+            outcome["samples"] = self._sample(loop, loop_thread, own_task, stop, stacks)
+
+        loop_thread = threading.get_ident()
+        own_task = asyncio.current_task()
+        sampler = threading.Thread(target=run, name="sampling-profiler", daemon=True)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            stop.set()
+            await asyncio.to_thread(sampler.join)
+            self._running = False
+
+        duration = time.perf_counter() - started
+        logger.info(f"Profiling finished: {outcome.get('samples', 0)} samples in {duration:.1f}s")
+        return ProfileResult(stacks, outcome.get("samples", 0), duration, self.interval)
+
+# Global profiler instance
+profiler = SamplingProfiler()
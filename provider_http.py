@@ -0,0 +1,301 @@
+import asyncio
+import contextlib
+import importlib.util
+import logging
+import socket
+import ssl
+import time
+from typing import AsyncIterator, Dict, Iterable, Optional
+
+import certifi
+import httpcore
+import httpx
+
+from config import DNS_CONFIG, HTTP_CONFIG
+from dns_cache import DNSCache, ResolvingBackend
+from matcher import StreamMatcher
+from metrics import PROVIDER_HTTP_RETRIES, PROVIDER_PREWARMS, PROVIDER_SCANNED_BYTES
+from tracing import tracer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying; only 429 is retried for non-idempotent requests
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+
+def is_dns_failure(error: BaseException) -> bool:
+    """Whether a connect error came from name resolution (not worth retrying)"""
+    while error is not None:
+        if isinstance(error, socket.gaierror):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+def create_ssl_context(verify: bool = True) -> ssl.SSLContext:
+    """One TLS context shared by every provider connection"""
+    context = ssl.create_default_context(cafile=certifi.where())
+    if not verify:
+        # Some providers serve broken certificate chains
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+class ProviderHTTP:
+    """Async HTTP client for provider sites
+
+    Wraps one ``httpx.AsyncClient`` per event loop. httpx keeps a keep-alive
+    pool per origin (bounded by ``max_connections`` in total), negotiates
+    HTTP/2 when ``http2`` is set and the h2 package is installed, and all
+    connections share one SSL context. Timeouts are split into connect, read,
+    write and pool-wait, and ``total_timeout`` bounds a whole request
+    including retries. Connection failures other than DNS lookups are retried
+    for every method (nothing was sent); other transport errors and 5xx responses only for
+    idempotent methods, with ``backoff_factor * 2 ** n`` seconds between tries.
+    ``find`` streams a response body looking for words and reads at most
+    ``max_scan_bytes`` of it.
+
+    With a ``resolver`` the pool connects through that DNS cache, and
+    ``prewarm`` opens a connection to every provider origin that has no idle
+    one, so the first request after a quiet period skips DNS and handshakes.
+    """
+
+    def __init__(self, connect_timeout: float = 5.0, read_timeout: float = 15.0,
+                 write_timeout: float = 10.0, pool_timeout: float = 5.0, total_timeout: float = 30.0,
+                 max_retries: int = 3, backoff_factor: float = 0.3, max_connections: int = 100,
+                 max_keepalive_connections: int = 20, keepalive_expiry: float = 60.0,
+                 http2: bool = True, verify_tls: bool = True, user_agent: str = "Mozilla/5.0",
+                 max_scan_bytes: int = 262144, scan_chunk_size: int = 16384,
+                 resolver: Optional[DNSCache] = None):
+        self.timeout = httpx.Timeout(
+            connect=connect_timeout, read=read_timeout, write=write_timeout, pool=pool_timeout
+        )
+        self.total_timeout = total_timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        self.verify_tls = verify_tls
+        self.headers = {
+            "User-Agent": user_agent,
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+            "Accept-Language": "en-US,en;q=0.5",
+            "Cache-Control": "no-cache"
+        }
+        self.max_scan_bytes = max_scan_bytes
+        self.scan_chunk_size = scan_chunk_size
+        self.resolver = resolver
+        self.transport: Optional[httpx.AsyncBaseTransport] = None
+        # Origin ("https://host:port") -> last request time, for prewarming
+        self.active: Dict[str, float] = {}
+        self._ssl_context: Optional[ssl.SSLContext] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._pool: Optional[httpcore.AsyncConnectionPool] = None
+        self._loop = None
+        self._prewarm_task = None
+
+    @property
+    def ssl_context(self) -> ssl.SSLContext:
+        if self._ssl_context is None:
+            self._ssl_context = create_ssl_context(self.verify_tls)
+        return self._ssl_context
+
+    def client(self) -> httpx.AsyncClient:
+        """Client bound to the running event loop (pooled connections can't cross loops)"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers=self.headers, timeout=self.timeout, limits=self.limits, http2=self.http2,
+                verify=self.ssl_context, follow_redirects=True, transport=self.transport or self._build_transport()
+            )
+            self._loop = loop
+        return self._client
+
+    def _build_transport(self) -> httpx.AsyncHTTPTransport:
+        transport = httpx.AsyncHTTPTransport(verify=self.ssl_context, http2=self.http2, limits=self.limits)
+        if self.resolver is not None:
+            # httpx does not expose httpcore's network_backend, so rebuild its pool around the DNS cache
+            transport._pool = httpcore.AsyncConnectionPool(
+                ssl_context=self.ssl_context,
+                max_connections=self.limits.max_connections,
+                max_keepalive_connections=self.limits.max_keepalive_connections,
+                keepalive_expiry=self.limits.keepalive_expiry,
+                http2=self.http2,
+                network_backend=ResolvingBackend(self.resolver)
+            )
+        self._pool = transport._pool
+        return transport
+
+    def mount(self, transport: Optional[httpx.AsyncBaseTransport]):
+        """Send every request through ``transport`` (e.g. the offline provider emulator)"""
+        self.transport = transport
+        self._client = None
+        self._pool = None
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request with retries; raises the last error or TimeoutError"""
+        async with self.stream(method, url, **kwargs) as response:
+            await response.aread()
+        return response
+
+    @contextlib.asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """Like ``request``, but yields the response before its body is read
+
+        Retries happen before the response is yielded. ``total_timeout`` also
+        covers reading the body inside the block, and leaving the block closes
+        the response whether or not the body was read to the end.
+        """
+        method = method.upper()
+        idempotent = method in IDEMPOTENT_METHODS
+        client = self.client()
+        send_kwargs = {key: kwargs.pop(key) for key in ("auth", "follow_redirects") if key in kwargs}
+        self.active[origin_of(url)] = time.monotonic()
+        async with asyncio.timeout(self.total_timeout):
+            attempt = 0
+            while True:
+                with tracer.span(f"http.{method}", url=url) as span:
+                    try:
+                        response = await client.send(client.build_request(method, url, **kwargs),
+                                                     stream=True, **send_kwargs)
+                    except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                        if attempt >= self.max_retries or is_dns_failure(e):
+                            raise
+                        reason, delay = "connect", self.backoff(attempt)
+                    except httpx.TransportError:
+                        if not idempotent or attempt >= self.max_retries:
+                            raise
+                        reason, delay = "transport", self.backoff(attempt)
+                    else:
+                        if span is not None:
+                            span.set_attribute("status_code", response.status_code)
+                        status = response.status_code
+                        if (status not in RETRY_STATUSES or attempt >= self.max_retries
+                                or not (idempotent or status == 429)):
+                            break
+                        await response.aclose()
+                        reason, delay = str(status), self.retry_after(response, attempt)
+                PROVIDER_HTTP_RETRIES.labels(httpx.URL(url).host, reason).inc()
+                logger.info(f"Retrying {method} {url} in {delay:.2f}s ({reason})")
+                await asyncio.sleep(delay)
+                attempt += 1
+            try:
+                yield response
+            finally:
+                await response.aclose()
+
+    async def find(self, method: str, url: str, words: Iterable[str],
+                   statuses: Iterable[int] = (200,), **kwargs) -> Optional[str]:
+        """Send a request and return the first of ``words`` found in the response body
+
+        The body is streamed through a ``StreamMatcher`` and reading stops at
+        the first match or after ``max_scan_bytes``, so a large page is never
+        buffered. Returns None for other statuses or when no word appears.
+        """
+        host = httpx.URL(url).host
+        async with self.stream(method, url, **kwargs) as response:
+            if response.status_code not in statuses:
+                return None
+            matcher = StreamMatcher(words)
+            match = await matcher.scan(response.aiter_bytes(self.scan_chunk_size), self.max_scan_bytes)
+        PROVIDER_SCANNED_BYTES.labels(host, "match" if match else "no_match").observe(matcher.bytes_read)
+        return match
+
+    def backoff(self, attempt: int) -> float:
+        return self.backoff_factor * (2 ** attempt)
+
+    def retry_after(self, response: httpx.Response, attempt: int) -> float:
+        """Honor a numeric Retry-After header, capped by the total timeout"""
+        try:
+            return min(float(response.headers.get("Retry-After", "")), self.total_timeout)
+        except ValueError:
+            return self.backoff(attempt)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    # Prewarming
+
+    def has_idle_connection(self, origin: str) -> bool:
+        """Whether the pool holds an open connection that can take a request to ``origin``"""
+        if self._pool is None:
+            return False
+        target = httpcore.URL(origin).origin
+        return any(
+            connection.can_handle_request(target) and connection.is_available() and not connection.has_expired()
+            for connection in self._pool.connections
+        )
+
+    async def prewarm(self, origins: Iterable[str] = (), active_window: float = 3600.0) -> int:
+        """Open a connection to each given or recently used origin without an idle one
+
+        Returns the number of origins warmed. Does nothing while a test
+        transport is mounted.
+        """
+        self.client()
+        if self.transport is not None:
+            return 0
+        now = time.monotonic()
+        wanted = {origin_of(origin) for origin in origins}
+        wanted.update(origin for origin, used in self.active.items() if now - used < active_window)
+        cold = sorted(origin for origin in wanted if not self.has_idle_connection(origin))
+        await asyncio.gather(*(self._warm(origin) for origin in cold))
+        return len(cold)
+
+    async def _warm(self, origin: str):
+        host = httpx.URL(origin).host
+        try:
+            # HEAD without retries: the response is irrelevant, the pooled connection is the point
+            await self.client().request("HEAD", origin)
+            PROVIDER_PREWARMS.labels(host, "ok").inc()
+        except Exception as e:
+            PROVIDER_PREWARMS.labels(host, "error").inc()
+            logger.info(f"Prewarming {origin} failed: {e}")
+
+    def start_prewarm(self, origins: Iterable[str] = (), interval: float = 30.0, active_window: float = 3600.0):
+        """Prewarm now and then every ``interval`` seconds"""
+        if self._prewarm_task is not None and not self._prewarm_task.done():
+            return
+        origins = list(origins)
+
+        async def loop():
+            while True:
+                await self.prewarm(origins, active_window)
+                await asyncio.sleep(interval)
+
+        self._prewarm_task = asyncio.get_running_loop().create_task(loop())
+
+    async def aclose(self):
+        """Stop prewarming and close pooled connections of the current client"""
+        if self._prewarm_task is not None:
+            self._prewarm_task.cancel()
+            try:
+                await self._prewarm_task
+            except asyncio.CancelledError:
+                pass
+            self._prewarm_task = None
+        if self._client is not None:
+            try:
+                await self._client.aclose()
+            except RuntimeError:
+                # Created on an event loop that is gone
+                pass
+            self._client = None
+            self._pool = None
+
+def origin_of(url: str) -> str:
+    """scheme://host:port of a URL"""
+    parsed = httpx.URL(url)
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    return f"{parsed.scheme}://{parsed.host}:{port}"
+
+# Global provider HTTP client instance
+provider_http = ProviderHTTP(resolver=DNSCache(**DNS_CONFIG), **HTTP_CONFIG)
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import string
+from typing import Dict, Iterable, List, Optional
+
+from budget import ApiBudget
+from config import SSH_PROVIDERS
+from metrics import PROVIDER_BUDGET_TOKENS, PROVIDER_IN_FLIGHT, PROVIDER_REQUESTS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FORM_MODES = ("page", "direct")
+
+SPEED_TEST_NOTE = "SSH Speed Test Commands:\n• speedtest-cli\n• curl -s https://raw.githubusercontent.com/sivel/speedtest-cli/master/speedtest.py | python3\n• wget -O /dev/null http://speedtest.wdc01.softlayer.com/downloads/test100.zip"
+
+class Provider:
+    """One SSH provider from ``SSH_PROVIDERS`` plus its runtime limits
+
+    Creations run under a per-provider semaphore of ``concurrency`` slots and
+    every request to the site takes a token from the provider's own budget
+    (``rate`` per second, bursts of ``burst``), so one slow or strict site
+    cannot hold up the others.
+    """
+
+    def __init__(self, name: str, url: str, servers: Iterable, host: str = "{server}", port: int = 22,
+                 active: bool = True, form: str = "direct", fields: Optional[Dict[str, str]] = None,
+                 statuses: Iterable[int] = (200,), success: Iterable[str] = ("success", "created"),
+                 ttl_days: float = 7, concurrency: int = 4, rate: float = 5.0, burst: int = 10):
+        if form not in FORM_MODES:
+            raise ValueError(f"form must be one of {FORM_MODES}, not {form!r}")
+        self.name = name
+        self.url = url
+        self.servers = [self._server(server, host, port) for server in servers]
+        self.active = active
+        self.form = form
+        self.fields = {"username": "username", "password": "password", "server": "server", **(fields or {})}
+        self.statuses = tuple(statuses)
+        self.success = list(success)
+        self.ttl_days = ttl_days
+        self.concurrency = concurrency
+        self.budget = ApiBudget(rate, burst, gauge=PROVIDER_BUDGET_TOKENS.labels(name), calls=PROVIDER_REQUESTS)
+        self.in_flight = PROVIDER_IN_FLIGHT.labels(name)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = None
+
+    @staticmethod
+    def _server(server, host: str, port: int) -> Dict:
+        if isinstance(server, str):
+            server = {"code": server}
+        return {
+            "code": server["code"],
+            "host": server.get("host") or host.format(server=server["code"]),
+            "port": server.get("port", port),
+            # "sg1" -> "sg" unless the entry names its region
+            "region": server.get("region") or server["code"].rstrip(string.digits)
+        }
+
+    @classmethod
+    def from_config(cls, entry: Dict) -> "Provider":
+        return cls(**entry)
+
+    def create_url(self, server: Dict) -> str:
+        return self.url.format(server=server["code"])
+
+    def form_data(self, server: Dict, username: str, password: str) -> Dict[str, str]:
+        fields = self.fields
+        return {fields["username"]: username, fields["password"]: password, fields["server"]: server["code"]}
+
+    def success_words(self, username: str) -> List[str]:
+        return self.success + [username]
+
+    def slot(self) -> asyncio.Semaphore:
+        """Concurrency semaphore for the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore, self._loop = asyncio.Semaphore(self.concurrency), loop
+        return self._semaphore
+
+    async def request_token(self):
+        """Wait until the provider's request budget allows another request"""
+        await self.budget.acquire(self.name)
+
+def load_providers(entries: Iterable[Dict]) -> List[Provider]:
+    """Providers in configured order; a malformed entry is logged and skipped"""
+    providers = []
+    for entry in entries:
+        try:
+            providers.append(Provider.from_config(entry))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Skipping provider {entry.get('name', '?')}: {e}")
+    return providers
+
+# Global provider registry instance
+providers = load_providers(SSH_PROVIDERS)
@@ -1,23 +1,27 @@
-import qrcode
-from PIL import Image, ImageDraw, ImageFont
 import io
 import json
 import logging
 from typing import Optional
 
+from tracing import traced
+
 # Configure logging  
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# qrcode and Pillow are imported on first use, not at bot startup
+ERROR_CORRECT_L = 1  # qrcode.constants.ERROR_CORRECT_L
+
 class QRCodeGenerator:
     def __init__(self):
         self.default_config = {
             'version': 1,
-            'error_correction': qrcode.constants.ERROR_CORRECT_L,
+            'error_correction': ERROR_CORRECT_L,
             'box_size': 10,
             'border': 4,
         }
         
+    @traced("qr.generate_qr_code")
     def generate_qr_code(self, 
                         data: str, 
                         filename: Optional[str] = None,
@@ -36,6 +40,8 @@ class QRCodeGenerator:
             QR code image as bytes
         """
         try:
+            import qrcode
+            
             qr = qrcode.QRCode(**self.default_config)
             qr.add_data(data)
             qr.make(fit=True)
@@ -57,7 +63,7 @@ class QRCodeGenerator:
             logger.error("Error generating QR code: {}".format(e))
             return None
     
-    def image_to_bytes(self, img: Image.Image, format: str = "PNG") -> bytes:
+    def image_to_bytes(self, img, format: str = "PNG") -> bytes:
         """Convert PIL Image to bytes"""
         try:
             img_buffer = io.BytesIO()
@@ -124,6 +130,7 @@ class QRCodeWithText:
     def __init__(self):
         self.qr_gen = QRCodeGenerator()
         
+    @traced("qr.create_config_card")
     def create_config_card(self, config_data: dict) -> Optional[bytes]:
         """Create a card with QR code and config information"""
         try:
@@ -132,6 +139,8 @@ class QRCodeWithText:
             if not qr_bytes:
                 return None
             
+            from PIL import Image, ImageDraw, ImageFont
+            
             # Load QR image
             qr_img = Image.open(io.BytesIO(qr_bytes))
             
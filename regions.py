@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from config import REGION_CONFIG
+from metrics import CacheMetrics, REGION_SELECTIONS
+from prober import EndpointProber, prober as endpoint_prober
+from providers import Provider, providers as provider_registry
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class RegionSelector:
+    """Per-user order of SSH regions, nearest and healthy first
+
+    The preferred region comes from, in order: the user's explicit choice,
+    the region where most of their configs were created, and their Telegram
+    ``language_code``. It leads unless every server in it is down; the other
+    regions follow by the live latency of their fastest healthy server
+    (regions not probed yet in config order, all-down regions last). Orders
+    are cached per user for ``ttl`` seconds, so a generation only pays a
+    dict lookup; a miss reads the user's region profile once, and choices
+    and successes update the cached profile in place.
+    """
+
+    def __init__(self, database, regions: Dict[str, str] = None, languages: Dict[str, str] = None,
+                 providers: List[Provider] = None, prober: EndpointProber = None,
+                 ttl: float = 300.0, max_users: int = 10000):
+        self.database = database
+        self.regions = regions if regions is not None else REGION_CONFIG["regions"]
+        self.languages = languages if languages is not None else REGION_CONFIG["languages"]
+        self.providers = providers if providers is not None else provider_registry
+        self.prober = prober or endpoint_prober
+        self.ttl = ttl
+        self.max_users = max_users
+        # user_id -> (expires, region profile, language_code, region order)
+        self._cache: "OrderedDict[int, Tuple[float, Dict, Optional[str], List[str]]]" = OrderedDict()
+        self._metrics = CacheMetrics("regions")
+
+    def region_of_language(self, language_code: Optional[str]) -> Optional[str]:
+        if not language_code:
+            return None
+        tag = language_code.lower()
+        return self.languages.get(tag) or self.languages.get(tag.split("-")[0])
+
+    def preferred(self, profile: Dict, language_code: Optional[str] = None) -> Tuple[Optional[str], str]:
+        """Preferred region and the signal it came from (choice, history, language or none)"""
+        if profile.get("region") in self.regions:
+            return profile["region"], "choice"
+        successes = {region: count for region, count in (profile.get("region_successes") or {}).items()
+                     if region in self.regions and count > 0}
+        if successes:
+            return max(successes, key=successes.get), "history"
+        region = self.region_of_language(language_code)
+        if region in self.regions:
+            return region, "language"
+        return None, "none"
+
+    def region_health(self) -> Dict[str, Tuple[int, float]]:
+        """Per region: (0 healthy / 1 unknown / 2 all down, best latency)"""
+        health = {}
+        for provider in self.providers:
+            for server in provider.servers:
+                healthy = self.prober.is_healthy(server["host"], server["port"])
+                if healthy:
+                    state = (0, self.prober.health(server["host"], server["port"]).latency)
+                else:
+                    state = (1, 0.0) if healthy is None else (2, 0.0)
+                current = health.get(server["region"])
+                if current is None or state < current:
+                    health[server["region"]] = state
+        return health
+
+    def rank(self, preferred: Optional[str] = None) -> List[str]:
+        """Configured regions ordered for a user who prefers ``preferred``"""
+        health = self.region_health()
+        positions = {region: index for index, region in enumerate(self.regions)}
+        ordered = sorted(self.regions, key=lambda region: (*health.get(region, (1, 0.0)), positions[region]))
+        if preferred in health and health[preferred][0] != 2:
+            ordered.remove(preferred)
+            ordered.insert(0, preferred)
+        return ordered
+
+    async def order(self, user_id: int, language_code: Optional[str] = None) -> List[str]:
+        """Cached region order for a user"""
+        entry = self._cache.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._cache.move_to_end(user_id)
+            self._metrics.hit()
+            return entry[3]
+        self._metrics.miss()
+
+        profile = await asyncio.to_thread(self.database.get_region_profile, user_id)
+        return self._store(user_id, profile, language_code)
+
+    def _store(self, user_id: int, profile: Dict, language_code: Optional[str],
+               expires: Optional[float] = None) -> List[str]:
+        region, source = self.preferred(profile, language_code)
+        ordered = self.rank(region)
+        REGION_SELECTIONS.labels(source).inc()
+        self._cache[user_id] = (expires or time.monotonic() + self.ttl, profile, language_code, ordered)
+        self._cache.move_to_end(user_id)
+        if len(self._cache) > self.max_users:
+            self._cache.popitem(last=False)
+        return ordered
+
+    async def choose(self, user_id: int, region: Optional[str]) -> bool:
+        """Store an explicit choice (None for automatic); False for an unknown region"""
+        if region is not None and region not in self.regions:
+            return False
+        if not await asyncio.to_thread(self.database.set_region, user_id, region):
+            return False
+        self._update(user_id, lambda profile: profile.update(region=region))
+        return True
+
+    async def record_success(self, user_id: int, region: str):
+        """Count a config created in ``region`` for the user's history signal"""
+        if region not in self.regions:
+            return
+        await asyncio.to_thread(self.database.record_region_success, user_id, region)
+
+        def count(profile):
+            successes = dict(profile.get("region_successes") or {})
+            successes[region] = successes.get(region, 0) + 1
+            profile["region_successes"] = successes
+
+        self._update(user_id, count)
+
+    def _update(self, user_id: int, change):
+        """Apply a profile change to a cached entry without another read"""
+        entry = self._cache.get(user_id)
+        if entry is not None:
+            profile = dict(entry[1])
+            change(profile)
+            self._store(user_id, profile, entry[2], entry[0])
+
+    def invalidate(self, user_id: int):
+        self._cache.pop(user_id, None)
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+from membership import membership_verifier
+from metrics import MEMBERSHIP_REVERIFIED
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "membership_reverify"
+
+class ReverifyProgress:
+    """Counters for one re-verification pass"""
+
+    def __init__(self, after=None, checked: int = 0, left: int = 0, unknown: int = 0, started: float = None):
+        self.after = after
+        self.checked = checked
+        self.left = left
+        self.unknown = unknown
+        self.started = started if started is not None else time.time()
+
+    def state(self, done: bool = False) -> Dict:
+        """Checkpoint document"""
+        return {
+            "after": self.after, "checked": self.checked, "left": self.left,
+            "unknown": self.unknown, "started": self.started, "done": done,
+            "finished": time.time() if done else None
+        }
+
+    def text(self) -> str:
+        return f"✅ {self.checked} checked • 🚪 {self.left} left • ❔ {self.unknown} unverified"
+
+class MembershipReverifier:
+    """Periodically re-checks users who claimed the channel reward
+
+    Users with ``joined_channels=True`` are read in ``_id``-ordered batches and
+    checked by ``concurrency`` workers through the membership verifier in
+    background mode, so every call waits for the shared Bot API budget and
+    leaves its reserve to interactive traffic. Leavers of each batch are
+    recorded with one bulk update, then the last ``_id`` is checkpointed; an
+    interrupted pass resumes from there.
+    """
+
+    def __init__(self, database, verifier=membership_verifier, batch_size: int = 200,
+                 concurrency: int = 8, interval: float = 86400.0, caller: str = "reverify"):
+        self.database = database
+        self.verifier = verifier
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.interval = interval
+        self.caller = caller
+        self.progress: Optional[ReverifyProgress] = None
+        self.active = False
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def run(self, bot, restart: bool = False) -> ReverifyProgress:
+        """One pass over the joined users, resuming an unfinished pass unless ``restart``"""
+        if self.active:
+            return self.progress
+        self.active = True
+        try:
+            return await self._run(bot, restart)
+        finally:
+            self.active = False
+
+    async def _run(self, bot, restart: bool) -> ReverifyProgress:
+        state = await asyncio.to_thread(self.database.get_job_state, JOB_NAME)
+        if state and not state.get("done") and not restart:
+            progress = ReverifyProgress(state["after"], state["checked"], state["left"],
+                                        state["unknown"], state["started"])
+            logger.info(f"Resuming membership re-verification after {progress.after}")
+        else:
+            progress = ReverifyProgress()
+        self.progress = progress
+
+        while True:
+            users = await asyncio.to_thread(self.database.get_joined_users, progress.after, self.batch_size)
+            if not users:
+                break
+            results = await self.check_users(bot, [user["user_id"] for user in users])
+            leavers = [user_id for user_id, left in results.items() if left is True]
+            if leavers:
+                await asyncio.to_thread(self.database.mark_channels_left, leavers)
+            progress.after = users[-1]["_id"]
+            progress.checked += len(users)
+            progress.left += len(leavers)
+            progress.unknown += sum(1 for left in results.values() if left is None)
+            await asyncio.to_thread(self.database.save_job_state, JOB_NAME, progress.state())
+
+        await asyncio.to_thread(self.database.save_job_state, JOB_NAME, progress.state(done=True))
+        logger.info(f"Membership re-verification finished: {progress.text()}")
+        return progress
+
+    async def check_users(self, bot, user_ids: List[int]) -> Dict[int, Optional[bool]]:
+        """Whether each user left any channel (None if it could not be checked)"""
+        results: Dict[int, Optional[bool]] = {}
+        pending = iter(user_ids)
+
+        async def worker():
+            for user_id in pending:
+                results[user_id] = await self.user_left(bot, user_id)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(self.concurrency, len(user_ids)))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+        return results
+
+    async def user_left(self, bot, user_id: int) -> Optional[bool]:
+        """Check channels one by one, stopping at the first one the user left"""
+        unknown = False
+        for channel in self.verifier.channels:
+            is_member = self.verifier.cached(user_id, channel["id"])
+            if is_member is None:
+                is_member = await self.verifier.check(bot, channel["id"], user_id, self.caller, background=True)
+            if is_member is False:
+                MEMBERSHIP_REVERIFIED.labels("left").inc()
+                return True
+            if is_member is None:
+                unknown = True
+        MEMBERSHIP_REVERIFIED.labels("unknown" if unknown else "member").inc()
+        return None if unknown else False
+
+    def start(self, bot):
+        """Run a pass every ``interval`` seconds in the background"""
+        if self.running:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._schedule(bot))
+        logger.info(f"Membership re-verification scheduled every {self.interval:.0f}s")
+
+    async def _schedule(self, bot):
+        while True:
+            state = await asyncio.to_thread(self.database.get_job_state, JOB_NAME)
+            if state and state.get("done"):
+                # Wait out the rest of the interval since the last finished pass
+                await asyncio.sleep(max(0.0, self.interval - (time.time() - (state.get("finished") or 0))))
+            try:
+                await self.run(bot)
+            except Exception as e:
+                logger.error(f"Membership re-verification failed: {e}")
+                await asyncio.sleep(min(self.interval, 300.0))
+
+    async def stop(self):
+        """Stop the schedule; the checkpoint lets the next start resume"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,215 @@
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import HANDLER_ERRORS, HANDLER_LATENCY
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Telegram rejects callback_data longer than 64 bytes
+MAX_CALLBACK_BYTES = 64
+
+class CallbackDataError(ValueError):
+    """Raised when callback data cannot be encoded"""
+
+class Route:
+    """One callback route: handler, compact code, metric children and compiled middleware chain"""
+
+    __slots__ = ("name", "code", "handler", "params", "middleware", "latency", "errors", "call")
+
+    def __init__(self, name: str, code: str, handler: Callable, params: Tuple[str, ...],
+                 middleware: List[Callable]):
+        self.name = name
+        self.code = code
+        self.handler = handler
+        self.params = params
+        self.middleware = middleware
+        # Bound once here rather than looked up by label on every press
+        self.latency = HANDLER_LATENCY.labels("callback", name)
+        self.errors = HANDLER_ERRORS.labels("callback", name)
+        self.call = self._compile()
+
+    def _compile(self) -> Callable:
+        """Fold the middleware around the handler once, at registration"""
+        async def endpoint(query, context, args):
+            return await self.handler(query, context, *args)
+
+        call = endpoint
+        for middleware in reversed(self.middleware):
+            call = _bind(middleware, self, call)
+        return call
+
+def _bind(middleware: Callable, route: Route, call_next: Callable) -> Callable:
+    async def call(query, context, args):
+        return await middleware(route, query, context, args, call_next)
+    return call
+
+class PrefixTrie:
+    """Longest-prefix lookup over legacy callback prefixes"""
+
+    def __init__(self):
+        self.root: Dict = {}
+
+    def insert(self, prefix: str, value):
+        node = self.root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[None] = (len(prefix), value)
+
+    def longest_match(self, text: str) -> Optional[tuple]:
+        """(prefix length, value) of the longest inserted prefix of ``text``"""
+        node = self.root
+        match = node.get(None)
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                break
+            match = node.get(None, match)
+        return match
+
+class CallbackRouter:
+    """Table-driven dispatch for inline button callbacks
+
+    Callback data is encoded as ``<version>:<code>[:<arg>...]``, e.g.
+    ``1:sv:youtube``, and resolved with a single dict lookup on ``code``.
+    Payloads from keyboards sent before the compact encoding (``service_youtube``)
+    are resolved through an exact-name table and a prefix trie.
+    """
+
+    VERSION = "1"
+    SEPARATOR = ":"
+
+    def __init__(self):
+        self.routes: Dict[str, Route] = {}
+        self._by_code: Dict[str, Route] = {}
+        self._legacy_exact: Dict[str, Route] = {}
+        self._legacy_prefixes = PrefixTrie()
+        self._fallback: Optional[Callable] = None
+
+    def add(self, name: str, code: str, handler: Callable, params: Tuple[str, ...] = (),
+            middleware: Optional[List[Callable]] = None, legacy_prefix: Optional[str] = None) -> Route:
+        """Register a route; ``name`` also resolves legacy payloads equal to it"""
+        if code in self._by_code or name in self.routes:
+            raise ValueError(f"Duplicate callback route {name!r} / code {code!r}")
+        if self.SEPARATOR in code:
+            raise ValueError(f"Route code may not contain {self.SEPARATOR!r}: {code!r}")
+
+        route = Route(name, code, handler, tuple(params), list(middleware or []))
+        self.routes[name] = route
+        self._by_code[code] = route
+        self._legacy_exact[name] = route
+        if legacy_prefix:
+            self._legacy_prefixes.insert(legacy_prefix, route)
+        return route
+
+    def fallback(self, handler: Callable):
+        """Handler for callback data that matches no route"""
+        self._fallback = handler
+
+    def encode(self, name: str, *args) -> str:
+        """Compact callback data for a route and its parameters"""
+        route = self.routes[name]
+        if len(args) != len(route.params):
+            raise CallbackDataError(f"Route {name!r} expects parameters {route.params}")
+        parts = [self.VERSION, route.code]
+        for arg in args:
+            arg = str(arg)
+            if self.SEPARATOR in arg:
+                raise CallbackDataError(f"Callback parameter may not contain {self.SEPARATOR!r}: {arg!r}")
+            parts.append(arg)
+        data = self.SEPARATOR.join(parts)
+        if len(data.encode("utf-8")) > MAX_CALLBACK_BYTES:
+            raise CallbackDataError(f"Callback data for {name!r} exceeds {MAX_CALLBACK_BYTES} bytes")
+        return data
+
+    def decode(self, data: str) -> Tuple[Optional[Route], Tuple[str, ...]]:
+        """Resolve callback data to (route, args); route is None when unknown"""
+        version, sep, rest = data.partition(self.SEPARATOR)
+        if sep and version == self.VERSION:
+            parts = rest.split(self.SEPARATOR)
+            route = self._by_code.get(parts[0])
+            if route is not None and len(parts) - 1 == len(route.params):
+                return route, tuple(parts[1:])
+            return None, ()
+
+        # Keyboards sent before the compact encoding
+        route = self._legacy_exact.get(data)
+        if route is not None and not route.params:
+            return route, ()
+        match = self._legacy_prefixes.longest_match(data)
+        if match is not None:
+            length, route = match
+            return route, (data[length:],) if route.params else ()
+        return None, ()
+
+    def route_name(self, data: str) -> str:
+        """Bounded route name for metrics and traces"""
+        route, _ = self.decode(data)
+        return route.name if route else "unknown"
+
+    async def dispatch(self, update, context):
+        """PTB callback: run the route's middleware chain and handler"""
+        query = update.callback_query
+        route, args = self.decode(query.data or "")
+        if route is None:
+            logger.warning(f"Unknown callback data: {query.data}")
+            if self._fallback:
+                await self._fallback(query, context)
+            return
+        await route.call(query, context, args)
+
+# Middleware. Each has the signature
+#   async def middleware(route, query, context, args, call_next)
+# and either calls ``await call_next(query, context, args)`` or answers itself.
+
+async def timing(route, query, context, args, call_next):
+    """Observe handler latency per route"""
+    started = time.perf_counter()
+    try:
+        return await call_next(query, context, args)
+    finally:
+        route.latency.observe(time.perf_counter() - started)
+
+def errors_reply(text: str):
+    """Log handler exceptions and show ``text`` instead of failing silently"""
+    async def middleware(route, query, context, args, call_next):
+        try:
+            return await call_next(query, context, args)
+        except Exception as e:
+            route.errors.inc()
+            logger.error(f"Error in callback {route.name}: {e}", exc_info=True)
+            try:
+                await query.edit_message_text(text)
+            except Exception:
+                pass
+    return middleware
+
+def admin_only(is_admin: Callable[[int], bool]):
+    """Reject non-admins with an alert before the handler runs"""
+    async def middleware(route, query, context, args, call_next):
+        if not is_admin(query.from_user.id):
+            await query.answer("❌ Admin access required.", show_alert=True)
+            return
+        return await call_next(query, context, args)
+    return middleware
+
+def rate_limited(action: str, limiter, exempt: Callable[[int], bool] = lambda user_id: False,
+                 when: Optional[Callable[[tuple], bool]] = None):
+    """Reject users over the RateLimiter budget for ``action``
+
+    ``when`` limits the charge to presses whose route arguments it accepts.
+    """
+    async def middleware(route, query, context, args, call_next):
+        user_id = query.from_user.id
+        if (when is None or when(args)) and not exempt(user_id) and not limiter.is_allowed(user_id, action):
+            await query.answer("⏳ Too many requests. Please wait a minute and try again.", show_alert=True)
+            return
+        return await call_next(query, context, args)
+    return middleware
+
+async def answer(route, query, context, args, call_next):
+    """Acknowledge the button press once the request has been accepted"""
+    await query.answer()
+    return await call_next(query, context, args)
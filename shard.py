@@ -0,0 +1,365 @@
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import os
+import signal
+import sys
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from telegram import Bot, Update
+from telegram.error import TelegramError
+
+from config import SHARD_CONFIG
+from metrics import SHARD_REROUTES, SHARD_RESTARTS, SHARD_UPDATES, SHARD_WORKERS_UP
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def shard_key(update: Dict) -> int:
+    """Routing key of a raw update: the sender's user id, else the chat id, else the update id"""
+    for value in update.values():
+        if isinstance(value, dict):
+            user = value.get("from") or value.get("user")
+            if user:
+                return user["id"]
+            chat = value.get("chat")
+            if chat:
+                return chat["id"]
+    return update.get("update_id", 0)
+
+def socket_path(index: int, socket_dir: str = None) -> str:
+    return os.path.join(socket_dir or SHARD_CONFIG["socket_dir"], f"worker-{index}.sock")
+
+def _frame(message: Dict) -> bytes:
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+class HashRing:
+    """Consistent hash ring with ``replicas`` virtual points per node
+
+    Removing a node only moves the keys that node owned; adding it back
+    returns exactly those keys. Hashes are stable across processes.
+    """
+
+    def __init__(self, nodes=(), replicas: int = 160):
+        self.replicas = replicas
+        self.nodes = set()
+        self._points: List[int] = []
+        self._owners: List = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(value) -> int:
+        return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+
+    def add(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for replica in range(self.replicas):
+            point = self._hash(f"{node}#{replica}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node):
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def node(self, key):
+        """Node owning ``key``, None while the ring is empty"""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, self._hash(key))
+        return self._owners[index % len(self._owners)]
+
+    def __contains__(self, node) -> bool:
+        return node in self.nodes
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+class ShardWorker:
+    """Worker end of the IPC link: hands routed updates to ``handle`` in arrival order
+
+    Listens on a Unix socket for newline-delimited JSON frames from the
+    front: ``{"update": ...}`` is passed to ``handle``, ``{"ping": n}`` is
+    answered with ``{"pong": n}`` once every earlier frame was handled.
+    """
+
+    def __init__(self, path: str, handle: Callable[[Dict], Awaitable]):
+        self.path = path
+        self.handle = handle
+        self._server = None
+        self._connections: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+
+    async def start(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Left behind by a crashed predecessor
+        self._server = await asyncio.start_unix_server(self._serve, self.path)
+        logger.info(f"Shard worker listening on {self.path}")
+
+    async def _serve(self, reader, writer):
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while line := await reader.readline():
+                frame = json.loads(line)
+                if "update" in frame:
+                    try:
+                        await self.handle(frame["update"])
+                    except Exception as e:
+                        logger.error(f"Error handling routed update: {e}")
+                elif "ping" in frame:
+                    writer.write(_frame({"pong": frame["ping"]}))
+                    await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Shard link closed: {e}")
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._connections):
+                writer.close()
+            if self._connections:
+                # Let the handlers see EOF and finish before the loop goes away
+                await asyncio.wait(list(self._connections.values()), timeout=1.0)
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+class WorkerLink:
+    """Front-side state of one worker: process, connection and ping bookkeeping"""
+
+    __slots__ = ("index", "path", "process", "writer", "reader_task", "pinged", "ponged")
+
+    def __init__(self, index: int, path: str):
+        self.index = index
+        self.path = path
+        self.process = None
+        self.writer = None
+        self.reader_task = None
+        self.pinged = 0  # Sequence number of the latest ping sent
+        self.ponged = 0  # Sequence number of the latest pong received
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None and not self.writer.is_closing()
+
+class ShardFront:
+    """Routes updates to worker processes by consistent hash of the user id
+
+    Every update of a user goes to the same worker over one ordered stream,
+    so ``user_data``, rate limits and per-user caches stay process-local.
+    Workers join the ring once they answer a ping and leave it when their
+    connection drops or a ping is still unanswered at the next health round
+    (every ``health_interval`` seconds); only the leaving worker's users
+    move, and they move back when it returns. With a ``command``, the front
+    also starts one process per worker and restarts any that exits.
+    """
+
+    def __init__(self, workers: int, socket_dir: str = None, replicas: int = 160,
+                 health_interval: float = 5.0, restart_backoff: float = 1.0,
+                 command: Optional[Callable[[int], List[str]]] = None):
+        self.links = [WorkerLink(index, socket_path(index, socket_dir)) for index in range(workers)]
+        self.ring = HashRing(replicas=replicas)
+        self.health_interval = health_interval
+        self.restart_backoff = restart_backoff
+        self.command = command
+        self._tasks: List[asyncio.Task] = []
+        self._joined = asyncio.Event()
+
+    async def start(self):
+        """Start worker processes (with a ``command``) and the health loop"""
+        loop = asyncio.get_running_loop()
+        if self.command is not None:
+            for link in self.links:
+                await self._spawn(link)
+                self._tasks.append(loop.create_task(self._supervise(link)))
+        self._tasks.append(loop.create_task(self._health_loop()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        for link in self.links:
+            self._disconnect(link)
+            if link.process is not None and link.process.returncode is None:
+                link.process.terminate()
+                await link.process.wait()
+
+    async def _spawn(self, link: WorkerLink):
+        link.process = await asyncio.create_subprocess_exec(*self.command(link.index))
+        logger.info(f"Started shard worker {link.index} (pid {link.process.pid})")
+
+    async def _supervise(self, link: WorkerLink):
+        while True:
+            code = await link.process.wait()
+            logger.warning(f"Shard worker {link.index} exited with code {code}, restarting")
+            SHARD_RESTARTS.labels(str(link.index)).inc()
+            self._leave(link, "process exited")
+            await asyncio.sleep(self.restart_backoff)
+            try:
+                await self._spawn(link)
+            except OSError as e:
+                logger.error(f"Could not restart shard worker {link.index}: {e}")
+                await asyncio.sleep(self.health_interval)
+
+    async def _health_loop(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.health_interval)
+
+    async def check(self):
+        """One health round: connect to new workers, ping the rest, drop the silent ones"""
+        for link in self.links:
+            if not link.connected:
+                self._disconnect(link)
+                if not await self._connect(link):
+                    continue
+            elif link.ponged < link.pinged:
+                self._leave(link, "no answer to ping")
+                continue
+            link.pinged += 1
+            try:
+                link.writer.write(_frame({"ping": link.pinged}))
+                await link.writer.drain()
+            except (ConnectionError, OSError) as e:
+                self._leave(link, str(e))
+
+    async def _connect(self, link: WorkerLink) -> bool:
+        try:
+            reader, writer = await asyncio.open_unix_connection(link.path)
+        except OSError:
+            return False
+        link.writer = writer
+        link.pinged = link.ponged = 0
+        link.reader_task = asyncio.get_running_loop().create_task(self._read(link, reader))
+        return True
+
+    async def _read(self, link: WorkerLink, reader):
+        try:
+            while line := await reader.readline():
+                pong = json.loads(line).get("pong")
+                if pong is not None:
+                    link.ponged = max(link.ponged, pong)
+                    self._join(link)
+        except (ConnectionError, ValueError):
+            pass
+        self._leave(link, "connection closed")
+
+    def _join(self, link: WorkerLink):
+        if link.index not in self.ring:
+            self.ring.add(link.index)
+            SHARD_WORKERS_UP.set(len(self.ring))
+            self._joined.set()
+            logger.info(f"Shard worker {link.index} joined; {len(self.ring)} on the ring")
+
+    def _leave(self, link: WorkerLink, reason: str):
+        self._disconnect(link)
+        if link.index in self.ring:
+            self.ring.remove(link.index)
+            SHARD_WORKERS_UP.set(len(self.ring))
+            if not self.ring:
+                self._joined.clear()
+            logger.warning(f"Shard worker {link.index} left ({reason}); {len(self.ring)} on the ring")
+
+    def _disconnect(self, link: WorkerLink):
+        if link.writer is not None:
+            link.writer.close()
+            link.writer = None
+        if link.reader_task is not None and link.reader_task is not asyncio.current_task():
+            link.reader_task.cancel()
+        link.reader_task = None
+
+    async def dispatch(self, update: Dict) -> int:
+        """Send a raw update to its worker and return the worker index
+
+        Waits while no worker is up; an update whose worker turns out to be
+        gone goes to the next owner on the ring.
+        """
+        key = shard_key(update)
+        data = _frame({"update": update})
+        while True:
+            index = self.ring.node(key)
+            if index is None:
+                await self._joined.wait()
+                continue
+            link = self.links[index]
+            if link.connected:
+                try:
+                    link.writer.write(data)
+                    await link.writer.drain()
+                    SHARD_UPDATES.labels(str(index)).inc()
+                    return index
+                except (ConnectionError, OSError) as e:
+                    self._leave(link, str(e))
+            else:
+                self._leave(link, "not connected")
+            SHARD_REROUTES.inc()
+
+    async def poll(self, bot: Bot, timeout: int = 30, drop_pending_updates: bool = True):
+        """Long-poll getUpdates and dispatch every update, like ``run_polling`` in one process"""
+        if drop_pending_updates:
+            await bot.delete_webhook(drop_pending_updates=True)
+        offset = None
+        while True:
+            try:
+                updates = await bot.get_updates(
+                    offset=offset, timeout=timeout, read_timeout=timeout + 10, allowed_updates=Update.ALL_TYPES
+                )
+            except TelegramError as e:
+                logger.warning(f"getUpdates failed: {e}")
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                await self.dispatch(update.to_dict())
+                offset = update.update_id + 1
+
+def worker_command(index: int) -> List[str]:
+    """Command line of worker ``index``: ``bot.py --worker <index>``"""
+    return [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py"),
+            "--worker", str(index)]
+
+async def wait_for_signal():
+    """Return on SIGINT or SIGTERM"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        # A second signal during shutdown gets the default behaviour
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(signum)
+
+async def run_front(bot: Bot, config: Dict = SHARD_CONFIG):
+    """Start the workers and route updates to them until SIGINT/SIGTERM"""
+    front = ShardFront(
+        config["workers"], config["socket_dir"], replicas=config["replicas"],
+        health_interval=config["health_interval"], restart_backoff=config["restart_backoff"],
+        command=worker_command
+    )
+    await front.start()
+    async with bot:
+        polling = asyncio.get_running_loop().create_task(front.poll(bot))
+        logger.info(f"Shard front routing updates to {len(front.links)} workers")
+        try:
+            await wait_for_signal()
+        finally:
+            polling.cancel()
+            await asyncio.gather(polling, return_exceptions=True)
+            await front.stop()
@@ -6,9 +6,9 @@ This script handles initialization, health checks, and graceful startup
 
 import os
 import sys
-import time
 import logging
 import asyncio
+import importlib.util
 from pathlib import Path
 
 # Add current directory to Python path
@@ -86,19 +86,12 @@ def check_dependencies():
         'httpx'  # Using httpx instead of aiohttp
     ]
     
-    missing_modules = []
-    for module in required_modules:
-        try:
-            if module == 'beautifulsoup4':
-                import bs4
-            elif module == 'PIL':
-                import PIL
-            elif module == 'dotenv':
-                import dotenv
-            else:
-                __import__(module)
-        except ImportError:
-            missing_modules.append(module)
+    # Distribution name -> import name; find_spec checks without importing
+    import_names = {'beautifulsoup4': 'bs4', 'PIL': 'PIL', 'dotenv': 'dotenv'}
+    missing_modules = [
+        module for module in required_modules
+        if importlib.util.find_spec(import_names.get(module, module)) is None
+    ]
     
     if missing_modules:
         logger.error(f"Missing required modules: {', '.join(missing_modules)}")
@@ -168,16 +161,14 @@ def test_telegram_connection():
         return False
 
 def initialize_database():
-    """Initialize database collections and indexes"""
+    """Create indexes and run data migrations (no-op when the schema is current)"""
     logger = logging.getLogger(__name__)
     
     try:
         logger.info("Initializing database...")
         from db import db
         
-        # The db module will handle initialization in its __init__
-        # This is just to trigger the connection and index creation
-        db.get_user_stats()
+        db.migrate()
         
         logger.info("Database initialization completed ✅")
         return True
@@ -249,7 +240,6 @@ def main():
                 logger.info("- Ensure token format: 123456789:ABC-DEF1234ghIkl-zyx57W2v1u123ew11")
             
             sys.exit(1)
-        time.sleep(0.5)  # Small delay for readability
     
     logger.info("All startup checks passed! 🎉")
     logger.info("=" * 60)
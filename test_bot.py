@@ -4,6 +4,7 @@ Test script for the SSH/V2Ray bot functionality
 """
 
 import sys
+import asyncio
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
@@ -27,7 +28,7 @@ def test_generator():
     
     # Test SSH generation
     print("Testing SSH generation...")
-    ssh_config = generator.generate_config("ssh")
+    ssh_config = asyncio.run(generator.generate_config("ssh"))
     if ssh_config:
         print(f"✅ SSH config generated: {ssh_config['type']}")
     else:
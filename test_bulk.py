@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test script for bulk config generation
+"""
+
+import sys
+import os
+import io
+import json
+import time
+import asyncio
+import zipfile
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bulk import BulkGenerator, JsonlSink, ZipSink
+from generator import generator, is_demo_config
+from qrgen import qr_generator
+
+class CountingGenerator:
+    """Wraps the real generator and records peak concurrency"""
+
+    def __init__(self, delay=0.01, fail_every=0, demo_every=0):
+        self.delay = delay
+        self.fail_every = fail_every
+        self.demo_every = demo_every
+        self.active = 0
+        self.peak = 0
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def generate_service_config(self, service_key):
+        with self.lock:
+            self.active += 1
+            self.calls += 1
+            self.peak = max(self.peak, self.active)
+            call = self.calls
+        try:
+            time.sleep(self.delay)
+            if self.fail_every and call % self.fail_every == 0:
+                return None
+            if self.demo_every and call % self.demo_every == 0:
+                # What generate_service_config returns when every provider fails
+                return generator.v2ray_gen.create_demo_v2ray_config(service_key)
+            return generator.generate_service_config(service_key)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+class RecordingDatabase:
+    """Records bulk inserts instead of writing to MongoDB"""
+
+    def __init__(self):
+        self.batches = []
+
+    def save_configs(self, user_id, configs, batch_id=None):
+        self.batches.append((user_id, len(configs), batch_id))
+        return len(configs)
+
+def test_jsonl_stream():
+    """Test bounded concurrency, bulk flushes and JSONL output"""
+    print("🔧 Testing JSONL bulk generation...")
+
+    fake = CountingGenerator(fail_every=10)
+    bulk = BulkGenerator(fake, concurrency=4, flush_size=20)
+    database = RecordingDatabase()
+    reports = []
+    output = io.BytesIO()
+
+    progress = asyncio.run(bulk.run(
+        100, JsonlSink(output), "service", "youtube", user_id=1, database=database,
+        on_progress=lambda p: reports.append(p.done + p.failed), progress_interval=0.0
+    ))
+
+    lines = output.getvalue().decode("utf-8").splitlines()
+    records = [json.loads(line) for line in lines]
+    assert fake.peak <= 4
+    assert progress.done == 90 and progress.failed == 10 and progress.saved == 90
+    assert len(records) == 90 and all(r["link"].startswith("vmess://") for r in records)
+    assert len({r["index"] for r in records}) == 90
+    assert [size for _, size, _ in database.batches] == [20, 20, 20, 20, 10]
+    assert len({batch_id for _, _, batch_id in database.batches}) == 1
+    assert reports[-1] == 100
+    print(f"✅ {progress.text()} (peak concurrency {fake.peak})")
+
+def test_zip_with_qr():
+    """Test the zip sink with per-config QR images"""
+    print("\n🔧 Testing zip bulk generation...")
+
+    bulk = BulkGenerator(CountingGenerator(delay=0), qr_generator, concurrency=3)
+    output = io.BytesIO()
+    progress = asyncio.run(bulk.run(5, ZipSink(output), "service", "all_sites"))
+
+    with zipfile.ZipFile(output) as archive:
+        names = sorted(archive.namelist())
+        assert names[:2] == ["config-0001.json", "config-0001.png"]
+        assert len(names) == 10
+        assert archive.read("config-0001.png").startswith(b"\x89PNG")
+        assert json.loads(archive.read("config-0003.json"))["type"] == "VMess"
+    assert progress.saved == 0
+    print(f"✅ {len(names)} files written ({progress.text()})")
+
+def test_demo_fallback():
+    """Test that demo placeholders are counted as failed, not exported or saved"""
+    print("\n🔧 Testing demo fallback...")
+
+    bulk = BulkGenerator(CountingGenerator(delay=0, demo_every=4), concurrency=2, flush_size=100)
+    database = RecordingDatabase()
+    output = io.BytesIO()
+    progress = asyncio.run(bulk.run(20, JsonlSink(output), "service", "zoom", user_id=1, database=database))
+
+    records = [json.loads(line) for line in output.getvalue().decode("utf-8").splitlines()]
+    assert progress.done == 15 and progress.failed == 5 and progress.saved == 15
+    assert len(records) == 15 and not any(is_demo_config(r) for r in records)
+    assert database.batches[0][1] == 15
+    print(f"✅ {progress.failed} demo fallbacks counted as failed ({progress.text()})")
+
+def test_early_close():
+    """Test that abandoning the stream cancels outstanding workers"""
+    print("\n🔧 Testing early stream close...")
+
+    fake = CountingGenerator(delay=0.02)
+    bulk = BulkGenerator(fake, concurrency=2)
+
+    async def scenario():
+        stream = bulk.stream(1000, "service", "youtube")
+        received = 0
+        async for _ in stream:
+            received += 1
+            if received == 3:
+                break
+        await stream.aclose()
+        await asyncio.sleep(0.1)
+        return received
+
+    received = asyncio.run(scenario())
+    assert received == 3 and fake.calls < 20
+    print(f"✅ Stopped after {fake.calls} generations")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Bulk Generation Tests...\n")
+
+    try:
+        test_jsonl_stream()
+        test_zip_with_qr()
+        test_demo_fallback()
+        test_early_close()
+        print("\n🎉 All bulk generation tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test script for the keyboard and message catalog
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from catalog import Catalog
+from config import MESSAGES, POINTS_CONFIG
+from generator import SERVICE_PAYLOADS
+from router import CallbackRouter, MAX_CALLBACK_BYTES
+from utils import Template
+
+ROUTES = [
+    ("generate", ()), ("points", ()), ("refer", ()), ("join", ()), ("stats", ()), ("help", ()),
+    ("check_channels", ()), ("main_menu", ()), ("gen", ("type",)), ("service", ("service",)),
+    ("qr_config", ("type",)), ("admin_panel", ()), ("admin_test", ("service",)),
+    ("admin_test_services", ()), ("admin_get_credits", ()), ("admin_stats", ()),
+    ("admin_profile", ()), ("admin_loop", ()), ("admin_memory", ()), ("history", ("direction", "cursor"))
+]
+
+def build_catalog() -> Catalog:
+    router = CallbackRouter()
+
+    async def handler(query, context, *args):
+        pass
+
+    for index, (name, params) in enumerate(ROUTES):
+        router.add(name, f"r{index}", handler, params)
+    return Catalog(router, revalidate_interval=0.0)
+
+def test_template_segments():
+    """Test static substitution and dynamic rendering"""
+    print("🔧 Testing message templates...")
+
+    template = Template("Cost {cost} {{literal}} now {current}!", cost=5)
+    assert template.fields == {"current"}
+    assert template.render(current=7) == "Cost 5 {literal} now 7!"
+
+    constant = Template("Hello {name}", name="world")
+    assert constant.render() is constant.render()
+
+    insufficient = Template(MESSAGES["insufficient_points"], cost=POINTS_CONFIG["config_cost"],
+                            referral=POINTS_CONFIG["referral"], channel_join=POINTS_CONFIG["channel_join"])
+    expected = MESSAGES["insufficient_points"].format(cost=POINTS_CONFIG["config_cost"], current=3, **POINTS_CONFIG)
+    assert insufficient.render(current=3) == expected
+    print("✅ Static fields baked in, dynamic fields rendered")
+
+def test_keyboards_shared():
+    """Test that keyboards are built once and differ per role"""
+    print("\n🔧 Testing prebuilt keyboards...")
+
+    catalog = build_catalog()
+    assert catalog.keyboard("start:user") is catalog.keyboard("start:user")
+    user_rows = catalog.keyboard("start:user").inline_keyboard
+    admin_rows = catalog.keyboard("start:admin").inline_keyboard
+    assert len(admin_rows) == len(user_rows) + 1
+
+    buttons = [button for markup in catalog.keyboards.values() for row in markup.inline_keyboard for button in row]
+    assert all(len(b.callback_data.encode()) <= MAX_CALLBACK_BYTES for b in buttons if b.callback_data)
+    services = [b for row in catalog.keyboard("services").inline_keyboard for b in row]
+    assert len(services) == len(SERVICE_PAYLOADS) + 1
+    assert catalog.service_done_keyboard("VMess", False) is catalog.service_done_keyboard("VMess", False)
+    print(f"✅ {len(catalog.keyboards)} keyboards, {len(buttons)} buttons shared across updates")
+
+def test_invalidation():
+    """Test rebuilding when SERVICE_PAYLOADS or config values change"""
+    print("\n🔧 Testing catalog invalidation...")
+
+    catalog = build_catalog()
+    version = catalog.version
+    before = catalog.keyboard("services")
+
+    SERVICE_PAYLOADS["spotify"] = {"name": "🎧 Spotify", "host": "spotify.com", "description": "Music streaming"}
+    try:
+        after = catalog.keyboard("services")
+        assert catalog.version == version + 1
+        assert after is not before
+        assert "spotify" in catalog.services
+        assert "spotify" in catalog.render("service_config:spotify", config_type="VMess", link="l", payload="p", net="ws").lower()
+    finally:
+        del SERVICE_PAYLOADS["spotify"]
+
+    original = POINTS_CONFIG["config_cost"]
+    POINTS_CONFIG["config_cost"] = original + 1
+    try:
+        assert f"Cost: {original + 1} coins" in catalog.render("services")
+    finally:
+        POINTS_CONFIG["config_cost"] = original
+
+    assert catalog.refresh()
+    assert not catalog.refresh()
+    print(f"✅ Catalog rebuilt on change (version {catalog.version})")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Catalog Tests...\n")
+
+    try:
+        test_template_segments()
+        test_keyboards_shared()
+        test_invalidation()
+        print("\n🎉 All catalog tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Test script for the DNS cache and provider connection prewarming
+"""
+
+import sys
+import os
+import time
+import socket
+import asyncio
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from dns_cache import DNSCache
+from provider_http import ProviderHTTP, is_dns_failure
+
+class CountingCache(DNSCache):
+    """DNSCache with a scripted system resolver"""
+
+    def __init__(self, answers, delay=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self._resolver = None
+        self.answers = answers
+        self.delay = delay
+        self.lookups = []
+
+    async def _getaddrinfo(self, host):
+        self.lookups.append(host)
+        await asyncio.sleep(self.delay)
+        addresses = self.answers.get(host)
+        if addresses is None:
+            raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+        return addresses
+
+class LocalServer:
+    """Keep-alive HTTP/1.1 server that counts TCP connections"""
+
+    def __init__(self):
+        self.connections = 0
+        self.requests = []
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                while (await reader.readline()) not in (b"\r\n", b""):
+                    pass
+                method = line.split(b" ")[0].decode()
+                self.requests.append(method)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n" + (b"" if method == "HEAD" else b"ok"))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+def test_ttl_and_negative_cache():
+    """Test TTL expiry, negative caching and shared lookups"""
+    print("🔧 Testing DNS cache...")
+
+    cache = CountingCache({"speedssh.com": ["203.0.113.7"]}, delay=0.02,
+                          default_ttl=0.1, min_ttl=0.05, negative_ttl=0.1)
+
+    async def scenario():
+        results = await asyncio.gather(*(cache.resolve("speedssh.com") for _ in range(20)))
+        assert all(r == ["203.0.113.7"] for r in results) and len(cache.lookups) == 1
+        await cache.resolve("speedssh.com")
+        assert len(cache.lookups) == 1
+        await asyncio.sleep(0.12)
+        await cache.resolve("speedssh.com")
+        assert len(cache.lookups) == 2
+
+        for _ in range(3):
+            try:
+                await cache.resolve("gone.example")
+                assert False, "expected gaierror"
+            except socket.gaierror:
+                pass
+        assert cache.lookups.count("gone.example") == 1
+        await asyncio.sleep(0.12)
+        cache.answers["gone.example"] = ["203.0.113.9"]
+        assert await cache.resolve("gone.example") == ["203.0.113.9"]
+        assert await cache.resolve("127.0.0.1") == ["127.0.0.1"]
+
+    asyncio.run(scenario())
+    print(f"✅ {len(cache.lookups)} lookups for 26 resolutions")
+
+def test_record_ttl_clamped():
+    """Test that record TTLs are clamped to [min_ttl, max_ttl]"""
+    print("\n🔧 Testing record TTLs...")
+
+    cache = DNSCache(min_ttl=30, max_ttl=600)
+    cache._resolver = object()
+
+    async def query(host):
+        return ["203.0.113.1"], {"short.example": 5, "long.example": 86400, "exact.example": 120}[host]
+
+    cache._query = query
+
+    async def scenario():
+        for host in ("short.example", "long.example", "exact.example"):
+            await cache.resolve(host)
+
+    now = time.monotonic()
+    asyncio.run(scenario())
+    ttls = {host: round(entry[0] - now) for host, entry in cache._cache.items()}
+    assert ttls == {"short.example": 30, "long.example": 600, "exact.example": 120}, ttls
+    print(f"✅ {ttls}")
+
+def test_connect_through_cache():
+    """Test that the client connects to cached addresses and fails fast on cached NXDOMAIN"""
+    print("\n🔧 Testing connections through the cache...")
+
+    server = LocalServer()
+    cache = CountingCache({"provider.test": ["127.0.0.1"]})
+    http = ProviderHTTP(resolver=cache, backoff_factor=0.01)
+
+    async def scenario():
+        port = await server.start()
+        try:
+            for _ in range(3):
+                response = await http.get(f"http://provider.test:{port}/create-ssh-server/sg")
+                assert response.text == "ok"
+            started = time.perf_counter()
+            for _ in range(3):
+                try:
+                    await http.get(f"http://missing.test:{port}/")
+                    assert False, "expected a connect error"
+                except httpx.ConnectError as e:
+                    assert is_dns_failure(e)
+            return time.perf_counter() - started
+        finally:
+            await http.aclose()
+            await server.stop()
+
+    elapsed = asyncio.run(scenario())
+    assert cache.lookups == ["provider.test", "missing.test"]
+    assert server.connections == 1
+    assert elapsed < 0.1, elapsed
+    print(f"✅ 3 requests over {server.connections} connection; cached NXDOMAIN failed in {elapsed * 1000:.1f} ms")
+
+def test_prewarm():
+    """Test that prewarming keeps one idle connection per origin"""
+    print("\n🔧 Testing connection prewarming...")
+
+    server = LocalServer()
+    cache = CountingCache({"provider.test": ["127.0.0.1"]})
+    http = ProviderHTTP(resolver=cache, keepalive_expiry=0.2)
+
+    async def scenario():
+        port = await server.start()
+        origin = f"http://provider.test:{port}"
+        try:
+            warmed = [await http.prewarm([origin])]
+            assert http.has_idle_connection(origin)
+            warmed.append(await http.prewarm([origin]))
+            await http.get(f"{origin}/create-ssh-server/sg")
+            connections_after_request = server.connections
+
+            await asyncio.sleep(0.25)
+            assert not http.has_idle_connection(origin)
+            # Recently used origins are rewarmed without being listed
+            warmed.append(await http.prewarm())
+            return warmed, connections_after_request
+        finally:
+            await http.aclose()
+            await server.stop()
+
+    warmed, connections_after_request = asyncio.run(scenario())
+    assert warmed == [1, 0, 1]
+    assert connections_after_request == 1 and server.connections == 2
+    assert server.requests == ["HEAD", "GET", "HEAD"]
+    print(f"✅ First request reused the prewarmed connection; {server.connections} connections total")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting DNS Cache Tests...\n")
+
+    try:
+        test_ttl_and_negative_cache()
+        test_record_ttl_clamped()
+        test_connect_through_cache()
+        test_prewarm()
+        print("\n🎉 All DNS cache tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
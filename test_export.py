@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test script for the streaming collection export
+"""
+
+import sys
+import os
+import csv
+import gzip
+import json
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import mongomock
+from bson import ObjectId
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from export import CollectionExporter, JsonlSegment
+
+def build_users(count=1000):
+    """In-memory users collection with ObjectIds spread over ~11 days"""
+    users = mongomock.MongoClient().exportdb.users
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    users.insert_many([
+        {
+            "_id": ObjectId.from_datetime(base + timedelta(minutes=16 * i)),
+            "user_id": i, "username": f"user{i}", "points": i % 50,
+            "referred_users": [i + 1], "created_at": base + timedelta(minutes=16 * i)
+        }
+        for i in range(count)
+    ])
+    return users
+
+def read_jsonl(directory):
+    rows = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".jsonl.gz"):
+            with gzip.open(os.path.join(directory, name), "rt") as f:
+                rows.extend(json.loads(line) for line in f)
+    return rows
+
+def test_jsonl_export():
+    """Test projection, segmenting and parallel partitions"""
+    print("🔧 Testing partitioned JSONL export...")
+
+    users = build_users()
+    out = tempfile.mkdtemp()
+    try:
+        exporter = CollectionExporter(users, "users", out, "jsonl", batch_size=100, segment_rows=150)
+        summary = exporter.run(partitions=4)
+        rows = read_jsonl(os.path.join(out, "users"))
+
+        assert summary["rows"] == 1000 and len(summary["partitions"]) == 4
+        assert all(count > 0 for count in summary["partitions"])
+        assert sorted(r["user_id"] for r in rows) == list(range(1000))
+        assert "referred_users" not in rows[0] and rows[0]["created_at"].startswith("2024-01-")
+        assert set(rows[0]) == {"_id"} | set(exporter.fields)
+
+        # A finished export is not repeated
+        assert exporter.run(partitions=4)["rows"] == 1000
+        print(f"✅ {summary['rows']} rows in {summary['files']} files across {len(summary['partitions'])} partitions")
+    finally:
+        shutil.rmtree(out)
+
+def test_resume():
+    """Test resuming from the checkpoint after a crash mid-segment"""
+    print("\n🔧 Testing resumable export...")
+
+    class CrashingSegment(JsonlSegment):
+        written = 0
+
+        def write(self, row):
+            CrashingSegment.written += 1
+            if CrashingSegment.written > 430:
+                raise RuntimeError("disk full")
+            super().write(row)
+
+    users = build_users()
+    out = tempfile.mkdtemp()
+    try:
+        exporter = CollectionExporter(users, "users", out, "jsonl", batch_size=64, segment_rows=100)
+        exporter.segment_class = CrashingSegment
+        try:
+            exporter.run()
+            assert False, "export should have crashed"
+        except RuntimeError:
+            pass
+        checkpoint = exporter._load_checkpoint(0)
+        assert checkpoint["rows"] == 400 and not checkpoint["done"]
+
+        exporter.segment_class = JsonlSegment
+        summary = exporter.run()
+        rows = read_jsonl(os.path.join(out, "users"))
+        assert summary["rows"] == 1000
+        assert sorted(r["user_id"] for r in rows) == list(range(1000))
+        assert not [name for name in os.listdir(os.path.join(out, "users")) if name.endswith(".tmp")]
+        print(f"✅ Resumed after {checkpoint['rows']} rows without duplicates")
+    finally:
+        shutil.rmtree(out)
+
+def test_csv_export():
+    """Test CSV output with a header per segment"""
+    print("\n🔧 Testing CSV export...")
+
+    users = build_users(250)
+    out = tempfile.mkdtemp()
+    try:
+        summary = CollectionExporter(users, "users", out, "csv", segment_rows=100).run()
+        with gzip.open(os.path.join(out, "users", "part-000-00002.csv.gz"), "rt", newline="") as f:
+            rows = list(csv.DictReader(f))
+        assert summary["files"] == 3 and len(rows) == 50
+        assert rows[0]["user_id"] == "200" and rows[0]["username"] == "user200"
+        print(f"✅ {summary['rows']} rows written as CSV")
+    finally:
+        shutil.rmtree(out)
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Export Tests...\n")
+
+    try:
+        test_jsonl_export()
+        test_resume()
+        test_csv_export()
+        print("\n🎉 All export tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
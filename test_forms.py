@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Test script for cached provider form extraction
+"""
+
+import sys
+import os
+import time
+import asyncio
+from urllib.parse import parse_qs
+
+import httpx
+from bs4 import BeautifulSoup
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from emulator import PROVIDER_FORM_PAGE, PROVIDER_SUCCESS_PAGE, ProviderEmulator
+from forms import FormCache, extract_form
+from generator import SSHGenerator
+from provider_http import ProviderHTTP
+
+# A realistic page: navigation, inline scripts and a long footer around the form
+BIG_PAGE = (
+    "<html><head>" + "<script>var x = '<div>';</script>" * 50 + "</head><body>"
+    + "<div class='nav'><a href='/'>Home</a></div>" * 300
+    + PROVIDER_FORM_PAGE.format(code="sg1", token="abc123")
+    + "<footer><p>Servers</p><ul>" + "<li><a href='/s'>Server</a></li>" * 2000 + "</ul></footer></body></html>"
+)
+
+class RotatingProvider(httpx.AsyncBaseTransport):
+    """Provider that only accepts the most recently issued CSRF token"""
+
+    def __init__(self):
+        self.token = 0
+        self.calls = []
+
+    def rotate(self):
+        self.token += 1
+
+    async def handle_async_request(self, request):
+        self.calls.append(request.method)
+        code = request.url.path.split("/")[2] if request.url.path.count("/") > 2 else "sg1"
+        if request.method == "GET":
+            self.rotate()
+            page = PROVIDER_FORM_PAGE.format(code=code, token=f"t{self.token}")
+            return httpx.Response(200, text=page)
+        form = {key: values[0] for key, values in parse_qs((await request.aread()).decode()).items()}
+        if form.get("csrf_token") != f"t{self.token}":
+            return httpx.Response(403, text="<html><body>Invalid token</body></html>")
+        return httpx.Response(200, text=PROVIDER_SUCCESS_PAGE.format(username=form["username"], host=code))
+
+def test_extract_form():
+    """Test schema extraction from a provider page"""
+    print("🔧 Testing form extraction...")
+
+    schema = extract_form(BIG_PAGE, "https://speedssh.com/create-ssh-server/sg1")
+    assert schema.action == "https://speedssh.com/create-ssh-server/sg1/submit"
+    assert schema.method == "POST"
+    assert schema.hidden == {"csrf_token": "abc123", "server_id": "sg1"}
+    assert schema.fields == ["username", "password"]
+    assert schema.form_data(username="u")["csrf_token"] == "abc123"
+    assert extract_form("<html><body>No form</body></html>", "https://x/") is None
+    assert extract_form(b"<FORM>\n<input type=hidden name=a value=1></FORM>", "https://x/p").action == "https://x/p"
+
+    rounds = 50
+    started = time.perf_counter()
+    for _ in range(rounds):
+        extract_form(BIG_PAGE, "https://speedssh.com/")
+    fast = (time.perf_counter() - started) / rounds
+    started = time.perf_counter()
+    for _ in range(5):
+        soup = BeautifulSoup(BIG_PAGE, "html.parser")
+        soup.find("form")
+        soup.find_all("input", type="hidden")
+    slow = (time.perf_counter() - started) / 5
+    assert fast < slow
+    print(f"✅ {len(BIG_PAGE) // 1024} KB page: {fast * 1000:.2f} ms vs {slow * 1000:.1f} ms with html.parser")
+
+def test_cached_schema_round_trips():
+    """Test that cached schemas skip the GET"""
+    print("\n🔧 Testing cached form schemas...")
+
+    http = ProviderHTTP()
+    emulator = ProviderEmulator(seed=1)
+    emulator.install(http)
+    ssh = SSHGenerator(http, FormCache(ttl=60))
+
+    async def scenario():
+        return [await ssh.create_account(ssh.provider("SpeedSSH")) for _ in range(5)]
+
+    configs = asyncio.run(scenario())
+    assert all(config["provider"] == "SpeedSSH" for config in configs)
+    assert emulator.requests["speedssh.com"] == 6
+    print(f"✅ 5 accounts in {emulator.requests['speedssh.com']} requests (10 without the cache)")
+
+def test_refresh_after_failed_submit():
+    """Test that a rejected submit refreshes the schema once"""
+    print("\n🔧 Testing schema refresh...")
+
+    http = ProviderHTTP()
+    provider = RotatingProvider()
+    http.mount(provider)
+    ssh = SSHGenerator(http, FormCache(ttl=60))
+
+    async def scenario():
+        first = await ssh.create_account(ssh.provider("SpeedSSH"))
+        provider.rotate()
+        second = await ssh.create_account(ssh.provider("SpeedSSH"))
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first["server"] == "sg1" and second["server"] == "sg1"
+    assert provider.calls == ["GET", "POST", "POST", "GET", "POST"]
+    assert ssh.forms.get("SpeedSSH:sg1").hidden["csrf_token"] == f"t{provider.token}"
+    print(f"✅ Stale token refreshed: {' → '.join(provider.calls)}")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Form Cache Tests...\n")
+
+    try:
+        test_extract_form()
+        test_cached_schema_round_trips()
+        test_refresh_after_failed_submit()
+        print("\n🎉 All form cache tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
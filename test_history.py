@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test script for keyset-paginated config history
+"""
+
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from history import HistoryPager, NEWER, OLDER, decode_cursor, encode_cursor
+from router import CallbackRouter, MAX_CALLBACK_BYTES
+from emulator import in_memory_database
+
+def seed(database, user_id=7, count=23):
+    """Configs with some created_at ties, like a bulk batch"""
+    base = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    database.configs.insert_many([
+        {"user_id": user_id, "config_type": "VMess" if i % 2 else "SSH", "config_data": "x" * 500,
+         "created_at": base + timedelta(minutes=i // 3)}
+        for i in range(count)
+    ])
+    database.configs.insert_one({"user_id": 99, "config_type": "SSH", "created_at": base})
+
+def walk(pager, user_id, direction, start_page):
+    page, pages = start_page, [start_page]
+    while getattr(page, direction):
+        page = pager.page(user_id, NEWER if direction == "newer" else OLDER, getattr(page, direction))
+        pages.append(page)
+    return pages
+
+def test_cursor_encoding():
+    """Test cursor round trip and callback size"""
+    print("🔧 Testing history cursors...")
+
+    database = in_memory_database("history")
+    seed(database)
+    config = database.configs.find_one({"user_id": 7})
+    token = encode_cursor(config)
+    created_at, config_id = decode_cursor(token)
+    assert config_id == config["_id"]
+    assert created_at.replace(tzinfo=None) == config["created_at"]
+
+    router = CallbackRouter()
+
+    async def handler(query, context, *args):
+        pass
+
+    router.add("history", "hi", handler, ("direction", "cursor"))
+    data = router.encode("history", OLDER, token)
+    assert len(data.encode()) <= MAX_CALLBACK_BYTES
+    for bad in ["zz", "1.nothex", ""]:
+        try:
+            decode_cursor(bad)
+            assert False, bad
+        except ValueError:
+            pass
+    print(f"✅ '{data}' ({len(data)} bytes)")
+
+def test_paging():
+    """Test walking older and back newer without gaps or duplicates"""
+    print("\n🔧 Testing keyset paging...")
+
+    database = in_memory_database("history")
+    seed(database)
+    pager = HistoryPager(database, page_size=5)
+
+    first = pager.page(7)
+    assert first.newer is None and first.older
+    assert "config_data" not in first.items[0]
+
+    older = walk(pager, 7, "older", first)
+    ids = [c["_id"] for page in older for c in page.items]
+    expected = [c["_id"] for c in database.configs.find({"user_id": 7}).sort([("created_at", -1), ("_id", -1)])]
+    assert ids == expected and len(older) == 5 and older[-1].older is None
+
+    newer = walk(pager, 7, "newer", older[-1])
+    back = [c["_id"] for page in reversed(newer) for c in page.items]
+    assert back == expected
+    assert pager.page(99).items[0]["config_type"] == "SSH" and pager.page(12345).items == []
+    print(f"✅ {len(ids)} configs over {len(older)} pages, forwards and back")
+
+def test_page_cache():
+    """Test cache hits, eviction and invalidation"""
+    print("\n🔧 Testing per-user page cache...")
+
+    database = in_memory_database("history")
+    seed(database)
+    calls = []
+    original = database.get_config_page
+
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+
+    database.get_config_page = counting
+    pager = HistoryPager(database, page_size=5, pages_per_user=2, max_users=1)
+
+    first = pager.page(7)
+    assert pager.page(7) is first and len(calls) == 1
+    second = pager.page(7, OLDER, first.older)
+    pager.page(7, OLDER, second.older)
+    pager.page(7)
+    assert len(calls) == 4
+
+    pager.page(99)
+    assert 7 not in pager._cache
+    pager.invalidate(99)
+    assert not pager._cache
+    print(f"✅ {len(calls)} queries for 6 page views")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting History Tests...\n")
+
+    try:
+        test_cursor_encoding()
+        test_paging()
+        test_page_cache()
+        print("\n🎉 All history tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test script for the offline load harness
+"""
+
+import sys
+import os
+import json
+import subprocess
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def test_percentiles():
+    """Test nearest-rank percentile helper"""
+    print("🔧 Testing percentile helper...")
+    from loadtest import percentile
+
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 95) == 0.0
+    print("✅ Percentiles computed correctly")
+
+def test_update_factory():
+    """Test synthetic update payloads"""
+    print("\n🔧 Testing update factory...")
+    from loadtest import UpdateFactory
+
+    factory = UpdateFactory(["youtube", "zoom"], seed=3)
+    command = factory.build(42, "/start")
+    callback = factory.build(42, "service_*")
+
+    assert command["message"]["entities"][0]["type"] == "bot_command"
+    assert callback["callback_query"]["data"] in ("service_youtube", "service_zoom")
+    assert callback["update_id"] == command["update_id"] + 1
+    print("✅ Command and callback updates built")
+
+def test_harness_run():
+    """Run a short offline scenario in a fresh interpreter"""
+    print("\n🔧 Running short load scenario...")
+    result = subprocess.run(
+        [sys.executable, "loadtest.py", "--users", "10", "--updates", "120",
+         "--concurrency", "8", "--provider-latency", "0", "--provider-jitter", "0", "--json"],
+        cwd=HERE, capture_output=True, text=True, timeout=300
+    )
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout)
+
+    assert report["updates"] == 120
+    assert report["throughput_per_s"] > 0
+    assert "service_*" in report["handlers"]
+    assert report["bot_api_calls"].get("getMe") == 1
+    for stats in report["handlers"].values():
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+    print(f"✅ {report['updates']} updates at {report['throughput_per_s']} updates/s")
+
+def test_soak_run():
+    """Run a very short soak and check the RSS budget verdict"""
+    print("\n🔧 Running short soak...")
+    result = subprocess.run(
+        [sys.executable, "loadtest.py", "--users", "5", "--updates", "40", "--soak-hours", "0.0005",
+         "--provider-latency", "0", "--provider-jitter", "0", "--rss-budget-mb", "200", "--json"],
+        cwd=HERE, capture_output=True, text=True, timeout=300
+    )
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout)
+
+    assert report["rounds"] >= 1
+    assert report["passed"]
+    assert report["rss_final_mb"] > 0
+    # The harness runs with RATE_LIMIT_ENABLED=false, so nothing is counted
+    assert report["containers"]["rate_limiter.requests"]["keys"] == 0
+    assert "user_data.last_config" in report["containers"]
+    print(f"✅ {report['rounds']} rounds, RSS growth {report['rss_growth_mb']} MiB")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Load Harness Tests...\n")
+
+    try:
+        test_percentiles()
+        test_update_factory()
+        test_harness_run()
+        test_soak_run()
+        print("\n🎉 All load harness tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Test script for the event loop lag monitor
+"""
+
+import sys
+import os
+import time
+import asyncio
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from loop_monitor import LoopMonitor
+from metrics import REGISTRY
+
+def blocking_call(seconds):
+    """Simulate a synchronous call blocking the event loop"""
+    time.sleep(seconds)
+
+def test_blocking_capture():
+    """Test that a blocked loop is attributed to its call site"""
+    print("🔧 Testing blocking call capture...")
+
+    async def scenario():
+        monitor = LoopMonitor(threshold=0.05, interval=0.01)
+        monitor.start()
+        for _ in range(2):
+            await asyncio.sleep(0.05)
+            blocking_call(0.2)
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+        return monitor
+
+    monitor = asyncio.run(scenario())
+    sites = monitor.top_sites()
+
+    assert not monitor.running
+    assert sites, "no blocking recorded"
+    top = sites[0]
+    assert "blocking_call" in top.site and "scenario" in top.site
+    assert top.count == 2
+    assert top.total >= 0.3
+    assert top.max >= 0.15
+    assert "blocking_call" in monitor.summary()
+    print(f"✅ {top.count} blocks, {top.total:.2f}s total at {top.site}")
+
+def test_no_false_positives():
+    """Test that an idle loop records nothing"""
+    print("\n🔧 Testing idle loop...")
+
+    async def scenario():
+        monitor = LoopMonitor(threshold=0.1, interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0.3)
+        await monitor.stop()
+        return monitor
+
+    monitor = asyncio.run(scenario())
+    assert monitor.top_sites() == []
+    assert "No blocking" in monitor.summary()
+    print("✅ Idle loop recorded no blocking")
+
+def test_metrics_exposed():
+    """Test that lag and blocking metrics are rendered"""
+    print("\n🔧 Testing loop metrics...")
+
+    text = REGISTRY.render()
+    assert "event_loop_lag_seconds_count" in text
+    assert "event_loop_blocked_total{site=" in text
+    assert "event_loop_blocked_seconds_total{site=" in text
+    print("✅ Loop lag and blocking metrics exposed")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Loop Monitor Tests...\n")
+
+    try:
+        test_blocking_capture()
+        test_no_false_positives()
+        test_metrics_exposed()
+        print("\n🎉 All loop monitor tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test script for streaming success detection in provider responses
+"""
+
+import sys
+import os
+import asyncio
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from matcher import StreamMatcher
+from provider_http import ProviderHTTP
+
+FILLER = b"<div class='row'><a href='/servers'>Servers</a></div>" * 400
+
+class ChunkedProvider(httpx.AsyncBaseTransport):
+    """Streams a page in chunks and counts how many were pulled"""
+
+    def __init__(self, body: bytes, chunk: int = 4096, status: int = 200):
+        self.body = body
+        self.chunk = chunk
+        self.status = status
+        self.sent = 0
+        self.closed = False
+
+    async def handle_async_request(self, request):
+        provider = self
+
+        class Body(httpx.AsyncByteStream):
+            async def __aiter__(self):
+                for start in range(0, len(provider.body), provider.chunk):
+                    provider.sent += 1
+                    yield provider.body[start:start + provider.chunk]
+
+            async def aclose(self):
+                provider.closed = True
+
+        return httpx.Response(self.status, stream=Body())
+
+def test_matcher():
+    """Test case folding, chunk boundaries and the first-match verdict"""
+    print("🔧 Testing stream matcher...")
+
+    matcher = StreamMatcher(["success", "created", "userX9k2"])
+    assert matcher.feed(b"<html><body>Account cre") is None
+    assert matcher.feed(b"ATED for ") == "created"
+    assert matcher.feed(b"userx9k2") == "created"
+
+    body = b"<p>" + FILLER + b"Welcome USERX9K2</p>"
+    for size in (1, 2, 7, 4096):
+        matcher = StreamMatcher(["success", "userx9k2"])
+        for start in range(0, len(body), size):
+            if matcher.feed(body[start:start + size]):
+                break
+        assert matcher.match == "userx9k2", size
+
+    matcher = StreamMatcher(["success"])
+    for start in range(0, len(FILLER), 100):
+        matcher.feed(FILLER[start:start + 100])
+    assert matcher.match is None and matcher.bytes_read == len(FILLER)
+    print("✅ Matches across 1-byte chunks, no false positives over 20 KB")
+
+def test_early_exit_and_cap():
+    """Test that reading stops at the verdict and at max_scan_bytes"""
+    print("\n🔧 Testing early exit...")
+
+    async def scenario(body, **kwargs):
+        provider = ChunkedProvider(body)
+        http = ProviderHTTP(scan_chunk_size=4096, **kwargs)
+        http.mount(provider)
+        found = await http.find("POST", "https://fastssh.com/create-ssh-server/sg",
+                                ["success", "ssh7ab"], data={"username": "ssh7ab"})
+        return found, provider
+
+    page = b"<html><body><h1>Account ssh7ab created</h1>" + FILLER * 50 + b"</body></html>"
+    found, provider = asyncio.run(scenario(page))
+    assert found == "ssh7ab"
+    assert provider.sent == 1 and provider.closed
+    total = -(-len(page) // 4096)
+
+    found, provider = asyncio.run(scenario(FILLER * 50 + b"success", max_scan_bytes=32768))
+    assert found is None
+    assert provider.sent * 4096 <= 32768 + 4096 and provider.closed
+
+    found, provider = asyncio.run(scenario(b"<p>success</p>", max_scan_bytes=4))
+    assert found is None
+
+    provider = ChunkedProvider(b"success", status=500)
+    http = ProviderHTTP(max_retries=0)
+    http.mount(provider)
+    assert asyncio.run(http.find("POST", "https://fastssh.com/", ["success"])) is None
+    assert provider.sent == 0
+    print(f"✅ Verdict after 1 of {total} chunks; capped scan stopped after {32768 // 1024} KB")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Stream Matcher Tests...\n")
+
+    try:
+        test_matcher()
+        test_early_exit_and_cap()
+        print("\n🎉 All stream matcher tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Test script for channel membership verification
+"""
+
+import sys
+import os
+import time
+import asyncio
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from telegram.error import BadRequest
+
+from membership import ApiBudget, MembershipVerifier
+
+CHANNELS = [{"id": -100, "name": "One"}, {"id": -200, "name": "Two"}]
+
+class FakeBot:
+    """get_chat_member backed by a dict of (channel, user) -> status"""
+
+    def __init__(self, statuses, delay=0.05, hang=(), missing=()):
+        self.statuses = statuses
+        self.delay = delay
+        self.hang = hang
+        self.missing = missing
+        self.calls = []
+
+    async def get_chat_member(self, chat_id, user_id):
+        self.calls.append((chat_id, user_id))
+        await asyncio.sleep(60 if chat_id in self.hang else self.delay)
+        if chat_id in self.missing:
+            raise BadRequest("Chat not found")
+        status = self.statuses.get((chat_id, user_id))
+        if status is None:
+            raise BadRequest("User not found")
+        return SimpleNamespace(status=status, is_member=status == "restricted")
+
+def build(**kwargs):
+    budget = ApiBudget(rate=1000, burst=1000)
+    return MembershipVerifier(CHANNELS, budget, **kwargs), budget
+
+def test_concurrent_checks():
+    """Test that channels are checked concurrently and results cached"""
+    print("🔧 Testing concurrent membership checks...")
+
+    verifier, budget = build()
+    bot = FakeBot({(-100, 1): "member", (-200, 1): "administrator", (-100, 2): "left"})
+
+    async def scenario():
+        started = time.perf_counter()
+        joined = await verifier.verify(bot, 1)
+        elapsed = time.perf_counter() - started
+        partial = await verifier.verify(bot, 2)
+        again = await verifier.verify(bot, 1)
+        return joined, partial, again, elapsed
+
+    joined, partial, again, elapsed = asyncio.run(scenario())
+    assert joined.joined and again.joined
+    assert elapsed < 0.09, elapsed
+    assert partial.missing == [-100, -200] and not partial.unknown
+    assert len(bot.calls) == 4 and budget.used["membership"] == 4
+    print(f"✅ Both channels checked in {elapsed * 1000:.0f} ms; repeat served from cache")
+
+def test_dedupe_and_deadline():
+    """Test shared in-flight checks and the deadline"""
+    print("\n🔧 Testing deduplication and deadline...")
+
+    verifier, _ = build(deadline=0.2)
+    bot = FakeBot({(-100, 1): "member", (-200, 1): "member"}, hang=(-200,))
+
+    async def scenario():
+        started = time.perf_counter()
+        results = await asyncio.gather(*(verifier.verify(bot, 1) for _ in range(10)))
+        return results, time.perf_counter() - started
+
+    results, elapsed = asyncio.run(scenario())
+    assert len(bot.calls) == 2
+    assert all(r.statuses == {-100: True, -200: None} for r in results)
+    assert not results[0].joined and results[0].unknown == [-200]
+    assert elapsed < 0.5
+    print(f"✅ 10 concurrent clicks → {len(bot.calls)} API calls; stalled channel gave up after {elapsed:.2f}s")
+
+def test_negative_ttl():
+    """Test that non-members are re-checked sooner than members"""
+    print("\n🔧 Testing negative TTL...")
+
+    verifier, _ = build(ttl=60, negative_ttl=0.05)
+    statuses = {(-100, 1): "restricted", (-200, 1): "left"}
+    bot = FakeBot(statuses, delay=0)
+
+    async def scenario():
+        first = await verifier.verify(bot, 1)
+        statuses[(-200, 1)] = "member"
+        cached = await verifier.verify(bot, 1)
+        await asyncio.sleep(0.06)
+        return first, cached, await verifier.verify(bot, 1)
+
+    first, cached, later = asyncio.run(scenario())
+    assert first.missing == [-200] and cached.missing == [-200]
+    assert later.joined and len(bot.calls) == 3
+    print("✅ Joined user verified after the short negative TTL")
+
+def test_missing_channel():
+    """Test that a wrong channel id is unknown, not "not joined", and is not cached"""
+    print("\n🔧 Testing misconfigured channel...")
+
+    verifier, _ = build()
+    bot = FakeBot({(-100, 1): "member", (-200, 1): "member", (-100, 2): "left"}, delay=0, missing=(-200,))
+
+    async def scenario():
+        member = await verifier.verify(bot, 1)
+        left = await verifier.verify(bot, 2)
+        again = await verifier.verify(bot, 1)
+        return member, left, again
+
+    member, left, again = asyncio.run(scenario())
+    assert member.statuses == {-100: True, -200: None} and not member.missing
+    assert left.missing == [-100] and left.unknown == [-200]
+    assert again.unknown == [-200] and bot.calls.count((-200, 1)) == 2
+    assert verifier.cached(1, -200) is None
+    print("✅ \"Chat not found\" reported as unknown and re-checked every time")
+
+def test_budget():
+    """Test token bucket throttling and accounting"""
+    print("\n🔧 Testing API budget...")
+
+    budget = ApiBudget(rate=20, burst=2)
+
+    async def scenario():
+        started = time.perf_counter()
+        for _ in range(6):
+            await budget.acquire("test")
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(scenario())
+    assert elapsed >= 0.18, elapsed
+    assert budget.used == {"test": 6}
+
+    # Interactive charges never wait but push background work back
+    for _ in range(4):
+        budget.charge("membership")
+    assert budget.available() < 0
+    # The gauge reads from the metrics thread, so reading must not refill
+    state = (budget._tokens, budget._updated)
+    budget.available()
+    assert (budget._tokens, budget._updated) == state
+
+    started = time.perf_counter()
+    asyncio.run(budget.acquire("test"))
+    waited = time.perf_counter() - started
+    assert waited >= 0.1, waited
+    print(f"✅ 6 calls at 20/s with burst 2 took {elapsed:.2f}s; background waited {waited:.2f}s behind interactive debt")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Membership Tests...\n")
+
+    try:
+        test_concurrent_checks()
+        test_dedupe_and_deadline()
+        test_negative_ttl()
+        test_missing_channel()
+        test_budget()
+        print("\n🎉 All membership tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Test script for memory diagnostics
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from memory_diagnostics import MemoryDiagnostics, deep_sizeof, rss_bytes
+from utils import RateLimiter
+
+def test_deep_sizeof():
+    """Test that nested containers are measured recursively"""
+    print("🔧 Testing deep_sizeof...")
+
+    flat = {"a": 1}
+    nested = {"a": 1, "payload": ["x" * 1000, {"inner": "y" * 1000}]}
+
+    assert deep_sizeof(nested) > deep_sizeof(flat) + 2000
+    shared = "z" * 1000
+    assert deep_sizeof([shared, shared]) < deep_sizeof([shared, "w" * 1000])
+    assert rss_bytes() > 0
+    print("✅ Nested and shared objects measured")
+
+def test_snapshot_diff_by_module():
+    """Test growth diff and per-module attribution"""
+    print("\n🔧 Testing tracemalloc diff...")
+
+    diagnostics = MemoryDiagnostics()
+    diagnostics.start()
+    try:
+        limiter = RateLimiter()
+        for user_id in range(20000):
+            limiter.is_allowed(user_id, "generate_config")
+
+        snapshot = diagnostics.snapshot()
+        modules = diagnostics.by_module(snapshot)
+        growth = diagnostics.diff(snapshot, limit=5)
+    finally:
+        diagnostics.stop()
+
+    assert set(modules) >= {"generator", "qrgen", "utils", "db", "other"}
+    assert modules["utils"] > 1_000_000
+    assert any(site.startswith("utils.py:") and size_diff > 0 for site, size_diff, size, count in growth)
+    assert not diagnostics.tracing
+    print(f"✅ utils holds {modules['utils'] / 2**20:.1f} MiB, top growth {growth[0][0]}")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Memory Diagnostics Tests...\n")
+
+    try:
+        test_deep_sizeof()
+        test_snapshot_diff_by_module()
+        print("\n🎉 All memory diagnostics tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
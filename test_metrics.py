@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test script for the metrics subsystem
+"""
+
+import sys
+import os
+import asyncio
+import urllib.request
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import Counter, Gauge, Histogram, Registry, CacheMetrics, timed_handler, start_metrics_server
+
+def test_counter_and_gauge():
+    """Test labelled counters and computed gauges"""
+    print("🔧 Testing counters and gauges...")
+    registry = Registry()
+    requests_total = Counter("test_requests_total", "Requests", ["route"], registry=registry)
+    depth = Gauge("test_depth", "Depth", registry=registry)
+
+    child = requests_total.labels("start")
+    child.inc()
+    child.inc(2)
+    assert requests_total.labels(route="start") is child
+    depth.set_function(lambda: 7)
+
+    text = registry.render()
+    assert 'test_requests_total{route="start"} 3' in text
+    assert "test_depth 7" in text
+    print("✅ Counter and gauge rendered")
+
+def test_histogram_buckets():
+    """Test cumulative histogram buckets"""
+    print("\n🔧 Testing histogram buckets...")
+    registry = Registry()
+    latency = Histogram("test_latency_seconds", "Latency", ["op"], buckets=(0.1, 1.0), registry=registry)
+    child = latency.labels("get")
+    for value in (0.05, 0.1, 0.5, 2.0):
+        child.observe(value)
+
+    text = registry.render()
+    assert 'test_latency_seconds_bucket{op="get",le="0.1"} 2' in text
+    assert 'test_latency_seconds_bucket{op="get",le="1"} 3' in text
+    assert 'test_latency_seconds_bucket{op="get",le="+Inf"} 4' in text
+    assert 'test_latency_seconds_count{op="get"} 4' in text
+    print("✅ Histogram buckets are cumulative")
+
+def test_cache_ratio():
+    """Test cache hit ratio gauge"""
+    print("\n🔧 Testing cache hit ratio...")
+    cache = CacheMetrics("test_cache")
+    cache.hit()
+    cache.hit()
+    cache.hit()
+    cache.miss()
+    assert cache.ratio() == 0.75
+    print("✅ Cache hit ratio computed")
+
+def test_timed_handler():
+    """Test handler wrapper with coroutine and None results"""
+    print("\n🔧 Testing handler timing wrapper...")
+
+    async def handler(update, context):
+        return "done"
+
+    def limited(update, context):
+        return None
+
+    assert asyncio.run(timed_handler("command", "test_ok", handler)(None, None)) == "done"
+    assert asyncio.run(timed_handler("command", "test_limited", limited)(None, None)) is None
+    print("✅ Handlers timed")
+
+def test_http_endpoint():
+    """Test the /metrics endpoint"""
+    print("\n🔧 Testing metrics endpoint...")
+    registry = Registry()
+    Counter("test_scrapes_total", "Scrapes", registry=registry).inc()
+    server = start_metrics_server("127.0.0.1", 0, registry=registry)
+    try:
+        port = server.server_address[1]
+        body = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5).read().decode()
+        assert "test_scrapes_total 1" in body
+    finally:
+        server.shutdown()
+    print("✅ Endpoint served metrics")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Metrics Tests...\n")
+
+    try:
+        test_counter_and_gauge()
+        test_histogram_buckets()
+        test_cache_ratio()
+        test_timed_handler()
+        test_http_endpoint()
+        print("\n🎉 All metrics tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -41,7 +41,7 @@ def test_mongodb_connection():
         "username": "testuser",
         "points": 10,  # Initial 10 coins
         "referrer_id": None,
-        "referred_users": [],
+        "referral_count": 0,
         "free_used": False,
         "joined_channels": False,
         "total_configs": 0,
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Test script for the Mongo-backed user_data persistence
+"""
+
+import sys
+import os
+import copy
+import asyncio
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from telegram import Update
+from telegram.ext import Application, CommandHandler
+
+from emulator import FakeBotAPIServer, in_memory_database
+from persistence import MongoPersistence
+
+class RecordingDatabase:
+    """Counts loads and records the batches handed to write_user_contexts"""
+
+    def __init__(self, database, failures: int = 0, load_failures: int = 0):
+        self.database = database
+        self.failures = failures
+        self.load_failures = load_failures
+        self.loads = 0
+        self.batches = []
+
+    def get_user_context(self, user_id):
+        self.loads += 1
+        if self.load_failures:
+            self.load_failures -= 1
+            return None
+        return self.database.get_user_context(user_id)
+
+    def write_user_contexts(self, changes):
+        self.batches.append({user_id: (dict(changed), set(removed))
+                             for user_id, (changed, removed) in changes.items()})
+        if self.failures:
+            self.failures -= 1
+            return False
+        return self.database.write_user_contexts(changes)
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+def test_lazy_load():
+    """Test that users are loaded once, on first use"""
+    print("🔧 Testing lazy per-user loading...")
+
+    database = RecordingDatabase(in_memory_database("persistence"))
+    database.user_data.insert_one({"_id": 7, "selected_service": "youtube", "last_config": "65f0c0ffee"})
+    persistence = MongoPersistence(database)
+
+    async def scenario():
+        assert await persistence.get_user_data() == {}
+        seven = {}
+        await asyncio.gather(*(persistence.refresh_user_data(7, seven) for _ in range(5)))
+        await persistence.refresh_user_data(7, seven)
+        eight = {}
+        await persistence.refresh_user_data(8, eight)
+        return seven, eight
+
+    seven, eight = asyncio.run(scenario())
+    assert seven == {"selected_service": "youtube", "last_config": "65f0c0ffee"} and eight == {}
+    assert database.loads == 2
+    print(f"✅ Nothing read at startup; {database.loads} loads for 7 refreshes of 2 users")
+
+def test_dirty_keys_and_batching():
+    """Test that only changed keys are written, all users in one bulk write"""
+    print("\n🔧 Testing dirty-key writes...")
+
+    database = RecordingDatabase(in_memory_database("persistence"))
+    database.user_data.insert_one({"_id": 1, "selected_service": "youtube", "history": ["a"]})
+    persistence = MongoPersistence(database)
+
+    async def round_of(updates):
+        # What Application.update_persistence does: a deep copy per touched user, gathered
+        await asyncio.gather(*(persistence.update_user_data(user_id, copy.deepcopy(data))
+                               for user_id, data in updates.items()))
+        await persistence.flush()
+
+    async def scenario():
+        one = {}
+        await persistence.refresh_user_data(1, one)
+        await round_of({1: one})
+        assert database.batches == []
+
+        one["selected_service"] = "netflix"
+        one["history"].append("b")
+        await round_of({1: one})
+        assert database.batches[-1] == {1: ({"selected_service": "netflix", "history": ["a", "b"]}, set())}
+
+        del one["history"]
+        one["last_config"] = "65f0c0ffee"
+        await round_of({1: one})
+        assert database.batches[-1] == {1: ({"last_config": "65f0c0ffee"}, {"history"})}
+
+        writes = len(database.batches)
+        await round_of({user_id: {"selected_service": "zoom"} for user_id in range(100, 200)})
+        assert len(database.batches) == writes + 1 and len(database.batches[-1]) == 100
+
+    asyncio.run(scenario())
+    assert database.user_data.find_one({"_id": 1}) == {"_id": 1, "selected_service": "netflix",
+                                                       "last_config": "65f0c0ffee"}
+    assert database.user_data.count_documents({"selected_service": "zoom"}) == 100
+    print("✅ Unchanged users skipped; only changed keys sent; 100 users in one bulk write")
+
+def test_failed_write_retried():
+    """Test that a failed batch is kept and merged with newer changes"""
+    print("\n🔧 Testing failed writes...")
+
+    database = RecordingDatabase(in_memory_database("persistence"), failures=1)
+    persistence = MongoPersistence(database)
+
+    async def scenario():
+        await persistence.update_user_data(5, {"selected_service": "youtube", "history": ["a"]})
+        await asyncio.sleep(0.05)
+        await persistence.update_user_data(5, {"selected_service": "netflix"})
+        await persistence.flush()
+
+    asyncio.run(scenario())
+    assert database.batches[-1] == {5: ({"selected_service": "netflix"}, {"history"})}
+    assert database.user_data.find_one({"_id": 5}) == {"_id": 5, "selected_service": "netflix"}
+    print(f"✅ Retried after a failure in {len(database.batches)} writes")
+
+def test_failed_load_retried():
+    """Test that a failed load is not cached as an empty user"""
+    print("\n🔧 Testing failed loads...")
+
+    database = RecordingDatabase(in_memory_database("persistence"), load_failures=1)
+    database.user_data.insert_one({"_id": 9, "selected_service": "youtube", "region": "sg"})
+    persistence = MongoPersistence(database)
+
+    async def scenario():
+        nine = {}
+        await persistence.refresh_user_data(9, nine)
+        assert nine == {}
+        nine["last_config"] = "65f0c0ffee"
+        await persistence.update_user_data(9, dict(nine))
+        await persistence.flush()
+        await persistence.refresh_user_data(9, nine)
+        await persistence.refresh_user_data(9, nine)
+        return nine
+
+    nine = asyncio.run(scenario())
+    assert database.loads == 2
+    assert nine == {"selected_service": "youtube", "region": "sg", "last_config": "65f0c0ffee"}
+    assert database.user_data.find_one({"_id": 9}) == {"_id": 9, "selected_service": "youtube",
+                                                       "region": "sg", "last_config": "65f0c0ffee"}
+    print("✅ Load retried on the next update; stored keys kept")
+
+def test_fingerprints_only():
+    """Test that only fingerprints, not copies of user_data, are kept"""
+    print("\n🔧 Testing memory footprint...")
+
+    persistence = MongoPersistence(in_memory_database("persistence"))
+    history = ["x" * 100] * 50
+
+    async def scenario():
+        await persistence.update_user_data(3, {"history": history, "selected_service": "zoom"})
+        await persistence.flush()
+
+    asyncio.run(scenario())
+    stored = persistence._stored[3]
+    assert set(stored) == {"history", "selected_service"}
+    assert all(isinstance(digest, bytes) and len(digest) == 8 for digest in stored.values())
+    print(f"✅ {len(stored)} keys tracked in {sum(map(len, stored.values()))} bytes")
+
+def test_compact_config_reference():
+    """Test that last_config is a resolvable reference"""
+    print("\n🔧 Testing config references...")
+
+    database = in_memory_database("persistence")
+    config = {"type": "ssh", "username": "u", "password": "p", "host": "sg1.example"}
+    config_id = database.save_config(42, "ssh", str(config))
+    assert isinstance(config_id, str) and len(config_id) == 24
+    assert database.get_config(42, config_id)["config_data"] == str(config)
+    assert database.get_config(43, config_id) is None
+    assert database.get_config(42, "not-an-id") is None
+    print(f"✅ last_config stores {len(config_id)} characters instead of a {len(str(config))}-character config")
+
+def test_survives_restart():
+    """Test user_data across two Application lifetimes"""
+    print("\n🔧 Testing restart...")
+
+    database = in_memory_database("persistence")
+    seen = []
+
+    async def pick(update, context):
+        seen.append(dict(context.user_data))
+        context.user_data["selected_service"] = context.args[0] if context.args else "youtube"
+
+    def command(update_id, text):
+        return {"update_id": update_id, "message": {
+            "message_id": update_id, "date": 0, "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": 5}],
+            "from": {"id": 31, "is_bot": False, "first_name": "Persist"},
+            "chat": {"id": 31, "type": "private"}
+        }}
+
+    async def lifetime(api, text):
+        application = (Application.builder().token("100000001:PERSISTENCE").base_url(api.base_url)
+                       .persistence(MongoPersistence(database, update_interval=3600)).build())
+        application.add_handler(CommandHandler("pick", pick))
+        async with application:
+            await application.process_update(Update.de_json(command(len(seen) + 1, text), application.bot))
+
+    async def scenario():
+        api = FakeBotAPIServer()
+        await api.start()
+        try:
+            await lifetime(api, "/pick netflix")
+            await lifetime(api, "/pick")
+        finally:
+            await api.stop()
+
+    asyncio.run(scenario())
+    assert seen == [{}, {"selected_service": "netflix"}]
+    assert database.user_data.find_one({"_id": 31})["selected_service"] == "youtube"
+    print("✅ selected_service survived a restart")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Persistence Tests...\n")
+
+    try:
+        test_lazy_load()
+        test_dirty_keys_and_batching()
+        test_failed_write_retried()
+        test_failed_load_retried()
+        test_fingerprints_only()
+        test_compact_config_reference()
+        test_survives_restart()
+        print("\n🎉 All persistence tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
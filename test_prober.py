@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Test script for the endpoint prober and latency ranking
+"""
+
+import sys
+import os
+import ssl
+import socket
+import asyncio
+import tempfile
+import datetime
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from emulator import ProviderEmulator
+from forms import FormCache
+from generator import SSHGenerator, V2RayGenerator
+from prober import EndpointProber
+from provider_http import ProviderHTTP
+from providers import load_providers
+
+def self_signed_context(directory: str) -> ssl.SSLContext:
+    """Server TLS context with a throwaway certificate for localhost"""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(x509.random_serial_number()).not_valid_before(now)
+            .not_valid_after(now + datetime.timedelta(days=1)).sign(key, hashes.SHA256()))
+    cert_path, key_path = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert_path, key_path)
+    return context
+
+def closed_port() -> int:
+    """A local port nobody listens on"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class Listener:
+    """Local TCP listener that sends ``greeting`` after ``delay`` and tracks concurrency"""
+
+    def __init__(self, greeting: bytes = b"", delay: float = 0.0, ssl_context=None):
+        self.greeting = greeting
+        self.delay = delay
+        self.ssl_context = ssl_context
+        self.active = 0
+        self.peak = 0
+
+    async def handle(self, reader, writer):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            writer.write(self.greeting)
+            await writer.drain()
+            await reader.read(1)
+        except (ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            self.active -= 1
+            writer.close()
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0, ssl=self.ssl_context)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+
+def record(prober, host, port, latency=None, down=False):
+    """Register an endpoint with a known health state"""
+    prober.add(host, port)
+    health = prober.health(host, port)
+    health.checked = 1.0
+    health.rtt = latency
+    health.failures = prober.unhealthy_after if down else 0
+
+def test_probe_kinds():
+    """Test TCP, TLS and SSH-banner probes against local listeners"""
+    print("🔧 Testing probes...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        tls_context = self_signed_context(directory)
+
+        async def scenario():
+            ssh, http, tls = Listener(b"SSH-2.0-OpenSSH_9.6\r\n"), Listener(b"HTTP/1.1 200 OK\r\n"), \
+                Listener(ssl_context=tls_context)
+            ports = [await ssh.start(), await http.start(), await tls.start(), closed_port()]
+            prober = EndpointProber(connect_timeout=1, handshake_timeout=1, unhealthy_after=2)
+            prober.add("127.0.0.1", ports[0], kind="ssh")
+            prober.add("127.0.0.1", ports[1], kind="ssh")
+            prober.add("localhost", ports[2], kind="v2ray", tls=True)
+            prober.add("127.0.0.1", ports[3])
+            try:
+                first = await prober.probe_all()
+                second = await prober.probe_all()
+            finally:
+                for listener in (ssh, http, tls):
+                    await listener.stop()
+            return prober, ports, first, second
+
+        prober, ports, first, second = asyncio.run(scenario())
+
+    assert list(first.values()) == [True, False, True, False]
+    assert prober.is_healthy("127.0.0.1", ports[0]) is True
+    assert prober.health("localhost", ports[2]).handshake > 0
+    # One failure without a success is not a verdict; the second one is
+    assert list(second.values()) == [True, False, True, False]
+    assert prober.is_healthy("127.0.0.1", ports[1]) is False
+    assert prober.is_healthy("127.0.0.1", ports[3]) is False
+    assert "banner" in prober.health("127.0.0.1", ports[1]).error
+    tls = prober.health("localhost", ports[2])
+    print(f"✅ SSH banner ok, HTTP rejected, TLS handshake {tls.handshake * 1000:.2f} ms, closed port down")
+
+def test_concurrency_limit():
+    """Test that probes respect the concurrency setting"""
+    print("\n🔧 Testing probe concurrency...")
+
+    async def scenario():
+        listener = Listener(b"SSH-2.0-test\r\n", delay=0.05)
+        port = await listener.start()
+        prober = EndpointProber(concurrency=4)
+        targets = [("127.0.0.1", port)] * 12
+        prober.add("127.0.0.1", port, kind="ssh")
+        started = asyncio.get_running_loop().time()
+        try:
+            results = await prober.probe_all(targets)
+        finally:
+            await listener.stop()
+        return listener.peak, asyncio.get_running_loop().time() - started, results
+
+    peak, elapsed, results = asyncio.run(scenario())
+    assert peak == 4 and elapsed >= 0.15 and all(results.values())
+    print(f"✅ 12 probes, at most {peak} in flight, {elapsed:.2f}s")
+
+def test_ranking():
+    """Test that generators hand out the fastest healthy endpoint"""
+    print("\n🔧 Testing latency ranking...")
+
+    prober = EndpointProber()
+    v2ray = V2RayGenerator(prober)
+    servers = v2ray.servers_by_priority()
+    assert [s["priority"] for s in servers] == [1, 2, 3, 4, 5]
+
+    record(prober, "cf.090227.xyz", "443", down=True)
+    record(prober, "discord.com", "443", latency=0.120)
+    record(prober, "www.speedtest.net", "443", latency=0.180)
+    record(prober, "fast.com", "443", latency=0.035)
+    ranked = [s["add"] for s in v2ray.servers_by_priority()]
+    assert ranked == ["fast.com", "discord.com", "www.speedtest.net", "www.google.com", "cf.090227.xyz"], ranked
+    assert v2ray.create_optimized_vmess("youtube")["server"] == "fast.com"
+
+    http = ProviderHTTP()
+    ProviderEmulator(seed=1).install(http)
+    ssh = SSHGenerator(http, FormCache(ttl=60), load_providers([
+        {"name": "Local", "url": "https://local.example/{server}", "servers": ["a", "b", "c"],
+         "host": "{server}.local.example"}
+    ]), prober)
+    assert ("a.local.example", 22) in prober.endpoints
+    record(prober, "a.local.example", 22, down=True)
+    record(prober, "c.local.example", 22, latency=0.05)
+    config = asyncio.run(ssh.generate_ssh_config())
+    assert config["server"] == "c", config["server"]
+    print(f"✅ VMess on {ranked[0]}, SSH on {config['host']} (a is down, b unprobed)")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Endpoint Prober Tests...\n")
+
+    try:
+        test_probe_kinds()
+        test_concurrency_limit()
+        test_ranking()
+        print("\n🎉 All endpoint prober tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
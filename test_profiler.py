@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test script for the on-demand sampling profiler
+"""
+
+import sys
+import os
+import time
+import asyncio
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from profiler import SamplingProfiler
+
+def blocking_work(seconds):
+    """Simulate a synchronous call blocking the event loop"""
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+async def waiting_on_provider():
+    """Simulate a handler awaiting a slow provider"""
+    await asyncio.sleep(1)
+
+def test_profile_attribution():
+    """Test thread and await-chain attribution"""
+    print("🔧 Testing sampling profiler...")
+
+    async def scenario():
+        profiler = SamplingProfiler(interval=0.002)
+        waiter = asyncio.create_task(waiting_on_provider())
+
+        async def blocker():
+            await asyncio.sleep(0.05)
+            blocking_work(0.15)
+
+        blocked = asyncio.create_task(blocker())
+        result = await profiler.profile(0.4)
+        await blocked
+        waiter.cancel()
+        return result
+
+    result = asyncio.run(scenario())
+    collapsed = result.collapsed()
+
+    assert result.samples > 10
+    assert any("blocking_work" in line and line.startswith("thread;") for line in collapsed.splitlines())
+    assert any("waiting_on_provider" in line and line.startswith("task;") for line in collapsed.splitlines())
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed.splitlines())
+    print(f"✅ {result.samples} samples, blocking and awaiting code attributed")
+    print(result.summary(3))
+
+def test_single_run():
+    """Test that only one profiling run may be active"""
+    print("\n🔧 Testing concurrent run guard...")
+
+    async def scenario():
+        profiler = SamplingProfiler(interval=0.01)
+        first = asyncio.create_task(profiler.profile(0.1))
+        await asyncio.sleep(0.02)
+        try:
+            await profiler.profile(0.1)
+            return False
+        except RuntimeError:
+            await first
+            return True
+
+    assert asyncio.run(scenario())
+    print("✅ Second run rejected while the first is active")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Profiler Tests...\n")
+
+    try:
+        test_profile_attribution()
+        test_single_run()
+        print("\n🎉 All profiler tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Test script for the async provider HTTP client
+"""
+
+import sys
+import os
+import time
+import asyncio
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from emulator import ProviderEmulator
+from generator import SSHGenerator
+from provider_http import ProviderHTTP
+
+class ScriptedTransport(httpx.AsyncBaseTransport):
+    """Answers with a scripted sequence of statuses or exceptions"""
+
+    def __init__(self, *script, headers=None):
+        self.script = list(script)
+        self.headers = headers or {}
+        self.calls = []
+
+    async def handle_async_request(self, request):
+        self.calls.append(request.method)
+        step = self.script.pop(0) if len(self.script) > 1 else self.script[0]
+        if isinstance(step, Exception):
+            raise step
+        if isinstance(step, float):
+            await asyncio.sleep(step)
+            step = 200
+        return httpx.Response(step, headers=self.headers, text="ok")
+
+def client(transport, **kwargs):
+    http = ProviderHTTP(backoff_factor=0.01, **kwargs)
+    http.mount(transport)
+    return http
+
+def test_retries():
+    """Test which failures are retried for GET and POST"""
+    print("🔧 Testing retry policy...")
+
+    async def scenario():
+        results = {}
+        transport = ScriptedTransport(503, 502, 200)
+        results["get"] = ((await client(transport).get("https://speedssh.com/")).status_code, len(transport.calls))
+
+        transport = ScriptedTransport(503, 200)
+        results["post_5xx"] = ((await client(transport).post("https://speedssh.com/", data={"a": "1"})).status_code,
+                               len(transport.calls))
+
+        transport = ScriptedTransport(429, 200, headers={"Retry-After": "0.05"})
+        started = time.perf_counter()
+        status = (await client(transport).post("https://speedssh.com/")).status_code
+        results["post_429"] = (status, len(transport.calls), time.perf_counter() - started)
+
+        transport = ScriptedTransport(httpx.ConnectError("refused"), 200)
+        results["post_connect"] = ((await client(transport).post("https://speedssh.com/")).status_code,
+                                   len(transport.calls))
+
+        transport = ScriptedTransport(httpx.ReadError("reset"), 200)
+        try:
+            await client(transport).post("https://speedssh.com/")
+            results["post_read"] = "no error"
+        except httpx.ReadError:
+            results["post_read"] = len(transport.calls)
+
+        transport = ScriptedTransport(500)
+        results["exhausted"] = ((await client(transport, max_retries=2).get("https://speedssh.com/")).status_code,
+                                len(transport.calls))
+        return results
+
+    results = asyncio.run(scenario())
+    assert results["get"] == (200, 3)
+    assert results["post_5xx"] == (503, 1)
+    assert results["post_429"][:2] == (200, 2) and results["post_429"][2] >= 0.05
+    assert results["post_connect"] == (200, 2)
+    assert results["post_read"] == 1
+    assert results["exhausted"] == (500, 3)
+    print(f"✅ {results}")
+
+def test_timeouts():
+    """Test split timeouts and the total deadline"""
+    print("\n🔧 Testing timeouts...")
+
+    http = ProviderHTTP(connect_timeout=2, read_timeout=7, total_timeout=0.1)
+    assert (http.timeout.connect, http.timeout.read) == (2, 7)
+    transport = ScriptedTransport(1.0)
+    http.mount(transport)
+
+    async def scenario():
+        started = time.perf_counter()
+        try:
+            await http.get("https://fastssh.com/")
+        except TimeoutError:
+            return time.perf_counter() - started
+
+    elapsed = asyncio.run(scenario())
+    assert elapsed is not None and elapsed < 0.5
+    print(f"✅ Request abandoned after {elapsed:.2f}s")
+
+def test_connection_reuse():
+    """Test keep-alive reuse against a local HTTP/1.1 server"""
+    print("\n🔧 Testing keep-alive pooling...")
+
+    connections = []
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        try:
+            while await reader.readline():
+                while (await reader.readline()) not in (b"\r\n", b""):
+                    pass
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def scenario():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        http = ProviderHTTP()
+        try:
+            for _ in range(10):
+                await http.get(f"http://127.0.0.1:{port}/create-ssh-server/sg")
+            await asyncio.gather(*(http.get(f"http://127.0.0.1:{port}/") for _ in range(5)))
+        finally:
+            await http.aclose()
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(scenario())
+    assert len(connections) <= 5, len(connections)
+    print(f"✅ 15 requests over {len(connections)} connections")
+
+def test_generator_with_emulator():
+    """Test SSH account creation through the emulator transport"""
+    print("\n🔧 Testing SSH generation over the async client...")
+
+    http = ProviderHTTP()
+    emulator = ProviderEmulator(latency=0.05, seed=1)
+    emulator.install(http)
+    ssh = SSHGenerator(http)
+
+    async def scenario():
+        started = time.perf_counter()
+        configs = await asyncio.gather(*(ssh.generate_ssh_config() for _ in range(10)))
+        return configs, time.perf_counter() - started
+
+    configs, elapsed = asyncio.run(scenario())
+    assert all(config["provider"] == "SpeedSSH" for config in configs)
+    # Generations beyond SpeedSSH's concurrency wait for a slot and then reuse the cached form
+    running = ssh.provider("SpeedSSH").concurrency
+    assert emulator.requests["speedssh.com"] == 2 * running + (10 - running)
+    # Ten generations of two requests each overlap instead of queueing
+    assert elapsed < 0.5, elapsed
+    print(f"✅ 10 concurrent accounts in {elapsed:.2f}s")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Provider HTTP Tests...\n")
+
+    try:
+        test_retries()
+        test_timeouts()
+        test_connection_reuse()
+        test_generator_with_emulator()
+        print("\n🎉 All provider HTTP tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
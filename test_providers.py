@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Test script for the declarative SSH provider engine
+"""
+
+import sys
+import os
+import time
+import asyncio
+from collections import Counter
+from datetime import datetime
+from urllib.parse import parse_qs
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from forms import FormCache
+from generator import SSHGenerator
+from provider_http import ProviderHTTP
+from providers import load_providers
+
+class RecordingProvider(httpx.AsyncBaseTransport):
+    """Accepts every POST on hosts not listed in ``down``; tracks concurrency per host"""
+
+    def __init__(self, latency=0.02, down=()):
+        self.latency = latency
+        self.down = set(down)
+        self.active = Counter()
+        self.peak = Counter()
+        self.posts = []
+
+    async def handle_async_request(self, request):
+        host = request.url.host
+        self.active[host] += 1
+        self.peak[host] = max(self.peak[host], self.active[host])
+        try:
+            await asyncio.sleep(self.latency)
+            if host in self.down:
+                return httpx.Response(503, text="<h1>Service Unavailable</h1>")
+            form = {key: values[0] for key, values in parse_qs((await request.aread()).decode()).items()}
+            self.posts.append((str(request.url), form))
+            return httpx.Response(200, text=f"<p>Account {form.get('user', form.get('username'))} is ready</p>")
+        finally:
+            self.active[host] -= 1
+
+def generator(transport, entries):
+    http = ProviderHTTP(max_retries=0)
+    http.mount(transport)
+    return SSHGenerator(http, FormCache(ttl=60), load_providers(entries))
+
+def test_config_only_provider():
+    """Test that a provider declared in config works without code"""
+    print("🔧 Testing a config-only provider...")
+
+    transport = RecordingProvider()
+    ssh = generator(transport, [{
+        "name": "NewSSH",
+        "url": "https://newssh.example/api/{server}/create",
+        "servers": ["jp", {"code": "in", "host": "mumbai.newssh.example", "port": 443}],
+        "host": "{server}.newssh.example",
+        "fields": {"username": "user", "password": "pass"},
+        "success": ["ready"],
+        "ttl_days": 3
+    }])
+    transport.down.add("newssh.example")
+    assert asyncio.run(ssh.generate_ssh_config())["provider"] == "Demo"
+
+    transport.down.clear()
+    config = asyncio.run(ssh.generate_ssh_config())
+    assert (config["provider"], config["server"], config["host"]) == ("NewSSH", "jp", "jp.newssh.example")
+    url, form = transport.posts[-1]
+    assert url == "https://newssh.example/api/jp/create"
+    assert form == {"user": config["username"], "pass": config["password"], "server": "jp"}
+    lifetime = datetime.fromisoformat(config["expires_at"]) - datetime.fromisoformat(config["created_at"])
+    assert lifetime.days == 3
+    assert ssh.provider("NewSSH").servers[1] == {"code": "in", "host": "mumbai.newssh.example", "port": 443,
+                                                 "region": "in"}
+    print(f"✅ {config['provider']} {config['host']} from config alone")
+
+def test_fallback_and_bad_entries():
+    """Test provider order, fallback and skipped config entries"""
+    print("\n🔧 Testing fallback...")
+
+    transport = RecordingProvider(down={"first.example"})
+    ssh = generator(transport, [
+        {"name": "First", "url": "https://first.example/{server}", "servers": ["a", "b"]},
+        {"name": "Broken", "url": "https://broken.example/{server}", "servers": ["a"], "form": "ajax"},
+        {"name": "Second", "url": "https://second.example/{server}", "servers": ["x"], "success": ["ready"]},
+        {"name": "Off", "url": "https://off.example/{server}", "servers": ["x"], "active": False}
+    ])
+    assert [provider.name for provider in ssh.providers] == ["First", "Second", "Off"]
+    config = asyncio.run(ssh.generate_ssh_config())
+    assert config["provider"] == "Second"
+    assert {url for url, _ in transport.posts} == {"https://second.example/x"}
+    print(f"✅ Fell back to {config['provider']} after both First servers failed")
+
+def test_concurrency_and_budget():
+    """Test the per-provider semaphore and request budget"""
+    print("\n🔧 Testing per-provider limits...")
+
+    transport = RecordingProvider(latency=0.05)
+    ssh = generator(transport, [
+        {"name": "Narrow", "url": "https://narrow.example/{server}", "servers": ["a"],
+         "success": ["ready"], "concurrency": 2, "rate": 1000, "burst": 1000},
+        {"name": "Metered", "url": "https://metered.example/{server}", "servers": ["a"],
+         "success": ["ready"], "concurrency": 10, "rate": 20, "burst": 2}
+    ])
+    narrow, metered = ssh.providers
+
+    async def scenario():
+        started = time.perf_counter()
+        await asyncio.gather(*(ssh.create_account(narrow) for _ in range(6)))
+        narrow_elapsed = time.perf_counter() - started
+        started = time.perf_counter()
+        configs = await asyncio.gather(*(ssh.create_account(metered) for _ in range(6)))
+        return narrow_elapsed, time.perf_counter() - started, configs
+
+    narrow_elapsed, metered_elapsed, configs = asyncio.run(scenario())
+    assert transport.peak["narrow.example"] == 2
+    assert narrow_elapsed >= 0.15
+    assert all(config["provider"] == "Metered" for config in configs)
+    # Two requests from the burst, then one every 50 ms
+    assert metered_elapsed >= 0.2, metered_elapsed
+    assert metered.budget.used == {"Metered": 6}
+    print(f"✅ Narrow peaked at {transport.peak['narrow.example']} in flight; "
+          f"Metered spread 6 requests over {metered_elapsed:.2f}s")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Provider Engine Tests...\n")
+
+    try:
+        test_config_only_provider()
+        test_fallback_and_bad_entries()
+        test_concurrency_and_budget()
+        print("\n🎉 All provider engine tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
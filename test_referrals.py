@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test script for the referrals collection and leaderboard
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import POINTS_CONFIG
+from emulator import in_memory_database
+
+def test_add_referral():
+    """Test insert-or-fail duplicate detection and the referral counter"""
+    print("🔧 Testing referral inserts...")
+
+    database = in_memory_database("referrals")
+    database.add_user(1, "alice")
+    assert database.add_user(2, "bob", referrer_id=1)
+    assert not database.add_referral(1, 2)
+    assert not database.add_referral(404, 2)
+    assert database.referrals.count_documents({"referrer_id": 404}) == 0
+
+    alice = database.get_user(1)
+    assert alice["referral_count"] == 1
+    assert alice["points"] == POINTS_CONFIG["initial_coins"] + POINTS_CONFIG["referral"]
+    assert "referred_users" not in alice
+    print("✅ Duplicates and unknown referrers rejected without touching the user document")
+
+def test_leaderboard():
+    """Test top referrers ordering"""
+    print("\n🔧 Testing leaderboard...")
+
+    database = in_memory_database("referrals")
+    for user_id in range(1, 6):
+        database.add_user(user_id, f"user{user_id}")
+    for referred_id in range(100, 110):
+        database.add_referral(3, referred_id)
+    for referred_id in range(200, 204):
+        database.add_referral(5, referred_id)
+    database.add_referral(1, 300)
+
+    top = database.get_top_referrers(2)
+    assert [(u["user_id"], u["referral_count"]) for u in top] == [(3, 10), (5, 4)]
+    assert len(database.get_top_referrers()) == 3
+    print(f"✅ Leader: {top[0]['username']} with {top[0]['referral_count']} referrals")
+
+def test_migration():
+    """Test moving legacy referred_users arrays into the collection"""
+    print("\n🔧 Testing legacy migration...")
+
+    database = in_memory_database("referrals")
+    database.users.insert_many([
+        {"user_id": 1, "points": 0, "referred_users": [10, 11, 11]},
+        {"user_id": 2, "points": 0, "referred_users": []},
+        {"user_id": 3, "points": 0, "referral_count": 0}
+    ])
+    database.referrals.insert_one({"referrer_id": 1, "referred_id": 10})
+
+    assert database.migrate_referrals(batch_size=1) == 2
+    assert database.migrate_referrals() == 0
+    assert database.get_user(1)["referral_count"] == 2
+    assert database.users.count_documents({"referred_users": {"$exists": True}}) == 0
+    assert database.referrals.count_documents({"referrer_id": 1}) == 2
+    assert not database.add_referral(1, 11)
+    print("✅ Legacy arrays migrated once, duplicates skipped")
+
+def test_failed_migration_retried():
+    """Test that a failed referral migration leaves the schema version unset"""
+    print("\n🔧 Testing failed migration...")
+
+    database = in_memory_database("referrals")
+    database.stats.delete_one({"_id": "schema"})  # A database from before the schema version
+    database.users.insert_many([
+        {"user_id": user_id, "points": 0, "referred_users": [user_id * 10, user_id * 10 + 1]}
+        for user_id in range(1, 4)
+    ])
+
+    def unavailable(*args, **kwargs):
+        raise ConnectionError("primary stepped down")
+    database.referrals.insert_many = unavailable
+    try:
+        database.migrate()
+        assert False, "migration failure was swallowed"
+    except ConnectionError:
+        pass
+    assert database.stats.find_one({"_id": "schema"}) is None
+    assert database.users.count_documents({"referred_users": {"$exists": True}}) == 3
+
+    del database.referrals.insert_many
+    assert database.migrate() is True
+    assert database.referrals.count_documents({}) == 6
+    assert database.users.count_documents({"referred_users": {"$exists": True}}) == 0
+    assert database.migrate() is False
+    print("✅ Schema version recorded only after the retried migration completed")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Referral Tests...\n")
+
+    try:
+        test_add_referral()
+        test_leaderboard()
+        test_migration()
+        test_failed_migration_retried()
+        print("\n🎉 All referral tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
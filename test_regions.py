@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Test script for per-user SSH region selection
+"""
+
+import sys
+import os
+import time
+import asyncio
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from emulator import ProviderEmulator, in_memory_database
+from forms import FormCache
+from generator import SSHGenerator
+from prober import EndpointProber
+from provider_http import ProviderHTTP
+from providers import load_providers
+from regions import RegionSelector
+
+PROVIDERS = [
+    {"name": "Alpha", "url": "https://alpha.example/{server}", "servers": ["sg1", "us1", "de1"],
+     "host": "{server}.alpha.example"},
+    {"name": "Beta", "url": "https://beta.example/{server}", "servers": ["sg", "fr"],
+     "host": "{server}.beta.example"}
+]
+REGIONS = {"sg": "Singapore", "us": "United States", "de": "Germany", "fr": "France"}
+
+def regions_database():
+    """In-memory database with five users"""
+    database = in_memory_database("regions")
+    database.users.insert_many([{"user_id": user_id, "points": 5} for user_id in range(1, 6)])
+    return database
+
+class CountingDatabase:
+    """Counts profile reads of a wrapped Database"""
+
+    def __init__(self, database):
+        self.database = database
+        self.reads = 0
+
+    def get_region_profile(self, user_id):
+        self.reads += 1
+        return self.database.get_region_profile(user_id)
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+def record(prober, host, latency=None, down=False):
+    prober.add(host, 22)
+    health = prober.health(host, 22)
+    health.checked = 1.0
+    health.rtt = latency
+    health.failures = prober.unhealthy_after if down else 0
+
+def selector(database, prober, **kwargs):
+    return RegionSelector(database, REGIONS, {"en": "us", "en-gb": "de", "si": "sg", "fr": "fr"},
+                          load_providers(PROVIDERS), prober, **kwargs)
+
+def test_preferred_signals():
+    """Test choice > history > language > none"""
+    print("🔧 Testing region signals...")
+
+    regions = selector(None, EndpointProber())
+    assert regions.preferred({"region": "fr", "region_successes": {"sg": 9}}, "en") == ("fr", "choice")
+    assert regions.preferred({"region_successes": {"sg": 2, "de": 5, "xx": 9}}, "en") == ("de", "history")
+    assert regions.preferred({}, "en-GB") == ("de", "language")
+    assert regions.preferred({}, "si") == ("sg", "language")
+    assert regions.preferred({"region": "mars"}, "ja") == (None, "none")
+    print("✅ Explicit choice, then past successes, then language_code")
+
+def test_rank_by_health():
+    """Test that the preferred region leads unless it is down, others follow by latency"""
+    print("\n🔧 Testing health ranking...")
+
+    prober = EndpointProber()
+    regions = selector(None, prober)
+    assert regions.rank("fr") == ["fr", "sg", "us", "de"]
+
+    record(prober, "sg1.alpha.example", latency=0.200)
+    record(prober, "sg.beta.example", latency=0.150)
+    record(prober, "us1.alpha.example", latency=0.090)
+    record(prober, "de1.alpha.example", down=True)
+    record(prober, "fr.beta.example", latency=0.300)
+    assert regions.rank(None) == ["us", "sg", "fr", "de"]
+    assert regions.rank("fr") == ["fr", "us", "sg", "de"]
+    assert regions.rank("de") == ["us", "sg", "fr", "de"]
+    print(f"✅ {regions.rank('fr')} for a French user, {regions.rank('de')} while Germany is down")
+
+def test_cached_per_user():
+    """Test that orders are cached and updated in place"""
+    print("\n🔧 Testing per-user cache...")
+
+    database = CountingDatabase(regions_database())
+    regions = selector(database, EndpointProber(), ttl=0.2)
+
+    async def scenario():
+        orders = [await regions.order(1, "si") for _ in range(100)]
+        assert database.reads == 1 and orders[-1][0] == "sg"
+
+        assert await regions.choose(1, "fr")
+        assert (await regions.order(1, "si"))[0] == "fr" and database.reads == 1
+        assert not await regions.choose(1, "mars")
+
+        await regions.choose(2, None)
+        for _ in range(3):
+            await regions.record_success(2, "de")
+        assert (await regions.order(2, "si"))[0] == "de" and database.reads == 2
+
+        await asyncio.sleep(0.25)
+        assert (await regions.order(1, "en"))[0] == "fr" and database.reads == 3
+
+    asyncio.run(scenario())
+    stored = database.users.find_one({"user_id": 2})
+    assert stored["region_successes"] == {"de": 3} and "region" not in stored
+    assert database.users.find_one({"user_id": 1})["region"] == "fr"
+
+    started = time.perf_counter()
+
+    async def hot_path():
+        for _ in range(10000):
+            await regions.order(1)
+
+    asyncio.run(hot_path())
+    per_call = (time.perf_counter() - started) / 10000
+    print(f"✅ {database.reads} profile reads; cached order in {per_call * 1e6:.1f} µs")
+
+def test_plan_across_providers():
+    """Test that the region order spans providers"""
+    print("\n🔧 Testing generation plan...")
+
+    prober = EndpointProber()
+    http = ProviderHTTP()
+    ProviderEmulator(seed=1).install(http)
+    ssh = SSHGenerator(http, FormCache(ttl=60), load_providers(PROVIDERS), prober)
+
+    def describe(plan):
+        return [(provider.name, [server["code"] for server in servers]) for provider, servers in plan]
+
+    assert describe(ssh.plan()) == [("Alpha", ["sg1", "us1", "de1"]), ("Beta", ["sg", "fr"])]
+    record(prober, "sg.beta.example", down=True)
+    assert describe(ssh.plan(["fr", "sg", "us", "de"])) == [
+        ("Beta", ["fr"]), ("Alpha", ["sg1", "us1", "de1"]), ("Beta", ["sg"])
+    ]
+    config = asyncio.run(ssh.generate_ssh_config(["fr", "sg", "us", "de"]))
+    assert (config["provider"], config["region"]) == ("Beta", "fr")
+    print(f"✅ French user got {config['host']} before any Alpha server was tried")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Region Selection Tests...\n")
+
+    try:
+        test_preferred_signals()
+        test_rank_by_health()
+        test_cached_per_user()
+        test_plan_across_providers()
+        print("\n🎉 All region selection tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Test script for periodic channel membership re-verification
+"""
+
+import sys
+import os
+import time
+import asyncio
+from types import SimpleNamespace
+
+from telegram import Bot
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from emulator import FakeBotAPIServer, in_memory_database
+from membership import ApiBudget, MembershipVerifier
+from reverify import JOB_NAME, MembershipReverifier
+
+CHANNELS = [{"id": -100, "name": "One"}, {"id": -200, "name": "Two"}]
+
+def seed(database, count=50):
+    database.users.insert_many([
+        {"user_id": user_id, "points": 5, "joined_channels": user_id % 3 != 0, "channel_reward_claimed": True}
+        for user_id in range(1, count + 1)
+    ])
+
+def build(database, budget=None, **kwargs):
+    budget = budget or ApiBudget(rate=10000, burst=10000)
+    verifier = MembershipVerifier(CHANNELS, budget)
+    return MembershipReverifier(database, verifier, **kwargs), budget
+
+class Members:
+    """get_chat_member that reports everyone as a member"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def get_chat_member(self, chat_id, user_id):
+        self.calls.append(user_id)
+        return SimpleNamespace(status="member")
+
+class FlakyDatabase:
+    """Fails the second checkpoint save, like a crash mid-pass"""
+
+    def __init__(self, database):
+        self.database = database
+        self.saves = 0
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+    def save_job_state(self, job, state):
+        self.saves += 1
+        if self.saves == 2:
+            raise RuntimeError("connection lost")
+        return self.database.save_job_state(job, state)
+
+def test_leavers_marked():
+    """Test a full pass against the fake Bot API server"""
+    print("🔧 Testing re-verification pass...")
+
+    database = in_memory_database("reverify")
+    seed(database)
+    left = {4, 10, 22, 49}
+    reverifier, budget = build(database, batch_size=7, concurrency=4)
+
+    async def scenario():
+        server = FakeBotAPIServer(left_users=left)
+        await server.start()
+        try:
+            async with Bot("123:TEST", base_url=server.base_url) as bot:
+                return await reverifier.run(bot), server.calls["getChatMember"]
+        finally:
+            await server.stop()
+
+    progress, calls = asyncio.run(scenario())
+    joined = {u["user_id"] for u in database.users.find({"joined_channels": True})}
+    assert progress.checked == 34 and progress.left == 4 and progress.unknown == 0
+    assert not joined & left and len(joined) == 30
+    assert all("channels_left_at" in u for u in database.users.find({"user_id": {"$in": list(left)}}))
+    # Leavers stop at the first channel
+    assert calls == 30 * 2 + 4 and budget.used["reverify"] == calls
+    assert database.get_job_state(JOB_NAME)["done"]
+    print(f"✅ {progress.text()} with {calls} getChatMember calls")
+
+def test_resume():
+    """Test resuming from the checkpoint after an interrupted pass"""
+    print("\n🔧 Testing checkpoint and resume...")
+
+    database = in_memory_database("reverify")
+    seed(database)
+
+    bot = Members()
+    reverifier, _ = build(FlakyDatabase(database), batch_size=10)
+    try:
+        asyncio.run(reverifier.run(bot))
+        assert False, "expected the interrupted pass to fail"
+    except RuntimeError:
+        pass
+    state = database.get_job_state(JOB_NAME)
+    assert state["checked"] == 10 and not state["done"]
+
+    reverifier, _ = build(database, batch_size=10)
+    progress = asyncio.run(reverifier.run(bot))
+    assert progress.checked == 34
+    # Batch 2 ran twice (its checkpoint was lost); nothing else was repeated
+    assert len(bot.calls) == (34 + 10) * 2
+    print(f"✅ Resumed after {state['checked']} users; pass finished with {progress.checked}")
+
+def test_background_throttle():
+    """Test that re-verification waits behind interactive traffic"""
+    print("\n🔧 Testing budget throttling...")
+
+    database = in_memory_database("reverify")
+    seed(database, count=30)
+    budget = ApiBudget(rate=200, burst=20, reserve=10)
+    reverifier, _ = build(database, budget, concurrency=8)
+
+    async def scenario():
+        job = asyncio.ensure_future(reverifier.run(Members()))
+        interactive = []
+        for _ in range(20):
+            started = time.perf_counter()
+            budget.charge("membership")
+            interactive.append(time.perf_counter() - started)
+            await asyncio.sleep(0.005)
+        started = time.perf_counter()
+        await job
+        return interactive, time.perf_counter() - started
+
+    interactive, remaining = asyncio.run(scenario())
+    assert max(interactive) < 0.001
+    assert budget.used["reverify"] == 40 and budget.used["membership"] == 20
+    # 40 background calls at 200/s, leaving 10 tokens of headroom
+    assert remaining > 0.1, remaining
+    print(f"✅ Interactive charges never waited; background finished {remaining:.2f}s later")
+
+def test_send_traffic_delays_pass():
+    """Test that outbound sends through the bot's transport slow a pass down"""
+    print("\n🔧 Testing throttling behind send traffic...")
+
+    from bot import TracedHTTPXRequest
+
+    async def timed_pass(sends):
+        database = in_memory_database("reverify")
+        seed(database, count=30)
+        budget = ApiBudget(rate=100, burst=10, reserve=5)
+        reverifier, _ = build(database, budget, concurrency=4)
+        server = FakeBotAPIServer()
+        await server.start()
+        try:
+            async with Bot("123:TEST", base_url=server.base_url,
+                           request=TracedHTTPXRequest(budget=budget)) as bot:
+                async def traffic():
+                    for _ in range(sends):
+                        await bot.send_message(chat_id=1, text="hi")
+                        await asyncio.sleep(0.01)
+
+                started = time.perf_counter()
+                await asyncio.gather(reverifier.run(bot), traffic())
+                return time.perf_counter() - started, budget.used
+        finally:
+            await server.stop()
+
+    quiet, _ = asyncio.run(timed_pass(0))
+    busy, used = asyncio.run(timed_pass(40))
+    # getChatMember is charged once, by the verifier, not again by the transport
+    assert used["reverify"] == 40 and used["sendMessage"] == 40 and "getChatMember" not in used
+    assert busy > quiet + 0.2, (quiet, busy)
+    print(f"✅ Pass took {quiet:.2f}s alone and {busy:.2f}s behind 40 sends")
+
+def test_rejoin_without_second_reward():
+    """Test that leavers who rejoin cannot claim the reward again"""
+    print("\n🔧 Testing reward after leaving...")
+
+    database = in_memory_database("reverify")
+    database.users.insert_one({"user_id": 1, "points": 0, "joined_channels": False})
+    assert database.claim_channel_reward(1, 5)["points"] == 5
+    assert database.mark_channels_left([1]) == 1
+    assert database.claim_channel_reward(1, 5) is None
+    assert database.set_channels_joined(1, True)
+    assert database.get_user(1)["points"] == 5
+    print("✅ Reward paid once across leave and rejoin")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Re-verification Tests...\n")
+
+    try:
+        test_leavers_marked()
+        test_resume()
+        test_background_throttle()
+        test_send_traffic_delays_pass()
+        test_rejoin_without_second_reward()
+        print("\n🎉 All re-verification tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test script for the callback router
+"""
+
+import sys
+import os
+import asyncio
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import HANDLER_LATENCY
+from router import (
+    CallbackRouter, CallbackDataError, MAX_CALLBACK_BYTES, PrefixTrie,
+    admin_only, answer, errors_reply, rate_limited, timing
+)
+from utils import RateLimiter
+
+class FakeQuery:
+    """Records answers and edits instead of calling Telegram"""
+
+    def __init__(self, data, user_id=10):
+        self.data = data
+        self.from_user = SimpleNamespace(id=user_id)
+        self.answers = []
+        self.edits = []
+
+    async def answer(self, text=None, show_alert=False):
+        self.answers.append((text, show_alert))
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append(text)
+
+def build_router(calls):
+    router = CallbackRouter()
+
+    async def handler(query, context, *args):
+        calls.append(args)
+
+    async def broken(query, context):
+        raise RuntimeError("boom")
+
+    async def unknown(query, context):
+        calls.append("unknown")
+
+    limiter = RateLimiter()
+    limiter.limits["generate_config"] = {"calls": 2, "window": 60}
+    errors = errors_reply("Sorry")
+    router.add("generate", "g", handler, (), [timing, errors, answer])
+    router.add("service", "sv", handler, ("service",),
+               [timing, errors, rate_limited("generate_config", limiter), answer], "service_")
+    router.add("gen", "gn", handler, ("type",),
+               [timing, errors, rate_limited("generate_config", limiter, when=lambda args: args[0] != "v2ray"),
+                answer], "gen_")
+    router.add("admin_test", "at", handler, ("service",),
+               [timing, errors, admin_only(lambda user_id: user_id == 1), answer], "admin_test_")
+    router.add("admin_test_services", "as", handler, (), [timing, errors, answer])
+    router.add("broken", "b", broken, (), [timing, errors, answer])
+    router.fallback(unknown)
+    return router
+
+def test_encode_decode():
+    """Test compact encoding round trips and size limit"""
+    print("🔧 Testing callback encoding...")
+
+    router = build_router([])
+    data = router.encode("service", "youtube")
+    assert data == "1:sv:youtube"
+    route, args = router.decode(data)
+    assert route.name == "service" and args == ("youtube",)
+    assert router.decode(router.encode("generate"))[0].name == "generate"
+
+    for bad in [("service",), ("service", "a:b"), ("service", "x" * MAX_CALLBACK_BYTES)]:
+        try:
+            router.encode(*bad)
+            assert False, f"encoded {bad}"
+        except CallbackDataError:
+            pass
+
+    assert router.decode("1:zz")[0] is None
+    assert router.decode("1:sv")[0] is None
+    assert router.route_name("garbage") == "unknown"
+    print(f"✅ '{data}' round trips; oversized and malformed payloads rejected")
+
+def test_legacy_payloads():
+    """Test payloads from keyboards sent before the compact encoding"""
+    print("\n🔧 Testing legacy payloads...")
+
+    router = build_router([])
+    assert router.decode("generate")[0].name == "generate"
+    assert router.decode("service_zoom") == (router.routes["service"], ("zoom",))
+    # Exact names win over prefixes
+    assert router.decode("admin_test_services")[0].name == "admin_test_services"
+    assert router.decode("admin_test_zoom") == (router.routes["admin_test"], ("zoom",))
+
+    trie = PrefixTrie()
+    trie.insert("a", 1)
+    trie.insert("abc", 2)
+    assert trie.longest_match("abcd") == (3, 2)
+    assert trie.longest_match("abx") == (1, 1)
+    assert trie.longest_match("x") is None
+    print("✅ Legacy exact names and prefixes resolved")
+
+def test_middleware():
+    """Test admin gating, rate limiting, answering and error handling"""
+    print("\n🔧 Testing middleware...")
+
+    calls = []
+    router = build_router(calls)
+    service = router.routes["service"]
+    assert service.latency is HANDLER_LATENCY.labels("callback", "service")
+    observed = service.latency.count
+
+    async def press(data, user_id=10):
+        query = FakeQuery(data, user_id)
+        await router.dispatch(SimpleNamespace(callback_query=query), None)
+        return query
+
+    async def scenario():
+        denied = await press("1:at:zoom", user_id=10)
+        allowed = await press("1:at:zoom", user_id=1)
+        menus = [await press("1:gn:v2ray") for _ in range(3)]
+        limited = [await press("1:sv:zoom") for _ in range(3)]
+        direct = await press("1:gn:ssh")
+        broken = await press("1:b")
+        unknown = await press("nothing")
+        return denied, allowed, menus, limited, direct, broken, unknown
+
+    denied, allowed, menus, limited, direct, broken, unknown = asyncio.run(scenario())
+
+    assert denied.answers == [("❌ Admin access required.", True)]
+    assert allowed.answers == [(None, False)]
+    assert all(q.answers == [(None, False)] for q in menus)
+    assert [q.answers[0][1] for q in limited] == [False, False, True]
+    assert direct.answers[0][1] is True
+    assert broken.edits == ["Sorry"]
+    assert service.latency.count == observed + 3
+    assert calls == [("zoom",)] + [("v2ray",)] * 3 + [("zoom",), ("zoom",), "unknown"]
+    print("✅ Non-admins and over-limit users stopped before the handler; menu presses not charged")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Router Tests...\n")
+
+    try:
+        test_encode_decode()
+        test_legacy_payloads()
+        test_middleware()
+        print("\n🎉 All router tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Test script for consistent-hash sharding of updates across worker processes
+"""
+
+import sys
+import os
+import asyncio
+import tempfile
+from collections import Counter, defaultdict
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import SHARD_RESTARTS
+from shard import HashRing, ShardFront, ShardWorker, shard_key, socket_path
+
+def message(update_id: int, user_id: int) -> dict:
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": 0, "text": "/points",
+        "from": {"id": user_id, "is_bot": False, "first_name": "Load"},
+        "chat": {"id": user_id, "type": "private"}
+    }}
+
+async def until(condition, timeout: float = 5.0):
+    """Wait until ``condition()`` holds"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+def test_hash_ring():
+    """Test balance and minimal movement of the ring"""
+    print("🔧 Testing hash ring...")
+
+    ring = HashRing(range(4))
+    keys = range(1, 20001)
+    before = {key: ring.node(key) for key in keys}
+    load = Counter(before.values())
+    assert all(3500 <= count <= 6500 for count in load.values()), load
+
+    ring.remove(2)
+    during = {key: ring.node(key) for key in keys}
+    moved = [key for key in keys if during[key] != before[key]]
+    assert all(before[key] == 2 for key in moved) and len(moved) == load[2]
+
+    ring.add(2)
+    assert {key: ring.node(key) for key in keys} == before
+    assert HashRing(range(4)).node(424242) == ring.node(424242)
+    print(f"✅ Load {dict(sorted(load.items()))}; removing a worker moved only its {len(moved)} users")
+
+def test_shard_key():
+    """Test routing keys of different update kinds"""
+    print("\n🔧 Testing routing keys...")
+
+    assert shard_key(message(1, 77)) == 77
+    assert shard_key({"update_id": 2, "callback_query": {"id": "x", "from": {"id": 78}, "data": "points"}}) == 78
+    assert shard_key({"update_id": 3, "poll_answer": {"poll_id": "p", "user": {"id": 79}}}) == 79
+    assert shard_key({"update_id": 4, "channel_post": {"chat": {"id": -100}}}) == -100
+    assert shard_key({"update_id": 5}) == 5
+    print("✅ Sender id, then chat id, then update id")
+
+def test_routing_and_rebalancing():
+    """Test affinity, ordering, worker loss, restart and hung workers"""
+    print("\n🔧 Testing routing and rebalancing...")
+
+    async def scenario(directory):
+        received = defaultdict(list)  # worker -> [(user, update_id)]
+        stuck = asyncio.Event()
+
+        def handler(index):
+            async def handle(update):
+                received[index].append((shard_key(update), update["update_id"]))
+                if update.get("hang"):
+                    await stuck.wait()
+            return handle
+
+        workers = [ShardWorker(socket_path(index, directory), handler(index)) for index in range(3)]
+        for worker in workers:
+            await worker.start()
+        front = ShardFront(3, directory, health_interval=0.05)
+        await front.start()
+        try:
+            await until(lambda: len(front.ring) == 3)
+
+            owners = {}
+            for update_id in range(1, 601):
+                user = 1000 + update_id % 60
+                owners.setdefault(user, set()).add(await front.dispatch(message(update_id, user)))
+            await until(lambda: sum(map(len, received.values())) == 600)
+            assert all(len(workers_) == 1 for workers_ in owners.values())
+            for updates in received.values():
+                for user in {user for user, _ in updates}:
+                    ids = [update_id for u, update_id in updates if u == user]
+                    assert ids == sorted(ids)
+            home = {user: workers_.pop() for user, workers_ in owners.items()}
+
+            # Worker 1 goes away: only its users move
+            await workers[1].stop()
+            await until(lambda: 1 not in front.ring)
+            moved = {user: await front.dispatch(message(700 + n, user)) for n, user in enumerate(home)}
+            assert all(moved[user] == home[user] for user in home if home[user] != 1)
+            assert 1 not in moved.values()
+
+            # It restarts on the same socket and gets its users back
+            workers[1] = ShardWorker(socket_path(1, directory), handler(1))
+            await workers[1].start()
+            await until(lambda: 1 in front.ring)
+            back = {user: await front.dispatch(message(800 + n, user)) for n, user in enumerate(home)}
+            assert back == home
+
+            # Worker 2 hangs: unanswered pings take it off the ring
+            user = next(user for user, index in home.items() if index == 2)
+            hung = message(900, user)
+            hung["hang"] = True
+            assert await front.dispatch(hung) == 2
+            await until(lambda: 2 not in front.ring)
+            assert await front.dispatch(message(901, user)) in (0, 1)
+            stuck.set()
+            await until(lambda: 2 in front.ring)
+            return home
+        finally:
+            await front.stop()
+            for worker in workers:
+                await worker.stop()
+
+    with tempfile.TemporaryDirectory() as directory:
+        home = asyncio.run(scenario(directory))
+    print(f"✅ {len(home)} users pinned to {len(set(home.values()))} workers; "
+          f"lost, restarted and hung workers rebalanced")
+
+WORKER_SCRIPT = """
+import asyncio, os, sys
+sys.path.insert(0, {root!r})
+from shard import ShardWorker
+
+async def handle(update):
+    if update.get("crash"):
+        os._exit(3)
+
+async def main():
+    await ShardWorker({path!r}, handle).start()
+    await asyncio.Event().wait()
+
+asyncio.run(main())
+"""
+
+def test_supervised_processes():
+    """Test that the front restarts a crashed worker process"""
+    print("\n🔧 Testing worker supervision...")
+
+    root = os.path.dirname(os.path.abspath(__file__))
+
+    async def scenario(directory):
+        def command(index):
+            return [sys.executable, "-c", WORKER_SCRIPT.format(root=root, path=socket_path(index, directory))]
+
+        front = ShardFront(2, directory, health_interval=0.05, restart_backoff=0.05, command=command)
+        await front.start()
+        try:
+            await until(lambda: len(front.ring) == 2, timeout=30)
+            crash = message(1, 5)
+            crash["crash"] = True
+            index = await front.dispatch(crash)
+            pid = front.links[index].process.pid
+            await until(lambda: index not in front.ring)
+            await until(lambda: index in front.ring, timeout=30)
+            assert front.links[index].process.pid != pid
+            assert await front.dispatch(message(2, 5)) == index
+            return index
+        finally:
+            await front.stop()
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = asyncio.run(scenario(directory))
+    assert SHARD_RESTARTS.labels(str(index)).value >= 1
+    print(f"✅ Worker {index} crashed, was restarted and took its users back")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Sharding Tests...\n")
+
+    try:
+        test_hash_ring()
+        test_shard_key()
+        test_routing_and_rebalancing()
+        test_supervised_processes()
+        print("\n🎉 All sharding tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
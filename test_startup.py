@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Test script for cold-start cost: import time, lazy database and first update
+"""
+
+import sys
+import os
+import subprocess
+import time
+
+import mongomock
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Cumulative `import bot` time allowed by the -X importtime check
+IMPORT_BUDGET_MS = 1000
+# Loaded on first use only; none of them may be imported by `import bot`
+LAZY_MODULES = ("qrcode", "PIL", "lxml", "bs4", "requests", "mongomock")
+
+def offline_env(**extra):
+    return {**os.environ, "MONGO_URI": "mongomock://startup", "BOT_TOKEN": "100000001:STARTUP-OFFLINE-TOKEN",
+            "PROBER_ENABLED": "false", "PREWARM_ENABLED": "false", "REVERIFY_ENABLED": "false",
+            "METRICS_ENABLED": "false", "LOOP_MONITOR_ENABLED": "false", **extra}
+
+def import_times(module: str) -> dict:
+    """Cumulative import time (µs) per module from ``python -X importtime``"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, env=offline_env(), capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr[-2000:]
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+def test_import_budget():
+    """Test that `import bot` stays within budget and skips the lazy stacks"""
+    print("🔧 Testing import time...")
+
+    times = import_times("bot")
+    total_ms = times["bot"] / 1000
+    eager = [module for module in LAZY_MODULES if module in times]
+    assert not eager, f"imported at startup: {eager}"
+    assert total_ms <= IMPORT_BUDGET_MS, f"import bot took {total_ms:.0f} ms"
+
+    own = [name for name in times if os.path.exists(os.path.join(ROOT, f"{name}.py")) and name != "bot"]
+    slowest = sorted(own, key=times.get, reverse=True)[:4]
+    print(f"✅ import bot: {total_ms:.0f} ms (budget {IMPORT_BUDGET_MS} ms); "
+          + ", ".join(f"{name} {times[name] / 1000:.0f} ms" for name in slowest))
+
+def test_lazy_database():
+    """Test that Database does no I/O until used, and migrates once per schema version"""
+    print("\n🔧 Testing lazy database...")
+
+    import db
+
+    started = time.perf_counter()
+    unreachable = db.Database("mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=100", "startup")
+    assert "client" not in unreachable.__dict__
+    assert time.perf_counter() - started < 0.05
+
+    database = db.Database("mongomock://startup", f"startup_{os.getpid()}")
+    assert "client" not in database.__dict__
+    assert database.migrate() is True
+    assert isinstance(database.__dict__["client"], mongomock.MongoClient)
+    assert database.migrate() is False
+    assert "user_id_1" in database.users.index_information()
+    assert database.stats.find_one({"_id": "schema"})["version"] == db.SCHEMA_VERSION
+    print("✅ No connection at construction; indexes created once per schema version")
+
+FIRST_UPDATE_SCRIPT = """
+import asyncio, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+from emulator import FakeBotAPIServer
+from telegram import Update
+import bot
+
+async def main():
+    api = FakeBotAPIServer()
+    await api.start()
+    service = bot.SSHVPNBot()
+    service.initialize(base_url=api.base_url)
+    service.setup_handlers()
+    application = service.application
+    async with application:
+        await service.post_init(application)
+        migrated = bot.db.stats.find_one({{"_id": "schema"}}) is not None
+        update = Update.de_json({{"update_id": 1, "message": {{
+            "message_id": 1, "date": 0, "text": "/start",
+            "entities": [{{"type": "bot_command", "offset": 0, "length": 6}}],
+            "from": {{"id": 77, "is_bot": False, "first_name": "Cold"}},
+            "chat": {{"id": 77, "type": "private"}}}}}}, application.bot)
+        await application.process_update(update)
+        answered = time.perf_counter() - started
+        await service.post_shutdown(application)
+    await api.stop()
+    print(f"{{migrated}} {{answered:.3f}} {{api.calls['sendMessage']}}")
+
+asyncio.run(main())
+"""
+
+def test_first_update():
+    """Test migration before serving and the time from interpreter start to the first reply"""
+    print("\n🔧 Testing first update...")
+
+    result = subprocess.run([sys.executable, "-c", FIRST_UPDATE_SCRIPT.format(root=ROOT)],
+                            cwd=ROOT, env=offline_env(), capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr[-2000:]
+    migrated, answered, replies = result.stdout.split()[-3:]
+    # Indexes exist before the first update is served
+    assert migrated == "True"
+    assert int(replies) == 1 and float(answered) < 3.0
+    print(f"✅ First /start answered {float(answered) * 1000:.0f} ms after the interpreter started")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Startup Tests...\n")
+
+    try:
+        test_import_budget()
+        test_lazy_database()
+        test_first_update()
+        print("\n🎉 All startup tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test script for request tracing
+"""
+
+import sys
+import os
+import json
+import asyncio
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from tracing import Tracer, FileExporter, OTLPExporter, get_correlation_id
+from emulator import OTLPCollectorStandIn
+
+class MemoryExporter:
+    """Collect exported spans in a list"""
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+def test_span_tree():
+    """Test parent/child relationships and correlation ids"""
+    print("🔧 Testing span tree...")
+    exporter = MemoryExporter()
+    tracer = Tracer()
+    tracer.configure(enabled=True, sample_rate=1.0, exporter=exporter)
+
+    with tracer.start_trace("callback:gen_ssh", update_id=7) as root:
+        correlation_id = get_correlation_id()
+        with tracer.span("db.can_generate_config"):
+            pass
+        with tracer.span("http.GET", url="https://speedssh.com/create-ssh-server/sg1"):
+            with tracer.span("telegram.editMessageText"):
+                pass
+    tracer.flush()
+
+    names = {span.name: span for span in exporter.spans}
+    assert correlation_id == root.trace.trace_id
+    assert names["db.can_generate_config"].parent_id == root.span_id
+    assert names["telegram.editMessageText"].parent_id == names["http.GET"].span_id
+    assert get_correlation_id() is None
+    print(f"✅ {len(exporter.spans)} spans recorded under one trace")
+
+def test_sampling():
+    """Test that unsampled traces record nothing"""
+    print("\n🔧 Testing sampling...")
+    exporter = MemoryExporter()
+    tracer = Tracer()
+    tracer.configure(enabled=True, sample_rate=0.0, exporter=exporter)
+
+    with tracer.start_trace("command:start"):
+        assert get_correlation_id() is not None
+        with tracer.span("db.get_user") as span:
+            assert span is None
+    tracer.flush()
+    assert exporter.spans == []
+    print("✅ Unsampled trace kept correlation id, exported nothing")
+
+def test_concurrent_updates():
+    """Test that concurrent tasks keep separate traces"""
+    print("\n🔧 Testing concurrent traces...")
+    exporter = MemoryExporter()
+    tracer = Tracer()
+    tracer.configure(enabled=True, sample_rate=1.0, exporter=exporter)
+
+    async def handle(update_id):
+        with tracer.start_trace("command:generate", update_id=update_id):
+            await asyncio.sleep(0.01)
+            with tracer.span("db.get_user"):
+                await asyncio.sleep(0.01)
+            return get_correlation_id()
+
+    async def run():
+        return await asyncio.gather(*(handle(i) for i in range(5)))
+
+    ids = asyncio.run(run())
+    tracer.flush()
+    assert len(set(ids)) == 5
+    assert len({span.trace.trace_id for span in exporter.spans}) == 5
+    print("✅ Each update has its own trace")
+
+def test_exporters():
+    """Test file and OTLP exporters"""
+    print("\n🔧 Testing exporters...")
+    path = os.path.join(tempfile.mkdtemp(), "traces.jsonl")
+    tracer = Tracer()
+    tracer.configure(enabled=True, sample_rate=1.0, exporter=FileExporter(path))
+    with tracer.start_trace("command:points"):
+        with tracer.span("db.get_user"):
+            pass
+    tracer.flush()
+    with open(path) as f:
+        lines = [json.loads(line) for line in f]
+    assert {line["name"] for line in lines} == {"command:points", "db.get_user"}
+
+    collector = OTLPCollectorStandIn()
+    endpoint = collector.start()
+    try:
+        tracer.configure(enabled=True, sample_rate=1.0, exporter=OTLPExporter(endpoint))
+        with tracer.start_trace("callback:service_*"):
+            with tracer.span("qr.generate_qr_code"):
+                pass
+        tracer.flush()
+        assert {span["name"] for span in collector.spans} == {"callback:service_*", "qr.generate_qr_code"}
+    finally:
+        collector.stop()
+    print("✅ File and OTLP exporters delivered spans")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Tracing Tests...\n")
+
+    try:
+        test_span_tree()
+        test_sampling()
+        test_concurrent_updates()
+        test_exporters()
+        print("\n🎉 All tracing tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test script for the VMess template fast path
+"""
+
+import sys
+import os
+import time
+import uuid
+import json
+import base64
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from generator import V2RayGenerator, SERVICE_PAYLOADS
+
+def reference_output(gen, server_config, service_config, config_uuid):
+    """Link and client config JSON exactly as the pre-template code built them"""
+    vmess_config = gen.build_vmess_config(server_config, service_config, config_uuid)
+    vmess_json = json.dumps(vmess_config, separators=(',', ':'))
+    link = "vmess://" + base64.b64encode(vmess_json.encode()).decode()
+    return link, json.dumps(gen.create_v2ray_client_config(vmess_config, service_config))
+
+def test_byte_identical():
+    """Test template output against the reference path for every server and service"""
+    print("🔧 Testing template output matches reference...")
+
+    gen = V2RayGenerator()
+    checked = 0
+    for server_config in gen.servers_by_priority():
+        for service, service_config in SERVICE_PAYLOADS.items():
+            template = gen.template_for(server_config, service, service_config)
+            for _ in range(100):
+                config_uuid = str(uuid.uuid4())
+                link, client_json = reference_output(gen, server_config, service_config, config_uuid)
+                config, fast_link, client = template.render(config_uuid)
+                assert fast_link == link
+                assert json.dumps(client) == client_json
+                assert template.client_json(config_uuid) == client_json.encode()
+                assert config["id"] == config_uuid and list(config) == list(template.vmess)
+                checked += 1
+    print(f"✅ {checked} configs byte-identical to reference output")
+
+def test_cache():
+    """Test template reuse and rebuild when the service changes"""
+    print("\n🔧 Testing template cache...")
+
+    gen = V2RayGenerator()
+    server_config = gen.servers_by_priority()[0]
+    service_config = dict(SERVICE_PAYLOADS["youtube"])
+    template = gen.template_for(server_config, "youtube", service_config)
+    assert gen.template_for(server_config, "youtube", service_config) is template
+
+    service_config["sni"] = "librespeed.org"
+    rebuilt = gen.template_for(server_config, "youtube", service_config)
+    assert rebuilt is not template and rebuilt.vmess["sni"] == "librespeed.org"
+
+    # Per-config paths are fresh objects
+    first, second = rebuilt.client_config("a" * 36), rebuilt.client_config("b" * 36)
+    assert first["outbounds"][0]["settings"]["vnext"][0]["users"][0]["id"] == "a" * 36
+    assert second["outbounds"][0]["settings"]["vnext"][0]["users"][0]["id"] == "b" * 36
+
+    config = gen.create_optimized_vmess("youtube")
+    assert config["link"] == reference_output(gen, server_config, SERVICE_PAYLOADS["youtube"], config["config"]["id"])[0]
+    print("✅ Templates reused and rebuilt on change")
+
+def test_throughput(count=200000):
+    """Benchmark template rendering"""
+    print("\n🔧 Benchmarking template rendering...")
+
+    gen = V2RayGenerator()
+    server_config = gen.servers_by_priority()[0]
+    template = gen.template_for(server_config, "youtube", SERVICE_PAYLOADS["youtube"])
+    uuids = [str(uuid.uuid4()) for _ in range(count)]
+
+    started = time.perf_counter()
+    for config_uuid in uuids:
+        template.render(config_uuid)
+    rate = count / (time.perf_counter() - started)
+    print(f"✅ {rate:,.0f} configs/s (link + VMess config + client config)")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting VMess Template Tests...\n")
+
+    try:
+        test_byte_identical()
+        test_cache()
+        test_throughput()
+        print("\n🎉 All VMess template tests passed!")
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
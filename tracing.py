@@ -0,0 +1,298 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, List, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "ssh_v2ray_bot"
+
+class Span:
+    """One timed operation inside a trace"""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Dict):
+        self.trace = trace
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+class Trace:
+    """Spans belonging to one Telegram update"""
+
+    __slots__ = ("trace_id", "sampled", "spans")
+
+    def __init__(self, sampled: bool):
+        self.trace_id = "%032x" % random.getrandbits(128)
+        self.sampled = sampled
+        self.spans: List[Span] = []
+
+    @property
+    def correlation_id(self) -> str:
+        return self.trace_id
+
+# (trace, current span) for the running task; None outside a traced update
+_active: ContextVar = ContextVar("active_trace", default=None)
+
+class _NoopContext:
+    """Returned when there is nothing to record"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP = _NoopContext()
+
+class _SpanContext:
+    __slots__ = ("tracer", "trace", "name", "attributes", "span", "token", "is_root")
+
+    def __init__(self, tracer: "Tracer", trace: Trace, parent: Optional[Span], name: str, attributes: Dict):
+        self.tracer = tracer
+        self.trace = trace
+        self.name = name
+        self.attributes = attributes
+        self.span = parent
+        self.is_root = parent is None
+        self.token = None
+
+    def __enter__(self) -> Optional[Span]:
+        if not self.trace.sampled:
+            # Unsampled traces keep the correlation id but record nothing
+            self.token = _active.set((self.trace, None))
+            return None
+        parent_id = self.span.span_id if self.span else None
+        self.span = Span(self.trace, self.name, parent_id, self.attributes)
+        self.token = _active.set((self.trace, self.span))
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        _active.reset(self.token)
+        if self.trace.sampled:
+            self.span.end_ns = time.time_ns()
+            if exc is not None:
+                self.span.error = f"{exc_type.__name__}: {exc}"
+            self.trace.spans.append(self.span)
+        if self.is_root and self.trace.sampled:
+            self.tracer.export(self.trace.spans)
+        return False
+
+class FileExporter:
+    """Append finished spans as JSON lines, rotating at a size limit"""
+
+    def __init__(self, path: str, max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def export(self, spans: List[Span]):
+        if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+            os.replace(self.path, self.path + ".1")
+        with open(self.path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+class OTLPExporter:
+    """POST spans as OTLP/HTTP JSON to a collector"""
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def export(self, spans: List[Span]):
+        body = json.dumps(to_otlp(spans)).encode("utf-8")
+        request = urllib.request.Request(
+            self.endpoint, data=body, method="POST",
+            headers={"Content-Type": "application/json"}
+        )
+        urllib.request.urlopen(request, timeout=self.timeout).read()
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def to_otlp(spans: List[Span]) -> Dict:
+    """Convert spans to an OTLP ExportTraceServiceRequest (JSON mapping)"""
+    otlp_spans = []
+    for span in spans:
+        item = {
+            "traceId": span.trace.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1}
+        }
+        if span.parent_id:
+            item["parentSpanId"] = span.parent_id
+        otlp_spans.append(item)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": otlp_spans}]
+        }]
+    }
+
+class Tracer:
+    """Head-sampled span tracer with a background exporter thread"""
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.exporter = None
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread = None
+
+    def configure(self, enabled: bool = True, sample_rate: float = 1.0, exporter=None):
+        """Enable tracing with a sampling rate and an exporter"""
+        self.enabled = enabled and exporter is not None
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.exporter = exporter
+        if self.enabled and self._thread is None:
+            self._thread = threading.Thread(target=self._export_loop, name="trace-exporter", daemon=True)
+            self._thread.start()
+        logger.info(f"Tracing {'enabled' if self.enabled else 'disabled'} (sample rate {self.sample_rate})")
+
+    def start_trace(self, name: str, **attributes):
+        """Open the root span of a new trace (one per Telegram update)"""
+        if not self.enabled:
+            return _NOOP
+        sampled = self.sample_rate >= 1.0 or random.random() < self.sample_rate
+        return _SpanContext(self, Trace(sampled), None, name, attributes)
+
+    def span(self, name: str, **attributes):
+        """Open a child span of the active trace; no-op outside a sampled trace"""
+        active = _active.get()
+        if active is None or not active[0].sampled:
+            return _NOOP
+        return _SpanContext(self, active[0], active[1], name, attributes)
+
+    def export(self, spans: List[Span]):
+        """Hand finished spans to the exporter thread"""
+        self._queue.put(spans)
+
+    def flush(self, timeout: float = 5.0):
+        """Wait until queued spans have been exported"""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def _export_loop(self):
+        while True:
+            item = self._queue.get()
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+            batch = list(item)
+            # Drain whatever else is queued into one export call
+            while True:
+                try:
+                    extra = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(extra, threading.Event):
+                    self._export_batch(batch)
+                    batch = []
+                    extra.set()
+                else:
+                    batch.extend(extra)
+            self._export_batch(batch)
+
+    def _export_batch(self, batch: List[Span]):
+        if not batch:
+            return
+        try:
+            self.exporter.export(batch)
+        except Exception as e:
+            logger.error(f"Trace export failed: {e}")
+
+def get_correlation_id() -> Optional[str]:
+    """Correlation id of the update being handled, if any"""
+    active = _active.get()
+    return active[0].correlation_id if active else None
+
+def traced(name: str):
+    """Decorator wrapping a sync or async function in a span"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def traced_handler(kind: str, route, callback):
+    """Wrap a PTB handler callback in the root span of a new trace
+
+    ``route`` is either a fixed name or a callable deriving it from the update.
+    """
+    @wraps(callback)
+    async def wrapper(update, context):
+        name = f"{kind}:{route(update) if callable(route) else route}"
+        with tracer.start_trace(name, update_id=getattr(update, "update_id", 0)):
+            result = callback(update, context)
+            if result is not None:
+                result = await result
+            return result
+    return wrapper
+
+def configure_from(config: Dict):
+    """Configure the global tracer from TRACING_CONFIG"""
+    if not config.get("enabled"):
+        tracer.configure(enabled=False)
+        return
+    if config.get("exporter") == "otlp":
+        exporter = OTLPExporter(config["otlp_endpoint"])
+    else:
+        exporter = FileExporter(config["file_path"])
+    tracer.configure(enabled=True, sample_rate=config.get("sample_rate", 1.0), exporter=exporter)
+
+# Global tracer instance
+tracer = Tracer()
@@ -4,9 +4,11 @@ import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 import re
-from functools import wraps
 import hashlib
 import base64
+import string
+
+from metrics import RATE_LIMIT_REJECTIONS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -50,52 +52,64 @@ class RateLimiter:
                 self.requests[key].append(current_time)
                 return True
             
+            RATE_LIMIT_REJECTIONS.labels(action).inc()
             return False
             
         except Exception as e:
             logger.error(f"Rate limiter error: {e}")
             return True  # Allow by default if error
 
-def rate_limit(action: str):
-    """Decorator for rate limiting"""
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            # Extract user_id from args (assuming it's first arg after self/update)
-            user_id = None
-            for arg in args:
-                if hasattr(arg, 'effective_user') and hasattr(arg.effective_user, 'id'):
-                    user_id = arg.effective_user.id
-                    break
-                elif isinstance(arg, int) and arg > 0:
-                    user_id = arg
-                    break
-            
-            if user_id and not rate_limiter.is_allowed(user_id, action):
-                logger.warning(f"Rate limit exceeded for user {user_id} on action {action}")
-                return None
-            
-            return func(*args, **kwargs)
-        return wrapper
-    return decorator
-
-class ConfigFormatter:
-    """Format configuration data for display"""
+class Template:
+    """Message template split once into static text and dynamic fields
     
-    @staticmethod
-    def format_ssh_config(config_data: Dict) -> str:
-        """Format SSH config for display"""
-        try:
-            host = config_data.get('host', 'N/A')
-            port = config_data.get('port', 'N/A')
-            username = config_data.get('username', 'N/A')
-            password = config_data.get('password', 'N/A')
-            expires = config_data.get('expires_at', 'N/A')
-            
-            if expires != 'N/A':
-                expires = expires[:10]  # Just date part
-            
-            formatted = f"""
+    Values passed as ``static`` are substituted at construction time, so
+    rendering only formats the fields that change per message. Templates
+    without dynamic fields render to the same string object every time.
+    """
+    
+    _formatter = string.Formatter()
+    
+    __slots__ = ("segments", "fields", "_compiled", "_constant")
+    
+    def __init__(self, text: str, **static):
+        segments = []  # literal text, or (field, conversion, format_spec) tuples
+        literal = []
+        for text_part, field, spec, conversion in self._formatter.parse(text):
+            literal.append(text_part)
+            if field is None:
+                continue
+            if not field or field[0].isdigit():
+                raise ValueError(f"Template fields must be named: {text[:40]!r}")
+            if re.split(r"[.\[]", field, maxsplit=1)[0] in static:
+                literal.append(self._format_field(field, conversion, spec, static))
+                continue
+            segments.append("".join(literal))
+            literal = []
+            segments.append((field, conversion, spec))
+        segments.append("".join(literal))
+        
+        self.segments = tuple(segment for segment in segments if segment != "")
+        self.fields = frozenset(re.split(r"[.\[]", s[0], maxsplit=1)[0] for s in self.segments if isinstance(s, tuple))
+        # Re-escape the static text so the dynamic remainder renders with one C-level format call
+        self._compiled = "".join(
+            segment.replace("{", "{{").replace("}", "}}") if isinstance(segment, str)
+            else "{" + segment[0] + ("!" + segment[1] if segment[1] else "") + (":" + segment[2] if segment[2] else "") + "}"
+            for segment in self.segments
+        )
+        self._constant = "".join(self.segments) if not self.fields else None
+    
+    @classmethod
+    def _format_field(cls, field, conversion, spec, values) -> str:
+        value, _ = cls._formatter.get_field(field, (), values)
+        return cls._formatter.format_field(cls._formatter.convert_field(value, conversion), spec or "")
+    
+    def render(self, **values) -> str:
+        """Fill in the dynamic fields"""
+        if self._constant is not None:
+            return self._constant
+        return self._compiled.format_map(values)
+
+SSH_CONFIG_TEMPLATE = Template("""
 🔐 **SSH Configuration**
 
 **Server Details:**
@@ -112,27 +126,9 @@ ssh {username}@{host} -p {port}
 **Expires:** {expires}
 
 ⚠️ **Important:** Save this information securely. This message will not be shown again.
-"""
-            return formatted.strip()
-            
-        except Exception as e:
-            logger.error(f"Error formatting SSH config: {e}")
-            return "Error formatting configuration"
-    
-    @staticmethod
-    def format_v2ray_config(config_data: Dict) -> str:
-        """Format V2Ray config for display"""
-        try:
-            config_type = config_data.get('type', 'V2Ray')
-            link = config_data.get('link', 'N/A')
-            server = config_data.get('server', 'N/A')
-            port = config_data.get('port', 'N/A')
-            expires = config_data.get('expires_at', 'N/A')
-            
-            if expires != 'N/A':
-                expires = expires[:10]  # Just date part
-            
-            formatted = f"""
+""".strip())
+
+V2RAY_CONFIG_TEMPLATE = Template("""
 🚀 **{config_type} Configuration**
 
 **Server Details:**
@@ -153,8 +149,46 @@ ssh {username}@{host} -p {port}
 **Expires:** {expires}
 
 💡 **Tip:** Use the QR code for easier import
-"""
-            return formatted.strip()
+""".strip())
+
+class ConfigFormatter:
+    """Format configuration data for display"""
+    
+    @staticmethod
+    def format_ssh_config(config_data: Dict) -> str:
+        """Format SSH config for display"""
+        try:
+            expires = config_data.get('expires_at', 'N/A')
+            if expires != 'N/A':
+                expires = expires[:10]  # Just date part
+            
+            return SSH_CONFIG_TEMPLATE.render(
+                host=config_data.get('host', 'N/A'),
+                port=config_data.get('port', 'N/A'),
+                username=config_data.get('username', 'N/A'),
+                password=config_data.get('password', 'N/A'),
+                expires=expires
+            )
+            
+        except Exception as e:
+            logger.error(f"Error formatting SSH config: {e}")
+            return "Error formatting configuration"
+    
+    @staticmethod
+    def format_v2ray_config(config_data: Dict) -> str:
+        """Format V2Ray config for display"""
+        try:
+            expires = config_data.get('expires_at', 'N/A')
+            if expires != 'N/A':
+                expires = expires[:10]  # Just date part
+            
+            return V2RAY_CONFIG_TEMPLATE.render(
+                config_type=config_data.get('type', 'V2Ray'),
+                link=config_data.get('link', 'N/A'),
+                server=config_data.get('server', 'N/A'),
+                port=config_data.get('port', 'N/A'),
+                expires=expires
+            )
             
         except Exception as e:
             logger.error(f"Error formatting V2Ray config: {e}")